@@ -1,17 +1,100 @@
 #!/usr/bin/env python3
+import argparse
+import mmap
+import os
 import sys
+from typing import Callable, Iterable
 
-from lox.scanner import Scanner
+from lox.scanner import RegexScanner, Scanner
+from lox.token import Token, TokenBuffer
 from lox.parser import Parser
+from lox.pratt_parser import PrattParser
 from lox.interpreter import Interpreter
 from lox.error import ErrorReporter
 from lox.resolver import Resolver
+from lox.cache import DEFAULT_MAX_BYTES, ProgramCache, ResolvedProgram
+from lox.closure_compiler import ClosureInterpreter
+from lox.memo import DEFAULT_MAX_ENTRIES, Memo
+from lox.optimizer import MAX_LEVEL, Optimizer
+from lox.vm import FRAMES_MAX, VM
+from lox.python_compiler import PythonInterpreter
+from lox.stack_interpreter import MAX_FRAMES, StackInterpreter
+
+
+ENGINES: dict[str, Callable[[ErrorReporter], Interpreter | VM]] = {
+    # The tree-walking interpreter from the book.
+    "tree": lambda error_reporter: Interpreter(error_reporter=error_reporter, use_resolver=True),
+    # Compiles the AST to Python closures before running.
+    "closure": lambda error_reporter: ClosureInterpreter(error_reporter=error_reporter),
+    # The tree-walker, but keeping Lox calls on an explicit stack instead of Python's.
+    "stack": lambda error_reporter: StackInterpreter(error_reporter=error_reporter),
+    # Compiles to bytecode for a stack-based virtual machine, as in clox.
+    "vm": lambda error_reporter: VM(error_reporter=error_reporter),
+    # Translates the AST to Python code, for CPython to compile and run.
+    "python": lambda error_reporter: PythonInterpreter(error_reporter=error_reporter),
+}
+
+SCANNERS: dict[str, Callable[[str | bytes | mmap.mmap, ErrorReporter], list[Token] | TokenBuffer]] = {
+    # One compiled regular expression matches a whole token at a time,
+    # into a compact TokenBuffer.
+    "regex": lambda source, error_reporter: RegexScanner(
+        source, error_reporter=error_reporter).scan_buffer(),
+    # The character-at-a-time scanner from the book, making a list of Tokens.
+    "book": lambda source, error_reporter: Scanner(
+        source, error_reporter=error_reporter).scan_tokens(),
+}
+
+PARSERS = {
+    # Expressions by precedence climbing, with a table of rules per token type.
+    "pratt": PrattParser,
+    # The book's recursive descent, with a method per precedence level.
+    "book": Parser,
+}
+
+# Engines whose call depth is limited by `max_frames`, rather than by Python.
+LIMITED_ENGINES = ("stack", "vm")
+# Engines that can memoize pure functions.
+MEMO_ENGINES = ("tree", "closure")
+
+
+class UsageParser(argparse.ArgumentParser):
+    def error(self, message):
+        self.print_usage(sys.stderr)
+        print("%s: error: %s" % (self.prog, message), file=sys.stderr)
+        sys.exit(64)
 
 
 class Lox:
-    def __init__(self):
+    def __init__(self, engine: str = "tree", emit_python: bool = False,
+                 cache: ProgramCache | None = None, max_frames: int | None = None,
+                 memo: Memo | None = None, scanner: str = "regex", stream: bool = False,
+                 use_mmap: bool = False, parser: str = "pratt", optimize: int = 0,
+                 inline: bool = True):
         self.error_reporter = ErrorReporter()
-        self.interpreter = Interpreter(error_reporter=self.error_reporter, use_resolver=True)
+        self.cache = cache
+        self.stream = stream
+        self.use_mmap = use_mmap
+        self.scan = SCANNERS[scanner]
+        self.parser_class = PARSERS[parser]
+        self.optimizer = Optimizer(optimize)
+        self.interpreter: Interpreter | VM
+        if emit_python:
+            self.interpreter = PythonInterpreter(self.error_reporter, emit_python=True)
+        else:
+            self.interpreter = ENGINES[engine](self.error_reporter)
+        if max_frames is not None:
+            # Only the engines with their own call stacks have a limit to set.
+            assert engine in LIMITED_ENGINES
+            assert isinstance(self.interpreter, (StackInterpreter, VM))
+            self.interpreter.max_frames = max_frames
+        if memo is not None:
+            assert engine in MEMO_ENGINES
+            assert isinstance(self.interpreter, Interpreter)
+            self.interpreter.memo = memo
+        if not inline:
+            assert engine == "tree"
+            assert isinstance(self.interpreter, Interpreter)
+            self.interpreter.inliner = None
 
     @property
     def had_error(self):
@@ -25,18 +108,33 @@ class Lox:
     def had_any_error(self):
         return self.had_error or self.had_runtime_error
 
-    def main(self, args: list[str]):
-        if len(args) > 1:
-            print("Usage: lox.py [script]")
-            sys.exit(64)
-        elif len(args) == 1:
-            self.run_file(args[0])
+    def main(self, script: str | None):
+        if script is not None:
+            self.run_file(script)
+        elif self.stream:
+            # Piped input, rather than a REPL.
+            self.run_stream(sys.stdin)
+            self.exit_if_error()
         else:
             self.run_prompt()
 
     def run_file(self, path: str):
-        _bytes = open(path, 'r').read()
-        self.run(_bytes)
+        if self.stream:
+            with open(path, 'r') as f:
+                self.run_stream(f)
+        elif self.use_mmap:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    self.run(b"")  # Can't map an empty file.
+                else:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+                        self.run(source)
+        else:
+            _bytes = open(path, 'r').read()
+            self.run(_bytes)
+        self.exit_if_error()
+
+    def exit_if_error(self):
         if self.had_runtime_error:
             sys.exit(70)
         elif self.had_any_error:
@@ -50,19 +148,149 @@ class Lox:
             self.run(line)
             self.error_reporter.reset()
 
-    def run(self, source: str):
-        scanner = Scanner(source, error_reporter=self.error_reporter)
-        tokens = scanner.scan_tokens()
-        parser = Parser(tokens, error_reporter=self.error_reporter)
+    def run(self, source: str | bytes | mmap.mmap):
+        program = self.cache.load(source) if self.cache is not None else None
+        if program is None:
+            program = self.resolve(source)
+            if program is None:
+                return
+            if self.cache is not None:
+                self.cache.store(source, program)
+        # After caching, so the cache doesn't depend on the -O level.
+        program.statements = self.optimizer.optimize(program.statements)
+        program.replay(self.interpreter)
+        self.interpreter.interpret(program.statements)
+
+    def run_stream(self, lines: Iterable[str]):
+        """
+        Scan, parse, resolve and execute each top-level declaration as soon as
+        it's complete, instead of reading the whole program first. Nothing more
+        is executed after an error, though later compile errors are still reported.
+        """
+        scanner = RegexScanner("", error_reporter=self.error_reporter)
+        parser = self.parser_class(scanner.iter_tokens(lines), error_reporter=self.error_reporter)
+        resolver = Resolver(self.interpreter, error_reporter=self.error_reporter)
+        for statement in parser.declarations():
+            resolver.resolve_stmts([statement])
+            if self.had_error:
+                continue
+            self.interpreter.interpret(self.optimizer.optimize([statement]))
+            if self.had_runtime_error:
+                break
+
+    def resolve(self, source: str | bytes | mmap.mmap) -> ResolvedProgram | None:
+        """
+        Scan, parse and resolve, recording what the Resolver found so it can
+        be cached. Returns None if there were errors.
+        """
+        tokens = self.scan(source, self.error_reporter)
+        parser = self.parser_class(tokens, error_reporter=self.error_reporter)
         statements = parser.parse()
         if self.had_error:
-            return
-        resolver = Resolver(self.interpreter, error_reporter=self.error_reporter)
+            return None
+        program = ResolvedProgram(statements)
+        resolver = Resolver(program, error_reporter=self.error_reporter)
         resolver.resolve_stmts(statements)
         if self.had_error:
-            return
-        self.interpreter.interpret(statements)
+            return None
+        return program
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = UsageParser(prog="lox.py")
+    parser.add_argument("script", nargs="?", help="Run this file instead of a REPL.")
+    parser.add_argument(
+        "--engine", choices=sorted(ENGINES), default="tree",
+        help="How to execute the program (default: %(default)s).")
+    parser.add_argument(
+        "--scanner", choices=sorted(SCANNERS), default="regex",
+        help="How to split the source into tokens; both give the same tokens "
+        "(default: %(default)s).")
+    parser.add_argument(
+        "--emit-python", action="store_true",
+        help="Print the Python that `--engine python` would run, instead of running it.")
+    parser.add_argument(
+        "--parser", choices=sorted(PARSERS), default="pratt",
+        help="How to parse expressions; both give the same AST (default: %(default)s).")
+    parser.add_argument(
+        "-O", dest="optimize", type=int, default=0, choices=range(MAX_LEVEL + 1),
+        metavar="LEVEL",
+        help="Optimize the program before running it, eg -O2: 1 folds constant "
+        "expressions, 2 also removes dead code (default: 0).")
+    parser.add_argument(
+        "--stream", action="store_true",
+        help="Run each top-level declaration as soon as it's parsed, rather than "
+        "checking the whole program first. Reads stdin if there's no script.")
+    parser.add_argument(
+        "--mmap", action="store_true",
+        help="Memory-map the script and scan its bytes, rather than reading it into "
+        "a str, decoding only the tokens the parser needs. For huge scripts.")
+    parser.add_argument(
+        "--cache-dir", default=os.environ.get("LOX_CACHE_DIR"),
+        help="Cache parsed programs here, to skip parsing next time "
+        "(default: $LOX_CACHE_DIR, or no caching).")
+    parser.add_argument(
+        "--cache-max-bytes", type=int, default=DEFAULT_MAX_BYTES,
+        help="Evict least recently used programs beyond this (default: %(default)s).")
+    parser.add_argument(
+        "--max-frames", type=int, default=None,
+        help="How deep Lox calls can go before a stack overflow error, for engines "
+        "stack and vm (default: %d for stack, %d for vm like clox)." % (MAX_FRAMES, FRAMES_MAX))
+    parser.add_argument(
+        "--memoize", action="store_true",
+        help="Remember the results of calls to pure functions, with engines %s. "
+        "Only for scripts, since it needs the whole program." % " and ".join(MEMO_ENGINES))
+    parser.add_argument(
+        "--memo-size", type=int, default=DEFAULT_MAX_ENTRIES,
+        help="Evict least recently used results beyond this (default: %(default)s).")
+    parser.add_argument(
+        "--memo-stats", action="store_true",
+        help="Implies --memoize, and reports hit rates on stderr when done.")
+    parser.add_argument(
+        "--fusion-report", action="store_true",
+        help="Report on stderr how many expressions of each pattern were fused into "
+        "superinstructions, with engine tree.")
+    parser.add_argument(
+        "--no-inline", dest="inline", action="store_false",
+        help="Don't inline calls to small functions and methods, with engine tree.")
+    options = parser.parse_args(args)
+    if options.max_frames is not None and options.engine not in LIMITED_ENGINES:
+        parser.error("--max-frames only applies to --engine %s" % " or ".join(LIMITED_ENGINES))
+    options.memoize = options.memoize or options.memo_stats
+    if options.memoize and options.engine not in MEMO_ENGINES:
+        parser.error("--memoize only applies to --engine %s" % " or ".join(MEMO_ENGINES))
+    if options.memoize and options.script is None:
+        parser.error("--memoize needs a script")
+    if options.fusion_report and options.engine != "tree":
+        parser.error("--fusion-report only applies to --engine tree")
+    if not options.inline and options.engine != "tree":
+        parser.error("--no-inline only applies to --engine tree")
+    if options.stream and options.memoize:
+        parser.error("--memoize needs the whole program, so can't be used with --stream")
+    if options.stream and options.scanner != "regex":
+        parser.error("--stream needs --scanner regex")
+    if options.mmap and (options.stream or options.scanner != "regex" or options.script is None):
+        parser.error("--mmap needs a script, --scanner regex, and no --stream")
+    return options
 
 
 if __name__ == '__main__':
-    Lox().main(sys.argv[1:])
+    options = parse_args(sys.argv[1:])
+    cache = None
+    if options.cache_dir:
+        cache = ProgramCache(options.cache_dir, options.cache_max_bytes)
+    memo = Memo(options.memo_size) if options.memoize else None
+    lox = Lox(engine=options.engine, emit_python=options.emit_python, cache=cache,
+              max_frames=options.max_frames, memo=memo,
+              scanner=options.scanner, stream=options.stream,
+              use_mmap=options.mmap, parser=options.parser, optimize=options.optimize,
+              inline=options.inline)
+    try:
+        lox.main(options.script)
+    finally:
+        if memo is not None and options.memo_stats:
+            print(memo.report(), file=sys.stderr)
+        if options.fusion_report:
+            # The tree engine always uses the resolver, so has a Fuser.
+            assert isinstance(lox.interpreter, Interpreter) and lox.interpreter.fuser is not None
+            print(lox.interpreter.fuser.report(), file=sys.stderr)
@@ -0,0 +1,528 @@
+"""
+Compiles the parsed (and resolver-checked) AST to bytecode for the VM,
+following the design of clox's compiler:
+https://craftinginterpreters.com/compiling-expressions.html
+
+Unlike clox we don't compile straight from tokens, since we already have a tree,
+but we do keep clox's limits on constants, locals, upvalues and jump distances.
+The Resolver has already reported the static errors that clox's compiler would.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from .chunk import FunctionProto, OpCode
+from .error import ErrorReporter
+from .expression import (
+    Assign,
+    Binary,
+    Call,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from .resolver import FunctionType
+from .statement import (
+    Block,
+    ClassStmt,
+    ExpressionStmt,
+    For,
+    Function,
+    If,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+from .token import Token
+from .tokentype import TokenType
+
+UINT8_COUNT = 256
+MAX_JUMP = 0xFFFF
+
+BINARY_OPS = {
+    TokenType.EQUAL_EQUAL: (OpCode.EQUAL,),
+    TokenType.BANG_EQUAL: (OpCode.EQUAL, OpCode.NOT),
+    TokenType.GREATER: (OpCode.GREATER,),
+    TokenType.GREATER_EQUAL: (OpCode.GREATER_EQUAL,),
+    TokenType.LESS: (OpCode.LESS,),
+    TokenType.LESS_EQUAL: (OpCode.LESS_EQUAL,),
+    TokenType.PLUS: (OpCode.ADD,),
+    TokenType.MINUS: (OpCode.SUBTRACT,),
+    TokenType.STAR: (OpCode.MULTIPLY,),
+    TokenType.SLASH: (OpCode.DIVIDE,),
+}
+
+
+class CompileError(Exception):
+    pass
+
+
+@dataclass
+class Local:
+    name: str
+    depth: int  # -1 until its initializer has been compiled.
+    is_captured: bool = False
+
+
+@dataclass
+class UpvalueRef:
+    index: int
+    is_local: bool  # Captures a local of the enclosing function, vs one of its upvalues.
+
+
+class FunctionState:
+    """
+    Per-function compiler state; clox calls this `Compiler`.
+    """
+
+    def __init__(self, enclosing: Optional['FunctionState'], function: FunctionProto,
+                 function_type: FunctionType):
+        self.enclosing = enclosing
+        self.function = function
+        self.function_type = function_type
+        self.scope_depth = 0
+        self.upvalues: list[UpvalueRef] = []
+        # Slot zero holds the function being called, or the receiver for methods.
+        is_method = function_type in (FunctionType.METHOD, FunctionType.INITIALIZER)
+        self.locals: list[Local] = [Local("this" if is_method else "", 0)]
+        # Constant pool indexes of names, so each is only stored once.
+        self.identifiers: dict[str, int] = {}
+
+
+class Compiler(ExprVisitor, StmtVisitor):
+
+    def __init__(self, error_reporter: Optional[ErrorReporter] = None):
+        self.error_reporter = error_reporter or ErrorReporter()
+        self.current = FunctionState(None, FunctionProto(), FunctionType.NONE)
+        # The most recent token we've seen, for line numbers and error messages.
+        self._token: Optional[Token] = None
+        self._had_error = False
+
+    def compile(self, statements: list[Stmt]) -> Optional[FunctionProto]:
+        """
+        Returns the top level script as a function, or None if there were errors.
+        """
+        script = self.current
+        for statement in statements:
+            try:
+                self.compile_stmt(statement)
+            except CompileError:
+                # Already reported. Like clox's panic mode, skip the rest of this
+                # statement to avoid cascading errors, and carry on to find more.
+                self.current = script
+                script.scope_depth = 0
+        function = self._end_function()
+        return None if self._had_error else function
+
+    def compile_stmt(self, stmt: Stmt):
+        stmt.accept(self)
+
+    def compile_expr(self, expr: Expr):
+        expr.accept(self)
+
+    ############################################################
+    # StmtVisitor methods
+
+    def visit_expression_stmt(self, stmt: ExpressionStmt):
+        self.compile_expr(stmt.expression)
+        self._emit(OpCode.POP)
+
+    def visit_print_stmt(self, stmt: Print):
+        self.compile_expr(stmt.expression)
+        self._emit(OpCode.PRINT)
+
+    def visit_var_stmt(self, stmt: Var):
+        name_constant = self._declare_variable(stmt.name)
+        if stmt.initializer is not None:
+            self.compile_expr(stmt.initializer)
+        else:
+            self._emit(OpCode.NIL)
+        self._define_variable(name_constant)
+
+    def visit_block_stmt(self, stmt: Block):
+        self._begin_scope()
+        for statement in stmt.statements:
+            self.compile_stmt(statement)
+        self._end_scope()
+
+    def visit_if_stmt(self, stmt: If):
+        self.compile_expr(stmt.condition)
+        then_jump = self._emit_jump(OpCode.JUMP_IF_FALSE)
+        self._emit(OpCode.POP)
+        self.compile_stmt(stmt.then_branch)
+        else_jump = self._emit_jump(OpCode.JUMP)
+        self._patch_jump(then_jump)
+        self._emit(OpCode.POP)
+        if stmt.else_branch is not None:
+            self.compile_stmt(stmt.else_branch)
+        self._patch_jump(else_jump)
+
+    def visit_while_stmt(self, stmt: While):
+        loop_start = len(self._chunk.code)
+        self.compile_expr(stmt.condition)
+        exit_jump = self._emit_jump(OpCode.JUMP_IF_FALSE)
+        self._emit(OpCode.POP)
+        self.compile_stmt(stmt.statement)
+        if isinstance(stmt.statement, Block) and stmt.statement.closing_brace:
+            self._see(stmt.statement.closing_brace)
+        self._emit_loop(loop_start)
+        self._patch_jump(exit_jump)
+        self._emit(OpCode.POP)
+
+    def visit_for_stmt(self, stmt: For):
+        # As in clox, the initializer's variable is scoped to the loop.
+        self._begin_scope()
+        if stmt.initializer is not None:
+            self.compile_stmt(stmt.initializer)
+        loop_start = len(self._chunk.code)
+        exit_jump = None
+        if stmt.condition is not None:
+            self.compile_expr(stmt.condition)
+            exit_jump = self._emit_jump(OpCode.JUMP_IF_FALSE)
+            self._emit(OpCode.POP)
+        self.compile_stmt(stmt.body)
+        if isinstance(stmt.body, Block) and stmt.body.closing_brace:
+            self._see(stmt.body.closing_brace)
+        if stmt.increment is not None:
+            self.compile_expr(stmt.increment)
+            self._emit(OpCode.POP)
+        self._emit_loop(loop_start)
+        if exit_jump is not None:
+            self._patch_jump(exit_jump)
+            self._emit(OpCode.POP)
+        self._end_scope()
+
+    def visit_function_statement(self, stmt: Function):
+        name_constant = self._declare_variable(stmt.name)
+        # A function may refer to itself, so it's usable before its body is compiled.
+        self._mark_initialized()
+        self._function(stmt, FunctionType.FUNCTION)
+        self._define_variable(name_constant)
+
+    def visit_return_stmt(self, stmt: Return):
+        self._see(stmt.keyword)
+        if stmt.value is None:
+            self._emit_return()
+        else:
+            self.compile_expr(stmt.value)
+            self._see(stmt.keyword)
+            self._emit(OpCode.RETURN)
+
+    def visit_class_stmt(self, stmt: ClassStmt):
+        self._see(stmt.name)
+        name_constant = self._identifier_constant(stmt.name)
+        self._declare_variable(stmt.name)
+        self._emit(OpCode.CLASS, name_constant)
+        self._define_variable(name_constant)
+
+        if stmt.superclass is not None:
+            self.compile_expr(stmt.superclass)
+            self._begin_scope()
+            self._add_local(Token(TokenType.SUPER, "super", None, stmt.name.line))
+            self._define_variable(0)
+            self._named_variable(stmt.name)
+            self._emit(OpCode.INHERIT)
+
+        self._named_variable(stmt.name)
+        for method in stmt.methods:
+            self._see(method.name)
+            constant = self._identifier_constant(method.name)
+            is_init = method.name.lexeme == "init"
+            self._function(
+                method, FunctionType.INITIALIZER if is_init else FunctionType.METHOD
+            )
+            self._emit(OpCode.METHOD, constant)
+        self._emit(OpCode.POP)
+
+        if stmt.superclass is not None:
+            self._end_scope()
+
+    ############################################################
+    # ExprVisitor methods
+
+    def visit_literal_expr(self, expr: Literal):
+        if expr.token is not None:
+            self._see(expr.token)
+        if expr.value is None:
+            self._emit(OpCode.NIL)
+        elif expr.value is True:
+            self._emit(OpCode.TRUE)
+        elif expr.value is False:
+            self._emit(OpCode.FALSE)
+        else:
+            self._emit(OpCode.CONSTANT, self._make_constant(expr.value))
+
+    def visit_grouping_expr(self, expr: Grouping):
+        self.compile_expr(expr.expression)
+
+    def visit_unary_expr(self, expr: Unary):
+        self.compile_expr(expr.right)
+        self._see(expr.operator)
+        if expr.operator.tokentype == TokenType.BANG:
+            self._emit(OpCode.NOT)
+        else:
+            self._emit(OpCode.NEGATE)
+
+    def visit_binary_expr(self, expr: Binary):
+        self.compile_expr(expr.left)
+        self.compile_expr(expr.right)
+        self._see(expr.operator)
+        for op in BINARY_OPS[expr.operator.tokentype]:
+            self._emit(op)
+
+    def visit_variable_expr(self, expr: Variable):
+        self._named_variable(expr.name)
+
+    def visit_assign_expr(self, expr: Assign):
+        self.compile_expr(expr.value)
+        self._named_variable(expr.name, assign=True)
+
+    def visit_logical_expr(self, expr: Logical):
+        self.compile_expr(expr.left)
+        self._see(expr.operator)
+        if expr.operator.tokentype == TokenType.AND:
+            end_jump = self._emit_jump(OpCode.JUMP_IF_FALSE)
+            self._emit(OpCode.POP)
+            self.compile_expr(expr.right)
+            self._patch_jump(end_jump)
+        else:
+            else_jump = self._emit_jump(OpCode.JUMP_IF_FALSE)
+            end_jump = self._emit_jump(OpCode.JUMP)
+            self._patch_jump(else_jump)
+            self._emit(OpCode.POP)
+            self.compile_expr(expr.right)
+            self._patch_jump(end_jump)
+
+    def visit_call_expr(self, expr: Call):
+        callee = expr.callee
+        if isinstance(callee, Get):
+            # obj.method(args): skip creating a bound method, as per clox's OP_INVOKE.
+            self.compile_expr(callee.object_)
+            self._see(callee.name)
+            name_constant = self._identifier_constant(callee.name)
+            self._arguments(expr)
+            self._emit(OpCode.INVOKE, name_constant, len(expr.arguments))
+        elif isinstance(callee, Super):
+            self._see(callee.keyword)
+            name_constant = self._identifier_constant(callee.method)
+            self._named_variable(Token(TokenType.THIS, "this", None, callee.keyword.line))
+            self._arguments(expr)
+            self._named_variable(callee.keyword)
+            self._see(expr.paren)
+            self._emit(OpCode.SUPER_INVOKE, name_constant, len(expr.arguments))
+        else:
+            self.compile_expr(callee)
+            self._arguments(expr)
+            self._emit(OpCode.CALL, len(expr.arguments))
+
+    def visit_get_expr(self, expr: Get):
+        self.compile_expr(expr.object_)
+        self._see(expr.name)
+        self._emit(OpCode.GET_PROPERTY, self._identifier_constant(expr.name))
+
+    def visit_set_expr(self, expr: Set):
+        self.compile_expr(expr.object_)
+        self.compile_expr(expr.value)
+        self._see(expr.name)
+        self._emit(OpCode.SET_PROPERTY, self._identifier_constant(expr.name))
+
+    def visit_this_expr(self, expr: This):
+        self._named_variable(expr.keyword)
+
+    def visit_super_expr(self, expr: Super):
+        self._see(expr.keyword)
+        name_constant = self._identifier_constant(expr.method)
+        self._named_variable(Token(TokenType.THIS, "this", None, expr.keyword.line))
+        self._named_variable(expr.keyword)
+        self._emit(OpCode.GET_SUPER, name_constant)
+
+    ############################################################
+    # Functions
+
+    def _function(self, stmt: Function, function_type: FunctionType):
+        function = FunctionProto(stmt.name.lexeme)
+        function.arity = len(stmt.parameters)
+        self.current = FunctionState(self.current, function, function_type)
+        self._begin_scope()
+        for param in stmt.parameters:
+            self._define_variable(self._declare_variable(param))
+        for statement in stmt.body:
+            self.compile_stmt(statement)
+        state = self.current
+        self._end_function()
+
+        self._emit(OpCode.CLOSURE, self._make_constant(function))
+        for upvalue in state.upvalues:
+            self._emit(1 if upvalue.is_local else 0, upvalue.index)
+
+    def _end_function(self) -> FunctionProto:
+        self._emit_return()
+        function = self.current.function
+        function.upvalue_count = len(self.current.upvalues)
+        if self.current.enclosing is not None:
+            self.current = self.current.enclosing
+        return function
+
+    def _arguments(self, expr: Call):
+        for argument in expr.arguments:
+            self.compile_expr(argument)
+        self._see(expr.paren)
+
+    ############################################################
+    # Variables
+
+    def _declare_variable(self, name: Token) -> int:
+        """
+        Returns the constant holding the name of a global, or 0 for locals.
+        """
+        self._see(name)
+        if self.current.scope_depth == 0:
+            return self._identifier_constant(name)
+        self._add_local(name)
+        return 0
+
+    def _add_local(self, name: Token):
+        if len(self.current.locals) == UINT8_COUNT:
+            self._error(name, "Too many local variables in function.")
+        self.current.locals.append(Local(name.lexeme, -1))
+
+    def _define_variable(self, global_constant: int):
+        if self.current.scope_depth > 0:
+            self._mark_initialized()
+            return
+        self._emit(OpCode.DEFINE_GLOBAL, global_constant)
+
+    def _mark_initialized(self):
+        if self.current.scope_depth == 0:
+            return
+        self.current.locals[-1].depth = self.current.scope_depth
+
+    def _named_variable(self, name: Token, assign: bool = False):
+        self._see(name)
+        arg = self._resolve_local(self.current, name)
+        if arg is not None:
+            op = OpCode.SET_LOCAL if assign else OpCode.GET_LOCAL
+        else:
+            arg = self._resolve_upvalue(self.current, name)
+            if arg is not None:
+                op = OpCode.SET_UPVALUE if assign else OpCode.GET_UPVALUE
+            else:
+                arg = self._identifier_constant(name)
+                op = OpCode.SET_GLOBAL if assign else OpCode.GET_GLOBAL
+        self._emit(op, arg)
+
+    def _resolve_local(self, state: FunctionState, name: Token) -> Optional[int]:
+        for i in range(len(state.locals) - 1, -1, -1):
+            if state.locals[i].name == name.lexeme:
+                return i
+        return None
+
+    def _resolve_upvalue(self, state: FunctionState, name: Token) -> Optional[int]:
+        if state.enclosing is None:
+            return None
+        local = self._resolve_local(state.enclosing, name)
+        if local is not None:
+            state.enclosing.locals[local].is_captured = True
+            return self._add_upvalue(state, local, True, name)
+        upvalue = self._resolve_upvalue(state.enclosing, name)
+        if upvalue is not None:
+            return self._add_upvalue(state, upvalue, False, name)
+        return None
+
+    def _add_upvalue(self, state: FunctionState, index: int, is_local: bool,
+                     name: Token) -> int:
+        for i, upvalue in enumerate(state.upvalues):
+            if upvalue.index == index and upvalue.is_local == is_local:
+                return i
+        if len(state.upvalues) == UINT8_COUNT:
+            self._error(name, "Too many closure variables in function.")
+        state.upvalues.append(UpvalueRef(index, is_local))
+        return len(state.upvalues) - 1
+
+    def _begin_scope(self):
+        self.current.scope_depth += 1
+
+    def _end_scope(self):
+        state = self.current
+        state.scope_depth -= 1
+        while state.locals and state.locals[-1].depth > state.scope_depth:
+            if state.locals[-1].is_captured:
+                self._emit(OpCode.CLOSE_UPVALUE)
+            else:
+                self._emit(OpCode.POP)
+            state.locals.pop()
+
+    ############################################################
+    # Emitting code
+
+    @property
+    def _chunk(self):
+        return self.current.function.chunk
+
+    def _see(self, token: Token):
+        self._token = token
+
+    def _line(self) -> int:
+        return self._token.line if self._token is not None else 0
+
+    def _emit(self, *bytes_: int):
+        line = self._line()
+        for byte in bytes_:
+            self._chunk.write(byte, line)
+
+    def _emit_return(self):
+        if self.current.function_type == FunctionType.INITIALIZER:
+            self._emit(OpCode.GET_LOCAL, 0)
+        else:
+            self._emit(OpCode.NIL)
+        self._emit(OpCode.RETURN)
+
+    def _make_constant(self, value) -> int:
+        constant = self._chunk.add_constant(value)
+        if constant >= UINT8_COUNT:
+            self._error(self._token, "Too many constants in one chunk.")
+        return constant
+
+    def _identifier_constant(self, name: Token) -> int:
+        identifiers = self.current.identifiers
+        if name.lexeme not in identifiers:
+            self._see(name)
+            identifiers[name.lexeme] = self._make_constant(name.lexeme)
+        return identifiers[name.lexeme]
+
+    def _emit_jump(self, op: OpCode) -> int:
+        self._emit(op, 0xFF, 0xFF)
+        return len(self._chunk.code) - 2
+
+    def _patch_jump(self, offset: int):
+        # -2 to adjust for the jump offset itself.
+        jump = len(self._chunk.code) - offset - 2
+        if jump > MAX_JUMP:
+            self._error(self._token, "Too much code to jump over.")
+        self._chunk.code[offset] = (jump >> 8) & 0xFF
+        self._chunk.code[offset + 1] = jump & 0xFF
+
+    def _emit_loop(self, loop_start: int):
+        self._emit(OpCode.LOOP)
+        offset = len(self._chunk.code) - loop_start + 2
+        if offset > MAX_JUMP:
+            self._error(self._token, "Loop body too large.")
+        self._emit((offset >> 8) & 0xFF, offset & 0xFF)
+
+    def _error(self, token: Optional[Token], message: str):
+        self._had_error = True
+        if token is None:
+            self.error_reporter.error(0, message)
+        else:
+            self.error_reporter.token_error(token, message)
+        raise CompileError()
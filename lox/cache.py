@@ -0,0 +1,159 @@
+"""
+An on-disk cache of scanned, parsed and resolved programs: a `.pyc` for Lox.
+
+A program is stored as a pickle of its statements plus everything the Resolver
+told the interpreter, so a warm start skips the Scanner, Parser and Resolver.
+Entries are keyed by a hash of the source and of the interpreter's own code,
+so editing either one means a miss rather than a stale hit. When the cache
+grows past `max_bytes`, the least recently used entries are deleted.
+"""
+import hashlib
+import mmap
+import os
+import pickle
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .expression import Assign, Variable
+from .statement import Stmt
+
+# Bump if the format of cache entries changes.
+FORMAT_VERSION = 1
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+SUFFIX = ".loxc"
+
+_interpreter_version: Optional[str] = None
+
+
+def interpreter_version() -> str:
+    """
+    A hash of the interpreter's source, so any change to it (eg to an AST
+    class) invalidates everything cached by the old version.
+    """
+    global _interpreter_version
+    if _interpreter_version is None:
+        digest = hashlib.sha256(b"%d %s" % (FORMAT_VERSION, sys.version.encode()))
+        package = os.path.dirname(os.path.abspath(__file__))
+        for name in sorted(os.listdir(package)):
+            if name.endswith(".py"):
+                with open(os.path.join(package, name), "rb") as f:
+                    digest.update(name.encode() + b"\0" + f.read())
+        _interpreter_version = digest.hexdigest()
+    return _interpreter_version
+
+
+@dataclass
+class ResolvedProgram:
+    """
+    Statements, and the Resolver's results for them.
+
+    The Resolver stores where locals are on the nodes themselves, so they're
+    cached along with the statements. This is passed to it in place of the
+    interpreter, to record the uses of globals by name, since each interpreter
+    numbers its globals itself; they're replayed into a real interpreter later.
+    """
+    statements: list[Stmt]
+    global_resolutions: list[tuple[Variable | Assign, str]] = field(default_factory=list)
+
+    def resolve_global(self, expr: Variable | Assign, name: str):
+        self.global_resolutions.append((expr, name))
+
+    def replay(self, interpreter):
+        for expr, name in self.global_resolutions:
+            interpreter.resolve_global(expr, name)
+
+
+class ProgramCache:
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path_for(self, source: str | bytes | mmap.mmap) -> str:
+        digest = hashlib.sha256(interpreter_version().encode())
+        if isinstance(source, str):
+            source = source.encode("utf-8", "surrogatepass")
+        digest.update(source)
+        return os.path.join(self.directory, digest.hexdigest() + SUFFIX)
+
+    def load(self, source: str | bytes | mmap.mmap) -> Optional[ResolvedProgram]:
+        path = self.path_for(source)
+        try:
+            with open(path, "rb") as f:
+                program = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Truncated or otherwise corrupt; throw it away and start over.
+            self._remove(path)
+            return None
+        if not isinstance(program, ResolvedProgram):
+            self._remove(path)
+            return None
+        try:
+            # Eviction is least recently *used*, so count this as a use.
+            os.utime(path)
+        except OSError:
+            pass
+        return program
+
+    def store(self, source: str | bytes | mmap.mmap, program: ResolvedProgram):
+        """
+        Best effort: failing to write the cache shouldn't stop the program running.
+        """
+        try:
+            data = pickle.dumps(program, protocol=pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            # Very deeply nested code; just don't cache it.
+            return
+        if len(data) > self.max_bytes:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            # Write then rename, so other processes never see half a file.
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, self.path_for(source))
+        except OSError:
+            self._remove(temp_path)
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        Delete least recently used entries until we're within max_bytes.
+        """
+        entries = []
+        total = 0
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # Another process beat us to it.
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,146 @@
+"""
+Bytecode for the VM backend, following clox:
+https://craftinginterpreters.com/chunks-of-bytecode.html
+
+Each instruction is a one-byte OpCode followed by its operands.
+Operands are one byte, except jump offsets, which are two (big-endian).
+"""
+import enum
+from typing import Any
+
+
+class OpCode(enum.IntEnum):
+    CONSTANT = 0
+    NIL = enum.auto()
+    TRUE = enum.auto()
+    FALSE = enum.auto()
+    POP = enum.auto()
+    GET_LOCAL = enum.auto()
+    SET_LOCAL = enum.auto()
+    GET_GLOBAL = enum.auto()
+    DEFINE_GLOBAL = enum.auto()
+    SET_GLOBAL = enum.auto()
+    GET_UPVALUE = enum.auto()
+    SET_UPVALUE = enum.auto()
+    GET_PROPERTY = enum.auto()
+    SET_PROPERTY = enum.auto()
+    GET_SUPER = enum.auto()
+    EQUAL = enum.auto()
+    GREATER = enum.auto()
+    GREATER_EQUAL = enum.auto()
+    LESS = enum.auto()
+    LESS_EQUAL = enum.auto()
+    ADD = enum.auto()
+    SUBTRACT = enum.auto()
+    MULTIPLY = enum.auto()
+    DIVIDE = enum.auto()
+    NOT = enum.auto()
+    NEGATE = enum.auto()
+    PRINT = enum.auto()
+    JUMP = enum.auto()
+    JUMP_IF_FALSE = enum.auto()
+    LOOP = enum.auto()
+    CALL = enum.auto()
+    INVOKE = enum.auto()
+    SUPER_INVOKE = enum.auto()
+    CLOSURE = enum.auto()
+    CLOSE_UPVALUE = enum.auto()
+    RETURN = enum.auto()
+    CLASS = enum.auto()
+    INHERIT = enum.auto()
+    METHOD = enum.auto()
+
+
+# How many operand bytes follow each opcode, apart from CLOSURE,
+# which is followed by a variable number of upvalue descriptions.
+OPERAND_BYTES = {
+    OpCode.CONSTANT: 1,
+    OpCode.GET_LOCAL: 1,
+    OpCode.SET_LOCAL: 1,
+    OpCode.GET_GLOBAL: 1,
+    OpCode.DEFINE_GLOBAL: 1,
+    OpCode.SET_GLOBAL: 1,
+    OpCode.GET_UPVALUE: 1,
+    OpCode.SET_UPVALUE: 1,
+    OpCode.GET_PROPERTY: 1,
+    OpCode.SET_PROPERTY: 1,
+    OpCode.GET_SUPER: 1,
+    OpCode.JUMP: 2,
+    OpCode.JUMP_IF_FALSE: 2,
+    OpCode.LOOP: 2,
+    OpCode.CALL: 1,
+    OpCode.INVOKE: 2,
+    OpCode.SUPER_INVOKE: 2,
+    OpCode.CLASS: 1,
+    OpCode.METHOD: 1,
+}
+
+
+class Chunk:
+    """
+    A flat sequence of instructions plus the constants they refer to,
+    and the source line of every byte for runtime error messages.
+    """
+
+    def __init__(self):
+        self.code = bytearray()
+        self.lines: list[int] = []
+        self.constants: list[Any] = []
+
+    def write(self, byte: int, line: int):
+        self.code.append(byte)
+        self.lines.append(line)
+
+    def add_constant(self, value: Any) -> int:
+        self.constants.append(value)
+        return len(self.constants) - 1
+
+    def disassemble(self, name: str) -> str:
+        """
+        Human readable listing, for debugging the compiler.
+        """
+        lines = ["== %s ==" % name]
+        offset = 0
+        while offset < len(self.code):
+            op = OpCode(self.code[offset])
+            operands = list(self.code[offset + 1: offset + 1 + OPERAND_BYTES.get(op, 0)])
+            text = "%04d %4d %-16s" % (offset, self.lines[offset], op.name)
+            if op in (OpCode.JUMP, OpCode.JUMP_IF_FALSE, OpCode.LOOP):
+                text += " %d" % (operands[0] << 8 | operands[1])
+            elif op == OpCode.CLOSURE:
+                function = self.constants[self.code[offset + 1]]
+                operands = [self.code[offset + 1]]
+                operands += self.code[offset + 2: offset + 2 + 2 * function.upvalue_count]
+                text += " %s" % function
+            elif op in (OpCode.CONSTANT, OpCode.GET_GLOBAL, OpCode.DEFINE_GLOBAL,
+                        OpCode.SET_GLOBAL, OpCode.GET_PROPERTY, OpCode.SET_PROPERTY,
+                        OpCode.GET_SUPER, OpCode.CLASS, OpCode.METHOD,
+                        OpCode.INVOKE, OpCode.SUPER_INVOKE):
+                text += " %r" % (self.constants[operands[0]],)
+                if len(operands) > 1:
+                    text += " (%d args)" % operands[1]
+            elif operands:
+                text += " %d" % operands[0]
+            lines.append(text)
+            offset += 1 + len(operands)
+        return "\n".join(lines)
+
+
+class FunctionProto:
+    """
+    A compiled function: its code, and how many upvalues its closures capture.
+    The top level script is one of these too, with no name.
+    """
+
+    def __init__(self, name: str | None = None):
+        self.name = name
+        self.arity = 0
+        self.upvalue_count = 0
+        self.chunk = Chunk()
+
+    def __str__(self):
+        if self.name is None:
+            return "<script>"
+        return "<fn %s>" % self.name
+
+    __repr__ = __str__
@@ -0,0 +1,893 @@
+"""
+An alternative execution engine to the tree-walking Interpreter.
+
+Instead of visiting the AST every time a node is evaluated, we visit it once,
+turning each node into a Python closure that does only the work that node needs
+(eg "compare local slot 0 with the constant 2"). Running the program is then
+just calling closures, with no double dispatch and no `match` on operators.
+
+Every closure takes the current Environment as its only argument.
+Expression closures return the value of the expression.
+Statement closures return NORMAL when execution should carry on,
+or else the value of the `return` statement that stopped it.
+"""
+import operator
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional
+
+from .environment import UNDEFINED, Cell, Environment, make_cells
+from .error import LoxRuntimeError
+from .expression import (
+    Assign,
+    Binary,
+    Call,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from .function import LoxFunction
+from .interpreter import CallState, Interpreter, divide
+from .lox_callable import LoxCallable
+from .lox_class import LoxClass, LoxInstance
+from .memo import MISSING, Memo
+from .statement import (
+    Block,
+    ClassStmt,
+    ExpressionStmt,
+    For,
+    Function,
+    If,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+from .token import Token
+from .tokentype import TokenType
+
+# Returned by statements that didn't `return`.
+NORMAL: Any = object()
+
+ExprClosure = Callable[[Environment], Any]
+StmtClosure = Callable[[Environment], Any]
+
+NUMERIC_OPERATORS = {
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+    TokenType.MINUS: operator.sub,
+    TokenType.SLASH: divide,
+    TokenType.STAR: operator.mul,
+}
+
+
+@dataclass(eq=False)
+class CompiledFunction(LoxFunction):
+    """
+    A LoxFunction whose body has already been compiled to a closure.
+    """
+    body: StmtClosure = field(kw_only=True)
+
+    def call(self, interpreter, arguments: list):
+        interpreter.innermost_call_state.return_value = self.invoke(arguments)
+
+    def call_method(self, interpreter, instance, arguments: list):
+        interpreter.innermost_call_state.return_value = self.invoke_method(instance, arguments)
+
+    def invoke(self, arguments: list) -> Any:
+        """
+        Run the function and return its result.
+        Compiled call sites use this directly, skipping the CallState dance.
+        """
+        if self.instance is not None:
+            return self.invoke_method(self.instance, arguments)
+        result = self.body(Environment(self.closure, arguments))
+        if result is NORMAL:
+            return None
+        return result
+
+    def invoke_method(self, instance, arguments: list) -> Any:
+        """
+        As invoke(), for a method with `this` as the given instance.
+        """
+        result = self.body(Environment(self.closure, [instance, *arguments]))
+        if self.is_initializer:
+            return instance
+        if result is NORMAL:
+            return None
+        return result
+
+
+@dataclass(eq=False)
+class MemoizedCompiledFunction(CompiledFunction):
+    """
+    A pure CompiledFunction, whose results are remembered in a Memo.
+    Call sites' fast path for CompiledFunction skips these, and goes via call().
+    """
+    memo: Memo = field(kw_only=True)
+
+    def invoke(self, arguments: list) -> Any:
+        key = self.memo.key(self, arguments)
+        if key is None:
+            return super().invoke(arguments)
+        value = self.memo.get(key)
+        if value is MISSING:
+            value = super().invoke(arguments)
+            self.memo.store(key, value)
+        return value
+
+
+class ClosureInterpreter(Interpreter):
+    """
+    Drop-in replacement for the Interpreter that compiles before it runs.
+
+    Resolution, runtime errors and the runtime objects (classes, instances,
+    environments) are all shared with the tree-walking Interpreter.
+    """
+
+    def __init__(self, error_reporter=None):
+        super().__init__(error_reporter=error_reporter, use_resolver=True)
+
+    def interpret(self, statements: List[Stmt]):
+        if self.memo is not None:
+            self.memo.analyze(statements)
+        compiler = ClosureCompiler(self)
+        compiled = [compiler.compile_stmt(statement) for statement in statements]
+        try:
+            for statement in compiled:
+                statement(self.globals)
+        except LoxRuntimeError as _error:
+            self.error_reporter.runtime_error(_error)
+
+
+class ClosureCompiler(ExprVisitor, StmtVisitor):
+    """
+    Visits each node once, returning a closure that evaluates or executes it.
+    """
+
+    def __init__(self, interpreter: Interpreter):
+        self.interpreter = interpreter
+        # How many scopes deep we are; zero means declarations are global.
+        self._scope_depth = 0
+
+    def compile_stmt(self, stmt: Stmt) -> StmtClosure:
+        return stmt.accept(self)
+
+    def compile_expr(self, expr: Expr) -> ExprClosure:
+        return expr.accept(self)
+
+    ############################################################
+    # StmtVisitor methods
+
+    def visit_expression_stmt(self, stmt: ExpressionStmt):
+        expression = self.compile_expr(stmt.expression)
+
+        def expression_stmt(env):
+            expression(env)
+            return NORMAL
+
+        return expression_stmt
+
+    def visit_print_stmt(self, stmt: Print):
+        expression = self.compile_expr(stmt.expression)
+        stringify = self.interpreter.stringify
+
+        def print_stmt(env):
+            print(stringify(expression(env)))
+            return NORMAL
+
+        return print_stmt
+
+    def visit_var_stmt(self, stmt: Var):
+        define = self._definer(stmt.name.lexeme, stmt.captured)
+        if stmt.initializer is None:
+
+            def var_stmt_nil(env):
+                define(env, None)
+                return NORMAL
+
+            return var_stmt_nil
+
+        initializer = self.compile_expr(stmt.initializer)
+
+        def var_stmt(env):
+            define(env, initializer(env))
+            return NORMAL
+
+        return var_stmt
+
+    def visit_block_stmt(self, stmt: Block):
+        if not stmt.needs_scope:
+            return self._sequence([self.compile_stmt(s) for s in stmt.statements])
+        self._scope_depth += 1
+        body = self._sequence([self.compile_stmt(s) for s in stmt.statements])
+        self._scope_depth -= 1
+
+        def block(env):
+            return body(Environment(env))
+
+        return block
+
+    def visit_if_stmt(self, stmt: If):
+        condition = self.compile_expr(stmt.condition)
+        then_branch = self.compile_stmt(stmt.then_branch)
+        if stmt.else_branch is None:
+
+            def if_stmt(env):
+                value = condition(env)
+                if value is not None and value is not False:
+                    return then_branch(env)
+                return NORMAL
+
+            return if_stmt
+
+        else_branch = self.compile_stmt(stmt.else_branch)
+
+        def if_else_stmt(env):
+            value = condition(env)
+            if value is not None and value is not False:
+                return then_branch(env)
+            return else_branch(env)
+
+        return if_else_stmt
+
+    def visit_while_stmt(self, stmt: While):
+        condition = self.compile_expr(stmt.condition)
+        body = self.compile_stmt(stmt.statement)
+
+        def while_stmt(env):
+            while True:
+                value = condition(env)
+                if value is None or value is False:
+                    return NORMAL
+                result = body(env)
+                if result is not NORMAL:
+                    return result
+
+        return while_stmt
+
+    def visit_for_stmt(self, stmt: For):
+        initializer = None
+        if stmt.initializer is not None:
+            self._scope_depth += 1
+            initializer = self.compile_stmt(stmt.initializer)
+        condition = None if stmt.condition is None else self.compile_expr(stmt.condition)
+        increment = None if stmt.increment is None else self.compile_expr(stmt.increment)
+        reuse_body_env = stmt.reuse_body_scope
+        if reuse_body_env:
+            assert isinstance(stmt.body, Block)
+            self._scope_depth += 1
+            body = self._sequence([self.compile_stmt(s) for s in stmt.body.statements])
+            self._scope_depth -= 1
+        else:
+            body = self.compile_stmt(stmt.body)
+        if initializer is not None:
+            self._scope_depth -= 1
+
+        def for_stmt(env):
+            if initializer is not None:
+                env = Environment(env)
+                initializer(env)
+            # If no closure can see the body's variables, one scope does for every iteration.
+            body_env = Environment(env) if reuse_body_env else env
+            slots = body_env.slots
+            while True:
+                if condition is not None:
+                    value = condition(env)
+                    if value is None or value is False:
+                        return NORMAL
+                if reuse_body_env:
+                    slots.clear()
+                result = body(body_env)
+                if result is not NORMAL:
+                    return result
+                if increment is not None:
+                    increment(env)
+
+        return for_stmt
+
+    def visit_function_statement(self, stmt: Function):
+        define = self._definer(stmt.name.lexeme)
+        body = self._compile_function_body(stmt)
+        make_closure = self._closure_maker(stmt)
+        memo = self.interpreter.memo
+        make_function: Callable[[Environment], CompiledFunction]
+        if memo is not None and memo.is_pure(stmt):
+
+            def make_function(env):
+                return MemoizedCompiledFunction(stmt, make_closure(env), body=body, memo=memo)
+
+        else:
+
+            def make_function(env):
+                return CompiledFunction(stmt, make_closure(env), body=body)
+
+        if stmt.captured:
+
+            def captured_function_stmt(env):
+                # Defined first, so the function can capture itself.
+                cell = Cell()
+                define(env, cell)
+                cell.value = make_function(env)
+                return NORMAL
+
+            return captured_function_stmt
+
+        def function_stmt(env):
+            define(env, make_function(env))
+            return NORMAL
+
+        return function_stmt
+
+    def visit_return_stmt(self, stmt: Return):
+        if stmt.value is None:
+
+            def return_nil(env):
+                return None
+
+            return return_nil
+
+        # The expression closure already returns exactly what we want.
+        return self.compile_expr(stmt.value)
+
+    def visit_class_stmt(self, stmt: ClassStmt):
+        define = self._definer(stmt.name.lexeme)
+        name = stmt.name.lexeme
+        methods = [
+            (method, method.name.lexeme == "init", self._compile_function_body(method),
+             self._closure_maker(method))
+            for method in stmt.methods
+        ]
+        captured = stmt.captured
+        superclass_expr = stmt.superclass
+        superclass_closure = None
+        if superclass_expr is not None:
+            superclass_closure = self.compile_expr(superclass_expr)
+
+        def class_stmt(env):
+            cell = None
+            if captured:
+                # Defined first, since methods may capture it.
+                cell = Cell()
+                define(env, cell)
+            superclass = None
+            method_env = env
+            if superclass_closure is not None:
+                assert superclass_expr is not None
+                superclass = superclass_closure(env)
+                if not isinstance(superclass, LoxClass):
+                    raise LoxRuntimeError(
+                        "Superclass must be a class.", superclass_expr.name
+                    )
+                method_env = Environment(env, [Cell(superclass)])
+            functions: dict[str, LoxFunction] = {
+                method.name.lexeme: CompiledFunction(
+                    method, make_closure(method_env), is_initializer=is_initializer,
+                    body=body
+                )
+                for method, is_initializer, body, make_closure in methods
+            }
+            klass = LoxClass(name, functions, superclass)
+            if cell is None:
+                define(env, klass)
+            else:
+                cell.value = klass
+            return NORMAL
+
+        return class_stmt
+
+    ############################################################
+    # ExprVisitor methods
+
+    def visit_literal_expr(self, expr: Literal):
+        value = expr.value
+
+        def literal(env):
+            return value
+
+        return literal
+
+    def visit_grouping_expr(self, expr: Grouping):
+        # Groupings only matter to the parser.
+        return self.compile_expr(expr.expression)
+
+    def visit_unary_expr(self, expr: Unary):
+        right = self.compile_expr(expr.right)
+        if expr.operator.tokentype == TokenType.BANG:
+
+            def not_(env):
+                value = right(env)
+                return value is None or value is False
+
+            return not_
+
+        token = expr.operator
+
+        def negate(env):
+            value = right(env)
+            if type(value) is float:
+                return -value
+            raise LoxRuntimeError("Operand must be a number.", token)
+
+        return negate
+
+    def visit_binary_expr(self, expr: Binary):
+        ttype = expr.operator.tokentype
+        if ttype in NUMERIC_OPERATORS:
+            return self._numeric_binary(expr, NUMERIC_OPERATORS[ttype])
+        if ttype == TokenType.PLUS:
+            return self._plus(expr)
+        equality = self._equality(expr)
+        if ttype == TokenType.EQUAL_EQUAL:
+            return equality
+
+        def not_equal(env):
+            return not equality(env)
+
+        return not_equal
+
+    def visit_variable_expr(self, expr: Variable):
+        return self._variable_reader(expr, expr.name)
+
+    def visit_assign_expr(self, expr: Assign):
+        value = self.compile_expr(expr.value)
+        location = expr.location
+        if location is None:
+            globals_ = self.interpreter.globals
+            slots = globals_.slots
+            global_slot = expr.global_slot
+            assert global_slot is not None  # The resolver gave every global one.
+            name = expr.name
+
+            def assign_global(env):
+                result = value(env)
+                if slots[global_slot] is UNDEFINED:
+                    globals_.assign_slot(global_slot, name, result)
+                slots[global_slot] = result
+                return result
+
+            return assign_global
+
+        depth, slot, is_cell = location
+        if is_cell:
+
+            def assign_cell(env):
+                result = env.get_at(depth, slot).value = value(env)
+                return result
+
+            return assign_cell
+        if depth == 0:
+
+            def assign_local(env):
+                result = env.slots[slot] = value(env)
+                return result
+
+            return assign_local
+
+        def assign_enclosing(env):
+            result = value(env)
+            env.assign_at(depth, slot, result)
+            return result
+
+        return assign_enclosing
+
+    def visit_logical_expr(self, expr: Logical):
+        left = self.compile_expr(expr.left)
+        right = self.compile_expr(expr.right)
+        if expr.operator.tokentype == TokenType.OR:
+
+            def or_(env):
+                value = left(env)
+                if value is not None and value is not False:
+                    return value
+                return right(env)
+
+            return or_
+
+        def and_(env):
+            value = left(env)
+            if value is None or value is False:
+                return value
+            return right(env)
+
+        return and_
+
+    def visit_call_expr(self, expr: Call):
+        arguments = [self.compile_expr(arg) for arg in expr.arguments]
+        paren = expr.paren
+        argc = len(arguments)
+        call_stack = self.interpreter._call_stack
+        interpreter = self.interpreter
+
+        def arity_error(arity):
+            return LoxRuntimeError(
+                "Expected %d arguments but got %d." % (arity, argc), paren
+            )
+
+        def call_value(env, callee):
+            if type(callee) is CompiledFunction:
+                args = [arg(env) for arg in arguments]
+                if len(callee.declaration.parameters) != argc:
+                    raise arity_error(callee.arity())
+                return callee.invoke(args)
+            if not isinstance(callee, LoxCallable):
+                raise LoxRuntimeError("Can only call functions and classes.", paren)
+            args = [arg(env) for arg in arguments]
+            if type(callee) is LoxClass:
+                initializer = callee.initializer
+                if callee.arity() != argc:
+                    raise arity_error(callee.arity())
+                instance = LoxInstance(callee)
+                if initializer is not None:
+                    assert isinstance(initializer, CompiledFunction)
+                    initializer.invoke_method(instance, args)
+                return instance
+            if callee.arity() != argc:
+                raise arity_error(callee.arity())
+            # Native functions speak the interpreter's CallState protocol.
+            state = CallState()
+            call_stack.append(state)
+            try:
+                callee.call(interpreter, args)
+            finally:
+                call_stack.pop()
+            return state.return_value
+
+        callee_expr = expr.callee
+        if type(callee_expr) is Get:
+            # `obj.method(...)`: as in the Interpreter, call the method without
+            # binding it, unless it turns out to be a field.
+            object_ = self.compile_expr(callee_expr.object_)
+            name = callee_expr.name
+            lexeme = name.lexeme
+            get_cache = callee_expr.cache
+            field_cache = callee_expr.field_cache
+
+            def invoke(env):
+                obj = object_(env)
+                if not isinstance(obj, LoxInstance):
+                    raise LoxRuntimeError("Only instances have properties.", name)
+                if obj.shape is field_cache.shape:
+                    slot = field_cache.slot
+                else:
+                    slot = obj.field_slot(lexeme, field_cache)
+                if slot is not None:
+                    return call_value(env, obj.values[slot])
+                method = get_cache.method
+                if get_cache.klass is not obj.klass or method is None:
+                    method = obj.find_method(name, get_cache)
+                assert isinstance(method, CompiledFunction)
+                args = [arg(env) for arg in arguments]
+                if len(method.declaration.parameters) != argc:
+                    raise arity_error(method.arity())
+                return method.invoke_method(obj, args)
+
+            return invoke
+
+        if type(callee_expr) is Super:
+            find_super_method = self._super_method_finder(callee_expr)
+
+            def super_invoke(env):
+                obj, method = find_super_method(env)
+                args = [arg(env) for arg in arguments]
+                if len(method.declaration.parameters) != argc:
+                    raise arity_error(method.arity())
+                return method.invoke_method(obj, args)
+
+            return super_invoke
+
+        callee_closure = self.compile_expr(callee_expr)
+
+        def call(env):
+            callee = callee_closure(env)
+            # Inline call_value's common case, to save a Python call per Lox call.
+            if type(callee) is CompiledFunction:
+                args = [arg(env) for arg in arguments]
+                if len(callee.declaration.parameters) != argc:
+                    raise arity_error(callee.arity())
+                return callee.invoke(args)
+            return call_value(env, callee)
+
+        return call
+
+    def visit_get_expr(self, expr: Get):
+        object_ = self.compile_expr(expr.object_)
+        name = expr.name
+        cache = expr.cache
+        field_cache = expr.field_cache
+
+        def get(env):
+            obj = object_(env)
+            if isinstance(obj, LoxInstance):
+                if obj.shape is field_cache.shape and field_cache.slot is not None:
+                    return obj.values[field_cache.slot]
+                return obj.get(name, cache, field_cache)
+            raise LoxRuntimeError("Only instances have properties.", name)
+
+        return get
+
+    def visit_set_expr(self, expr: Set):
+        object_ = self.compile_expr(expr.object_)
+        value = self.compile_expr(expr.value)
+        name = expr.name
+        field_cache = expr.field_cache
+
+        def set_(env):
+            obj = object_(env)
+            if not isinstance(obj, LoxInstance):
+                raise LoxRuntimeError("Only instances have fields.", name)
+            result = value(env)
+            if obj.shape is field_cache.shape:
+                slot, next_shape = field_cache.slot, field_cache.next_shape
+                if slot is not None:
+                    obj.values[slot] = result
+                    return result
+                if next_shape is not None:
+                    obj.shape = next_shape
+                    obj.values.append(result)
+                    return result
+            obj.set(name, result, field_cache)
+            return result
+
+        return set_
+
+    def visit_this_expr(self, expr: This):
+        return self._variable_reader(expr, expr.keyword)
+
+    def visit_super_expr(self, expr: Super):
+        find_super_method = self._super_method_finder(expr)
+
+        def super_(env):
+            obj, method = find_super_method(env)
+            return obj.bind(method)
+
+        return super_
+
+    def _super_method_finder(self, expr: Super):
+        get_superclass = self._variable_reader(expr, expr.keyword)
+        get_this = self._variable_reader(expr.this, expr.keyword)
+        method_name = expr.method
+        cache = expr.cache
+
+        def find_super_method(env):
+            superclass = get_superclass(env)
+            obj = get_this(env)
+            method = cache.find_method(superclass, method_name.lexeme)
+            if method is None:
+                raise LoxRuntimeError(
+                    "Undefined property '%s'." % method_name.lexeme, method_name
+                )
+            return obj, method
+
+        return find_super_method
+
+    ############################################################
+    # Helpers
+
+    def _sequence(self, statements: list[StmtClosure]) -> StmtClosure:
+        if len(statements) == 1:
+            return statements[0]
+
+        def sequence(env):
+            for statement in statements:
+                result = statement(env)
+                if result is not NORMAL:
+                    return result
+            return NORMAL
+
+        return sequence
+
+    def _compile_function_body(self, stmt: Function) -> StmtClosure:
+        self._scope_depth += 1
+        body = self._sequence([self.compile_stmt(s) for s in stmt.body])
+        self._scope_depth -= 1
+        cell_slots = stmt.cell_slots
+        if not cell_slots:
+            return body
+
+        def body_with_cells(env):
+            # Parameters that closures capture go in cells first.
+            make_cells(env, cell_slots)
+            return body(env)
+
+        return body_with_cells
+
+    def _definer(self, name: str, captured: bool = False) -> Callable[[Environment, Any], None]:
+        if self._scope_depth == 0:
+            slots = self.interpreter.globals.slots
+            global_slot = self.interpreter.globals.slot_for(name)
+
+            def define_global(env, value):
+                slots[global_slot] = value
+
+            return define_global
+
+        if captured:
+
+            def define_cell(env, value):
+                env.slots.append(Cell(value))
+
+            return define_cell
+
+        def define_local(env, value):
+            env.slots.append(value)
+
+        return define_local
+
+    def _closure_maker(self, function: Function) -> Callable[[Environment], Environment]:
+        # As Interpreter.closure_for: just the cells the function uses.
+        free = function.free
+
+        def make_closure(env):
+            return Environment(None, [env.get_at(depth, slot) for depth, slot in free])
+
+        return make_closure
+
+    def _variable_reader(self, expr: Variable | This | Super, name: Token) -> ExprClosure:
+        location = expr.location
+        if location is None:
+            return self._global_reader(expr, name)  # type: ignore[arg-type]
+        depth, slot, is_cell = location
+        if is_cell:
+            if depth == 1:
+                # Free in the function we're in, rather than in one of its blocks.
+
+                def free(env):
+                    return env.enclosing.slots[slot].value
+
+                return free
+
+            def cell(env):
+                return env.get_at(depth, slot).value
+
+            return cell
+        if depth == 0:
+
+            def local(env):
+                return env.slots[slot]
+
+            return local
+        if depth == 1:
+
+            def enclosing(env):
+                return env.enclosing.slots[slot]
+
+            return enclosing
+
+        def ancestor(env):
+            return env.get_at(depth, slot)
+
+        return ancestor
+
+    def _global_reader(self, expr: Variable, name: Token) -> ExprClosure:
+        globals_ = self.interpreter.globals
+        slots = globals_.slots
+        global_slot = expr.global_slot
+        assert global_slot is not None  # The resolver gave every global one.
+
+        def global_(env):
+            value = slots[global_slot]
+            if value is UNDEFINED:
+                return globals_.get_slot(global_slot, name)
+            return value
+
+        return global_
+
+    def _local_slot(self, expr: Expr) -> Optional[int]:
+        # The slot of a variable in the innermost scope, if that's what this is.
+        if isinstance(expr, Variable):
+            location = expr.location
+            if location is not None and location[0] == 0 and not location[2]:
+                return location[1]
+        return None
+
+    def _constant(self, expr: Expr) -> Optional[Literal]:
+        while isinstance(expr, Grouping):
+            expr = expr.expression
+        if isinstance(expr, Literal):
+            return expr
+        return None
+
+    def _numeric_binary(self, expr: Binary, op) -> ExprClosure:
+        token = expr.operator
+        constant = self._constant(expr.right)
+        if constant is not None and type(constant.value) is float:
+            c = constant.value
+            slot = self._local_slot(expr.left)
+            if slot is not None:
+
+                def local_op_constant(env):
+                    left = env.slots[slot]
+                    if type(left) is float:
+                        return op(left, c)
+                    raise LoxRuntimeError("Operands must be numbers.", token)
+
+                return local_op_constant
+
+            left_closure = self.compile_expr(expr.left)
+
+            def op_constant(env):
+                left = left_closure(env)
+                if type(left) is float:
+                    return op(left, c)
+                raise LoxRuntimeError("Operands must be numbers.", token)
+
+            return op_constant
+
+        left_closure = self.compile_expr(expr.left)
+        right_closure = self.compile_expr(expr.right)
+
+        def numeric(env):
+            left = left_closure(env)
+            right = right_closure(env)
+            if type(left) is float and type(right) is float:
+                return op(left, right)
+            raise LoxRuntimeError("Operands must be numbers.", token)
+
+        return numeric
+
+    def _plus(self, expr: Binary) -> ExprClosure:
+        token = expr.operator
+        constant = self._constant(expr.right)
+        if constant is not None and type(constant.value) is float:
+            c = constant.value
+            slot = self._local_slot(expr.left)
+            if slot is not None:
+
+                def local_plus_number(env):
+                    left = env.slots[slot]
+                    if type(left) is float:
+                        return left + c
+                    raise LoxRuntimeError(
+                        "Operands must be two numbers or two strings.", token
+                    )
+
+                return local_plus_number
+
+        left_closure = self.compile_expr(expr.left)
+        right_closure = self.compile_expr(expr.right)
+
+        def plus(env):
+            left = left_closure(env)
+            right = right_closure(env)
+            kind = type(left)
+            if kind is type(right) and (kind is float or kind is str):
+                return left + right
+            raise LoxRuntimeError(
+                "Operands must be two numbers or two strings.", token
+            )
+
+        return plus
+
+    def _equality(self, expr: Binary) -> ExprClosure:
+        left_closure = self.compile_expr(expr.left)
+        constant = self._constant(expr.right)
+        if constant is not None and type(constant.value) in (float, str):
+            # Only a value of the same type can equal a number or string.
+            c = constant.value
+            kind = type(c)
+
+            def equals_constant(env):
+                left = left_closure(env)
+                return type(left) is kind and left == c
+
+            return equals_constant
+
+        right_closure = self.compile_expr(expr.right)
+        is_equal = self.interpreter._is_equal
+
+        def equals(env):
+            return is_equal(left_closure(env), right_closure(env))
+
+        return equals
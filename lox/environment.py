@@ -3,45 +3,138 @@ from .error import LoxRuntimeError
 from .token import Token
 
 class Environment:
-    def __init__(self, enclosing: Optional['Environment']=None):
-        self._values: dict[str, Any] = {}
-        self._enclosing = enclosing
+    """
+    One scope's worth of variables.
+
+    Variables located by the resolver (chapter 11) live in the `slots` list and are
+    accessed by index. Every scope when running without the resolver (chapter 8)
+    looks them up by name instead.
+    """
+    __slots__ = ("_values", "slots", "enclosing")
+
+    def __init__(self, enclosing: Optional['Environment']=None, slots: Optional[list]=None):
+        # Only created on demand, since most scopes never need a name lookup.
+        self._values: Optional[dict[str, Any]] = None
+        self.slots: list = [] if slots is None else slots
+        self.enclosing = enclosing
 
     def define(self, name: str, value: Any):
+        if self._values is None:
+            self._values = {}
         self._values[name] = value
 
+    def define_slot(self, value: Any):
+        # The resolver numbers each scope's locals in declaration order,
+        # which is also the order they get defined at runtime.
+        self.slots.append(value)
+
     def get(self, name: Token) -> Any:
         # Resolution pre-chapter 11: we walk back up the chain
         # until we find the name.
-        if name.lexeme in self._values:
+        if self._values is not None and name.lexeme in self._values:
             return self._values[name.lexeme]
-        elif self._enclosing is not None:
-            return self._enclosing.get(name)
+        elif self.enclosing is not None:
+            return self.enclosing.get(name)
 
         raise LoxRuntimeError("Undefined variable '%s'." % name.lexeme, name)
 
-    def get_at(self, distance: int, name: str):
+    def get_at(self, distance: int, slot: int):
         # Resolution for chapter 11:
         # If static analysis has run as per chapter 11, using resolver,
         # then we know exactly where each variable was defined.
-        return self._ancestor(distance)._values[name]
+        if distance == 0:
+            return self.slots[slot]
+        return self._ancestor(distance).slots[slot]
 
     def _ancestor(self, distance: int) -> 'Environment':
         env: Optional[Environment] = self
         for i in range(distance):
             assert env is not None
-            env = env._enclosing
+            env = env.enclosing
         assert env is not None
         return env
 
     def assign(self, name: Token, value: Any):
-        if name.lexeme in self._values:
+        if self._values is not None and name.lexeme in self._values:
             self._values[name.lexeme] = value
             return
-        elif self._enclosing is not None:
-            return self._enclosing.assign(name, value)
+        elif self.enclosing is not None:
+            return self.enclosing.assign(name, value)
 
         raise LoxRuntimeError("Undefined variable '%s'." % name.lexeme, name)
 
-    def assign_at(self, distance: int, name: Token, value: Any):
-        self._ancestor(distance)._values[name.lexeme] = value
+    def assign_at(self, distance: int, slot: int, value: Any):
+        if distance == 0:
+            self.slots[slot] = value
+        else:
+            self._ancestor(distance).slots[slot] = value
+
+
+# What a global's slot holds until its declaration has run.
+UNDEFINED = object()
+
+
+class GlobalEnvironment(Environment):
+    """
+    The outermost scope. Its variables are in `slots` too, so each use of a
+    global can be resolved to its slot once, rather than looked up by name
+    every time it runs. Lox lets functions use globals that are declared
+    later, so a name gets its slot when it's first seen, which holds UNDEFINED
+    until the declaration runs.
+    """
+    __slots__ = ("_indexes",)
+
+    def __init__(self):
+        super().__init__()
+        self._indexes: dict[str, int] = {}
+
+    def slot_for(self, name: str) -> int:
+        index = self._indexes.get(name)
+        if index is None:
+            index = self._indexes[name] = len(self.slots)
+            self.slots.append(UNDEFINED)
+        return index
+
+    def define(self, name: str, value: Any):
+        self.slots[self.slot_for(name)] = value
+
+    def get(self, name: Token) -> Any:
+        return self.get_slot(self.slot_for(name.lexeme), name)
+
+    def get_slot(self, slot: int, name: Token) -> Any:
+        value = self.slots[slot]
+        if value is UNDEFINED:
+            raise LoxRuntimeError("Undefined variable '%s'." % name.lexeme, name)
+        return value
+
+    def assign(self, name: Token, value: Any):
+        self.assign_slot(self.slot_for(name.lexeme), name, value)
+
+    def assign_slot(self, slot: int, name: Token, value: Any):
+        if self.slots[slot] is UNDEFINED:
+            raise LoxRuntimeError("Undefined variable '%s'." % name.lexeme, name)
+        self.slots[slot] = value
+
+
+class Cell:
+    """
+    A box for a local variable that closures capture, shared between the
+    scope that declared it and every closure that uses it, so they all see
+    its assignments. Closures hold just the cells they need, rather than the
+    whole chain of environments they were declared in.
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any = None):
+        self.value = value
+
+    def __repr__(self):
+        return "Cell(%r)" % (self.value,)
+
+
+def make_cells(environment: Environment, slots: tuple[int, ...]):
+    """
+    Box the parameters (or `this`) at these slots, that closures capture.
+    """
+    for slot in slots:
+        environment.slots[slot] = Cell(environment.slots[slot])
@@ -1,12 +1,17 @@
 import sys
+from typing import Optional
 from .tokentype import TokenType
 from .token import Token
 
 
 class LoxRuntimeError(RuntimeError):
-    def __init__(self, message, token: Token):
+    def __init__(self, message, token: Optional[Token], line: Optional[int] = None):
+        """
+        Pass the token the error is about, or failing that, at least its line.
+        """
         super().__init__(str(message))
         self.token = token
+        self.line = token.line if token is not None else line
 
 
 class ErrorReporter:
@@ -39,4 +44,4 @@ class ErrorReporter:
 
     def runtime_error(self, error: LoxRuntimeError):
         self.had_runtime_error = True
-        print("%s\n[line %s]" % (error, error.token.line), file=sys.stderr)
+        print("%s\n[line %s]" % (error, error.line), file=sys.stderr)
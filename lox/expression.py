@@ -1,11 +1,16 @@
 import abc
-from dataclasses import dataclass
-from typing import Any, List
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
 
+from .inline_cache import InlineCache
+from .quickening import Quickening
+from .shape import FieldCache
 from .scanner import Token
 
 
 class Expr(abc.ABC):
+    # Whether it might call a function, as found by the StackInterpreter.
+    has_call: bool = False
 
     @abc.abstractmethod
     def accept(self, visitor: "ExprVisitor"):
@@ -17,6 +22,8 @@ class Binary(Expr):
     left: Expr
     operator: Token
     right: Expr
+    # What the tree-walkers have specialized it into. Not part of its identity.
+    quickening: Quickening = field(default_factory=Quickening, compare=False, repr=False)
 
     def accept(self, visitor):
         return visitor.visit_binary_expr(self)
@@ -33,6 +40,8 @@ class Grouping(Expr):
 @dataclass
 class Literal(Expr):
     value: object
+    # Where it came from, for error messages. Not part of its identity.
+    token: Optional[Token] = field(default=None, compare=False, repr=False)
 
     def accept(self, visitor):
         return visitor.visit_literal_expr(self)
@@ -42,6 +51,7 @@ class Literal(Expr):
 class Unary(Expr):
     operator: Token
     right: Expr
+    quickening: Quickening = field(default_factory=Quickening, compare=False, repr=False)
 
     def accept(self, visitor):
         return visitor.visit_unary_expr(self)
@@ -51,6 +61,9 @@ class Unary(Expr):
 class Assign(Expr):
     name: Token
     value: Expr
+    # Set by the resolver: (depth, slot, is_cell) if it's a local, as for Variable.
+    location: Optional[tuple[int, int, bool]] = field(default=None, compare=False, repr=False)
+    global_slot: Optional[int] = field(default=None, compare=False, repr=False)
 
     def accept(self, visitor) -> Any:
         return visitor.visit_assign_expr(self)
@@ -59,6 +72,11 @@ class Assign(Expr):
 @dataclass
 class Variable(Expr):
     name: Token
+    # Set by the resolver: for a local, how many environments up it is, its slot
+    # there, and whether that holds a Cell; for a global, its slot in the
+    # interpreter's GlobalEnvironment.
+    location: Optional[tuple[int, int, bool]] = field(default=None, compare=False, repr=False)
+    global_slot: Optional[int] = field(default=None, compare=False, repr=False)
 
     def accept(self, visitor):
         return visitor.visit_variable_expr(self)
@@ -69,6 +87,7 @@ class Logical(Expr):
     left: Expr
     operator: Token
     right: Expr
+    quickening: Quickening = field(default_factory=Quickening, compare=False, repr=False)
 
     def accept(self, visitor):
         return visitor.visit_logical_expr(self)
@@ -90,6 +109,10 @@ class Get(Expr):
     # Used for object.property access
     object_: Expr
     name: Token
+    # Which method `name` found on the classes seen here. Not part of its identity.
+    cache: InlineCache = field(default_factory=InlineCache, compare=False, repr=False)
+    # Where the instances seen here keep the field `name`, if they have it.
+    field_cache: FieldCache = field(default_factory=FieldCache, compare=False, repr=False)
 
     def accept(self, visitor):
         return visitor.visit_get_expr(self)
@@ -101,6 +124,8 @@ class Set(Expr):
     object_: Expr
     name: Token
     value: Expr
+    # Where the instances seen here keep, or add, the field `name`.
+    field_cache: FieldCache = field(default_factory=FieldCache, compare=False, repr=False)
 
     def accept(self, visitor):
         return visitor.visit_set_expr(self)
@@ -109,6 +134,8 @@ class Set(Expr):
 @dataclass
 class This(Expr):
     keyword: Token
+    # Set by the resolver, as for Variable.
+    location: Optional[tuple[int, int, bool]] = field(default=None, compare=False, repr=False)
 
     def accept(self, visitor):
         return visitor.visit_this_expr(self)
@@ -118,6 +145,14 @@ class This(Expr):
 class Super(Expr):
     keyword: Token
     method: Token
+    cache: InlineCache = field(default_factory=InlineCache, compare=False, repr=False)
+    # Set by the resolver, as for Variable.
+    location: Optional[tuple[int, int, bool]] = field(default=None, compare=False, repr=False)
+    # The `this` that the method is called on, which the resolver resolves too.
+    this: This = field(init=False, compare=False, repr=False)
+
+    def __post_init__(self):
+        self.this = This(self.keyword)
 
     def accept(self, visitor):
         return visitor.visit_super_expr(self)
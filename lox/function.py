@@ -1,10 +1,11 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from typing import Any
 from .lox_callable import LoxCallable
 from . import statement
-from .environment import Environment
+from .environment import Environment, make_cells
 
 
-@dataclass
+@dataclass(eq=False)  # Functions, and bound methods, have identity equality.
 class LoxFunction(LoxCallable):
     """
     Implements basic functions.
@@ -14,23 +15,60 @@ class LoxFunction(LoxCallable):
     declaration: statement.Function
     closure: Environment
     is_initializer: bool = False
+    # Only for bound methods: the instance that will be `this`.
+    instance: Any = None
 
     def call(self, interpreter, arguments: list):
         """
         Sets the return value on the call stack
         """
-        # Bind the params into names in the local environment.
-        environment = Environment(self.closure)
-        for i, param in enumerate(self.declaration.parameters):
-            environment.define(param.lexeme, arguments[i])
+        if self.instance is not None:
+            self.call_method(interpreter, self.instance, arguments)
+            return
+        if interpreter.use_resolver:
+            # The resolver gave the params the first slots of the function's scope,
+            # so the arguments list can become the local environment as-is.
+            # (Callers always build a fresh list, so we can take it over.)
+            environment = Environment(self.closure, arguments)
+            if self.declaration.cell_slots:
+                make_cells(environment, self.declaration.cell_slots)
+        else:
+            # Bind the params into names in the local environment.
+            environment = Environment(self.closure)
+            for i, param in enumerate(self.declaration.parameters):
+                environment.define(param.lexeme, arguments[i])
 
         interpreter.execute_block(self.declaration.body, environment)
 
+    def call_method(self, interpreter, instance, arguments: list):
+        """
+        Call this method with `this` as the given instance, without binding it first.
+        """
+        if interpreter.use_resolver:
+            # The resolver puts 'this' in the method's first slot, ahead of the params.
+            environment = Environment(self.closure, [instance, *arguments])
+            if self.declaration.cell_slots:
+                make_cells(environment, self.declaration.cell_slots)
+        else:
+            # Bind 'this' and the params into names, as bind() and call() would.
+            environment = Environment(self.closure)
+            environment.define("this", instance)
+            for i, param in enumerate(self.declaration.parameters):
+                environment.define(param.lexeme, arguments[i])
+        interpreter.execute_block(self.declaration.body, environment)
+
         if self.is_initializer:
             # Special case per 12.7.1: Class initializers always return 'this'.
             # Needed here because init can be called explicitly.
-            this = self.closure.get_at(0, "this")
-            interpreter.innermost_call_state.return_value = this
+            interpreter.innermost_call_state.return_value = instance
+
+    def bind(self, instance) -> 'LoxFunction':
+        """
+        Make a method whose `this` is the given instance.
+        Only needed when a method is used as a value; calls use call_method() instead.
+        """
+        # Copies whatever kind of function this is.
+        return replace(self, instance=instance)
 
     def arity(self):
         return len(self.declaration.parameters)
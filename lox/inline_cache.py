@@ -0,0 +1,52 @@
+"""
+Inline caches for method lookups, one per `obj.name` or `super.name` site in
+the source.
+
+A given site usually sees instances of just one class (it's "monomorphic"),
+or a few ("polymorphic"). Classes can't gain or lose methods once created, so
+we can remember which method each class resolved the name to, and skip looking
+it up in the class's methods next time. Fields are always checked before the
+cache, so a field that shadows a method never sees a stale answer.
+"""
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from .function import LoxFunction
+    from .lox_class import LoxClass
+
+# Beyond this many classes a site is "megamorphic", and we stop caching.
+MAX_ENTRIES = 4
+
+
+class InlineCache:
+    __slots__ = ("klass", "method", "others", "megamorphic")
+
+    def __init__(self):
+        # The first class seen here, checked inline by callers.
+        self.klass: Optional[LoxClass] = None
+        self.method: Optional[LoxFunction] = None
+        # Any more classes seen here, as (LoxClass, LoxFunction) pairs.
+        self.others: list[tuple[LoxClass, Optional[LoxFunction]]] = []
+        self.megamorphic = False
+
+    def find_method(self, klass: 'LoxClass', name: str) -> Optional['LoxFunction']:
+        """
+        Like klass.find_method(name), but remembered.
+        """
+        if klass is self.klass:
+            return self.method
+        for cached_class, method in self.others:
+            if cached_class is klass:
+                return method
+        # A miss is worth remembering too, eg for classes without an `init`.
+        method = klass.find_method(name)
+        if self.megamorphic:
+            return method
+        if self.klass is None:
+            self.klass, self.method = klass, method
+        elif len(self.others) < MAX_ENTRIES - 1:
+            self.others.append((klass, method))
+        else:
+            self.megamorphic = True
+            self.others = []
+        return method
@@ -0,0 +1,232 @@
+"""
+Inlining small functions and methods for the tree-walking Interpreter: a
+pass, run just before the resolved program is interpreted, that finds the
+functions whose whole body is `return <expression>;`, for a small expression
+that doesn't call anything, like getters such as `ant() { return this.aarvark; }`.
+
+Calling one of those normally pushes a CallState, makes an Environment, and
+runs the body as a block just to get at one value. Instead, each gets an
+inline body: a copy of its expression where the parameters, and `this`, are
+Argument nodes reading the call's arguments directly, which call sites
+evaluate in place of the call. The resolver already told us which variables
+are the function's own locals (depth 0, not in a Cell), so renaming them
+needs no scope analysis of its own; other variables have to be globals.
+
+Call sites decide each time, as they already have the callee to hand: a
+method call finds its method through the `Get`'s InlineCache, so inlining is
+guarded by the receiver's class, and a function call inlines whatever
+LoxFunction the callee evaluates to. Since inline bodies never call anything
+they can't be recursive, and errors in them are reported just as they'd be in
+the function.
+
+Inline bodies are only for the Interpreter's own call visitor: other visitors
+never see them, and an initializer can't return a value so is never inlined.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from .expression import (
+    Assign,
+    Binary,
+    Call,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from .statement import (
+    Block,
+    ClassStmt,
+    ExpressionStmt,
+    For,
+    Function,
+    If,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+from .superinstructions import IncrementField, IncrementVariable, VariableOpConstant
+from .token import Token
+
+# The most nodes an inline body can have: `this.a + this.b * 2` is 7.
+MAX_INLINE_SIZE = 8
+
+
+@dataclass
+class Argument(Expr):
+    """
+    A parameter of an inlined function, or `this`: the value in that slot of the call's arguments.
+    """
+    index: int
+    name: Token
+
+    def accept(self, visitor):
+        return visitor.visit_argument_expr(self)
+
+
+class Inliner(StmtVisitor):
+    """
+    Gives each function declaration that can be inlined its inline body, and counts them.
+    """
+
+    def __init__(self):
+        self.inlined = 0
+
+    def inline(self, statements: list[Stmt]):
+        for statement in statements:
+            statement.accept(self)
+
+    def visit_function_statement(self, stmt: Function):
+        stmt.inline_body = inline_body(stmt)
+        if stmt.inline_body is not None:
+            self.inlined += 1
+        else:
+            self.inline(stmt.body)
+
+    def visit_class_stmt(self, stmt: ClassStmt):
+        for method in stmt.methods:
+            method.accept(self)
+
+    def visit_block_stmt(self, stmt: Block):
+        self.inline(stmt.statements)
+
+    def visit_if_stmt(self, stmt: If):
+        stmt.then_branch.accept(self)
+        if stmt.else_branch is not None:
+            stmt.else_branch.accept(self)
+
+    def visit_while_stmt(self, stmt: While):
+        stmt.statement.accept(self)
+
+    def visit_for_stmt(self, stmt: For):
+        stmt.body.accept(self)
+
+    # Expressions don't declare functions, so there's nothing to do for these.
+
+    def visit_print_stmt(self, stmt: Print):
+        pass
+
+    def visit_expression_stmt(self, stmt: ExpressionStmt):
+        pass
+
+    def visit_var_stmt(self, stmt: Var):
+        pass
+
+    def visit_return_stmt(self, stmt: Return):
+        pass
+
+
+def inline_body(function: Function) -> Optional[Expr]:
+    """
+    The expression a call to this function can evaluate instead, if it's small enough.
+    """
+    if len(function.body) != 1:
+        return None
+    [statement] = function.body
+    if not isinstance(statement, Return) or statement.value is None:
+        return None
+    return _Renamer().copy(statement.value)
+
+
+class _Renamer(ExprVisitor):
+    """
+    Copies an expression, with the function's locals as Arguments, or returns
+    None if it has anything that can't be inlined, or is too big.
+    """
+
+    def __init__(self):
+        self.size = 0
+
+    def copy(self, expr: Expr) -> Optional[Expr]:
+        self.size += 1
+        if self.size > MAX_INLINE_SIZE:
+            return None
+        return expr.accept(self)
+
+    def _local(self, location: Optional[tuple[int, int, bool]], name: Token) -> Optional[Expr]:
+        depth, slot, is_cell = location  # type: ignore[misc]
+        if depth != 0 or is_cell:
+            return None  # From the function's closure.
+        return Argument(slot, name)
+
+    def visit_variable_expr(self, expr: Variable) -> Optional[Expr]:
+        if expr.location is not None:
+            return self._local(expr.location, expr.name)
+        if expr.global_slot is None:
+            return None
+        return Variable(expr.name, global_slot=expr.global_slot)
+
+    def visit_this_expr(self, expr: This) -> Optional[Expr]:
+        if expr.location is None:
+            return None
+        return self._local(expr.location, expr.keyword)
+
+    def visit_literal_expr(self, expr: Literal) -> Optional[Expr]:
+        return expr
+
+    def visit_grouping_expr(self, expr: Grouping) -> Optional[Expr]:
+        expression = self.copy(expr.expression)
+        if expression is None:
+            return None
+        return Grouping(expression)
+
+    def visit_unary_expr(self, expr: Unary) -> Optional[Expr]:
+        right = self.copy(expr.right)
+        if right is None:
+            return None
+        return Unary(expr.operator, right)
+
+    def visit_binary_expr(self, expr: Binary) -> Optional[Expr]:
+        left = self.copy(expr.left)
+        right = self.copy(expr.right) if left is not None else None
+        if right is None:
+            return None
+        return Binary(left, expr.operator, right)  # type: ignore[arg-type]
+
+    def visit_logical_expr(self, expr: Logical) -> Optional[Expr]:
+        left = self.copy(expr.left)
+        right = self.copy(expr.right) if left is not None else None
+        if right is None:
+            return None
+        return Logical(left, expr.operator, right)  # type: ignore[arg-type]
+
+    def visit_get_expr(self, expr: Get) -> Optional[Expr]:
+        object_ = self.copy(expr.object_)
+        if object_ is None:
+            return None
+        return Get(object_, expr.name)
+
+    # Calls would need a frame (and could recurse), and the rest an environment.
+
+    def visit_call_expr(self, expr: Call) -> Optional[Expr]:
+        return None
+
+    def visit_assign_expr(self, expr: Assign) -> Optional[Expr]:
+        return None
+
+    def visit_set_expr(self, expr: Set) -> Optional[Expr]:
+        return None
+
+    def visit_super_expr(self, expr: Super) -> Optional[Expr]:
+        return None
+
+    # Already fused, if a program's nodes are ever interpreted twice.
+
+    def visit_variable_op_constant_expr(self, expr: VariableOpConstant) -> Optional[Expr]:
+        return None
+
+    def visit_increment_variable_expr(self, expr: IncrementVariable) -> Optional[Expr]:
+        return None
+
+    def visit_increment_field_expr(self, expr: IncrementField) -> Optional[Expr]:
+        return None
@@ -1,3 +1,4 @@
+import math
 from typing import Optional, List, Any
 from dataclasses import dataclass
 
@@ -27,19 +28,43 @@ from .statement import (
     Block,
     If,
     While,
+    For,
     Function,
     Return,
     ClassStmt,
 )
 from .tokentype import TokenType
 from .token import Token
-from .environment import Environment
+from .environment import UNDEFINED, Cell, Environment, GlobalEnvironment
 from .lox_callable import LoxCallable
 from .lox_class import LoxClass, LoxInstance
 from .function import LoxFunction
+from .memo import Memo, MemoizedFunction
+from .inliner import Argument, Inliner
+from .superinstructions import Fuser, IncrementField, IncrementVariable, VariableOpConstant
+from .quickening import (
+    DEOPTIMIZE,
+    MAX_REWRITES,
+    binary_operation_for,
+    logical_operation_for,
+    unary_operation_for,
+)
 from . import native_functions
 
 
+def divide(left: float, right: float) -> float:
+    """
+    Lox numbers are IEEE doubles, so dividing by zero gives infinity or NaN
+    instead of raising like Python does.
+    """
+    try:
+        return left / right
+    except ZeroDivisionError:
+        if left == 0 or math.isnan(left):
+            return math.nan
+        return math.copysign(math.inf, left) * math.copysign(1.0, right)
+
+
 @dataclass
 class CallState:
     """Encapsulates information about state of one level of the call stack."""
@@ -53,17 +78,26 @@ class Interpreter(ExprVisitor, StmtVisitor):
         self, error_reporter: Optional[ErrorReporter] = None, use_resolver=False
     ):
         self.error_reporter = error_reporter or ErrorReporter()
-        self._environment = Environment()
-        self.globals = self._environment
+        self.globals = GlobalEnvironment()
+        self._environment: Environment = self.globals
         self.globals.define("clock", native_functions.Clock())
-        self._locals_distance: dict[int, int] = {}
         self._call_stack: list[CallState] = []
+        # If set, pure functions' results are remembered here.
+        self.memo: Optional[Memo] = None
+        # Inlines small functions, and fuses common expressions into
+        # superinstructions, both of which need the resolver.
+        self.inliner: Optional[Inliner] = Inliner() if use_resolver else None
+        self.fuser: Optional[Fuser] = Fuser() if use_resolver else None
+        # The arguments of the inlined call being evaluated.
+        self._arguments: list = []
+        self.use_resolver = use_resolver
         if use_resolver:
             # For chapter 11
             self._resolve_variable_expr = self._resolve_variable_expr_using_resolver
             self._assign_value_for_variable = (
                 self._assign_value_for_variable_using_resolver
             )
+            self._define_variable = self._define_variable_using_resolver
         else:
             # For earlier chapters
             self._resolve_variable_expr = (
@@ -72,6 +106,7 @@ class Interpreter(ExprVisitor, StmtVisitor):
             self._assign_value_for_variable = (
                 self._assign_value_for_variable_using_current_environment
             )
+            self._define_variable = self._define_variable_using_current_environment
 
     @property
     def innermost_call_state(self) -> CallState:
@@ -84,6 +119,13 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return self.innermost_call_state.is_returning
 
     def interpret(self, statements: List[Stmt]):
+        if self.memo is not None:
+            self.memo.analyze(statements)
+        if self.inliner is not None:
+            # First, so inline bodies are copied from functions before they're fused.
+            self.inliner.inline(statements)
+        if self.fuser is not None:
+            self.fuser.fuse(statements)
         try:
             for statement in statements:
                 self.execute(statement)
@@ -97,7 +139,8 @@ class Interpreter(ExprVisitor, StmtVisitor):
         except LoxRuntimeError as _error:
             self.error_reporter.runtime_error(_error)
 
-    def stringify(self, value: object) -> str:
+    @staticmethod
+    def stringify(value: object) -> str:
         """
         Convert a value into a good enough string.
         """
@@ -151,9 +194,18 @@ class Interpreter(ExprVisitor, StmtVisitor):
         value = None
         if stmt.initializer is not None:
             value = self.evaluate(stmt.initializer)
-        self._environment.define(stmt.name.lexeme, value)
+        if stmt.captured:
+            value = Cell(value)
+        self._define_variable(stmt.name.lexeme, value)
 
     def visit_block_stmt(self, stmt: Block):
+        if not stmt.needs_scope:
+            # Nothing to declare, so no new environment to restore afterwards.
+            for statement in stmt.statements:
+                self.execute(statement)
+                if self.is_returning:
+                    break
+            return
         self.execute_block(stmt.statements, Environment(enclosing=self._environment))
 
     def visit_if_stmt(self, stmt: If):
@@ -165,15 +217,61 @@ class Interpreter(ExprVisitor, StmtVisitor):
                 self.execute(stmt.else_branch)
 
     def visit_while_stmt(self, stmt: While):
-        # Thanks to de-sugaring, this also handles For loops
-        while self.evaluate(stmt.condition):
+        while self._is_truthy(self.evaluate(stmt.condition)):
             self.execute(stmt.statement)
             if self.is_returning:
                 break
 
+    def visit_for_stmt(self, stmt: For):
+        previous_env = self._environment
+        if stmt.initializer is not None:
+            self._environment = Environment(enclosing=previous_env)
+        try:
+            if stmt.initializer is not None:
+                self.execute(stmt.initializer)
+            # Only the call we're in can return, so look that up once.
+            call_state = self._call_stack[-1] if self._call_stack else None
+            # If no closure can see the body's variables, one scope does for every iteration.
+            body_env = Environment(enclosing=self._environment) if stmt.reuse_body_scope else None
+            while stmt.condition is None or self._is_truthy(self.evaluate(stmt.condition)):
+                if body_env is None:
+                    self.execute(stmt.body)
+                else:
+                    body_env.slots.clear()
+                    self.execute_block(stmt.body.statements, body_env)  # type: ignore[attr-defined]
+                if call_state is not None and call_state.is_returning:
+                    break
+                if stmt.increment is not None:
+                    self.evaluate(stmt.increment)
+        finally:
+            self._environment = previous_env
+
     def visit_function_statement(self, stmt: Function):
-        func = LoxFunction(stmt, self._environment, is_initializer=False)
-        self._environment.define(stmt.name.lexeme, func)
+        cell = None
+        if stmt.captured:
+            # Defined first, so the function can capture itself.
+            cell = Cell()
+            self._define_variable(stmt.name.lexeme, cell)
+        func: LoxFunction
+        if self.memo is not None and self.memo.is_pure(stmt):
+            func = MemoizedFunction(stmt, self.closure_for(stmt), memo=self.memo)
+        else:
+            func = LoxFunction(stmt, self.closure_for(stmt), is_initializer=False)
+        if cell is None:
+            self._define_variable(stmt.name.lexeme, func)
+        else:
+            cell.value = func
+
+    def closure_for(self, function: Function) -> Environment:
+        """
+        The environment for a function declared here: just the cells it uses.
+        """
+        if not self.use_resolver:
+            # Chapter 8 looks names up through the whole chain.
+            return self._environment
+        environment = self._environment
+        return Environment(None, [environment.get_at(depth, slot)
+                                  for depth, slot in function.free])
 
     def visit_return_stmt(self, stmt: Return):
         # https://craftinginterpreters.com/functions.html#returning-from-calls
@@ -195,26 +293,36 @@ class Interpreter(ExprVisitor, StmtVisitor):
                     "Superclass must be a class.", stmt.superclass.name
                 )
 
-        self._environment.define(stmt.name.lexeme, None)
+        cell = None
+        if stmt.captured:
+            # As in the book, the name is defined before the methods are made,
+            # since they may capture it.
+            cell = Cell()
+            self._define_variable(stmt.name.lexeme, cell)
 
         if superclass is not None:
-            self._environment = Environment(self._environment)
-            self._environment.define("super", superclass)
+            # 'super' is the only slot in its scope. Only methods use it, so it's
+            # always captured.
+            self._environment = Environment(
+                self._environment, [Cell(superclass) if self.use_resolver else superclass])
 
         methods: dict[str, LoxFunction] = {}
         for method in stmt.methods:
             is_initializer = method.name.lexeme == "init"
             function = LoxFunction(
-                method, self._environment, is_initializer=is_initializer
+                method, self.closure_for(method), is_initializer=is_initializer
             )
             methods[method.name.lexeme] = function
 
         _class: LoxClass = LoxClass(stmt.name.lexeme, methods, superclass)
 
         if superclass is not None:
-            assert self._environment._enclosing is not None
-            self._environment = self._environment._enclosing
-        self._environment.assign(stmt.name, _class)
+            assert self._environment.enclosing is not None
+            self._environment = self._environment.enclosing
+        if cell is None:
+            self._define_variable(stmt.name.lexeme, _class)
+        else:
+            cell.value = _class
 
     ############################################################
     # ExprVisitor methods
@@ -227,21 +335,49 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return self.evaluate(expr.expression)
 
     def visit_unary_expr(self, expr: Unary) -> object:
-        right = self.evaluate(expr.right)
-        if expr.operator.tokentype == TokenType.BANG:
+        return self._evaluate_unary(expr, self.evaluate(expr.right))
+
+    def _evaluate_unary(self, expr: Unary, right: object) -> object:
+        # Quickened: see quickening.py.
+        quickening = expr.quickening
+        operation = quickening.operation
+        if operation is not None:
+            result = operation(right)
+            if result is not DEOPTIMIZE:
+                return result
+        if quickening.rewrites < MAX_REWRITES:
+            quickening.rewrite(unary_operation_for(expr.operator.tokentype, right))
+        return self.unary_operation(expr.operator, right)
+
+    def unary_operation(self, operator: Token, right: object) -> object:
+        if operator.tokentype == TokenType.BANG:
             return not self._is_truthy(right)
-        if expr.operator.tokentype == TokenType.MINUS:
-            self._check_number_operand(expr.operator, right)
-            return -(float(right))
+        if operator.tokentype == TokenType.MINUS:
+            self._check_number_operand(operator, right)
+            return -right  # type: ignore[operator]
         # TODO better error handling? Should never get here anyway.
-        raise SyntaxError("Invalid unary operator %r" % expr.operator)
+        raise SyntaxError("Invalid unary operator %r" % operator)
 
     def visit_binary_expr(self, expr: Binary) -> object:
         # Order matters here! These might have side effects.
         left = self.evaluate(expr.left)
         right = self.evaluate(expr.right)
-
-        ttype = expr.operator.tokentype
+        return self._evaluate_binary(expr, left, right)
+
+    def _evaluate_binary(self, expr: Binary, left: Any, right: Any) -> object:
+        # Quickened: see quickening.py.
+        quickening = expr.quickening
+        operation = quickening.operation
+        if operation is not None:
+            result = operation(left, right)
+            if result is not DEOPTIMIZE:
+                return result
+        if quickening.rewrites < MAX_REWRITES:
+            quickening.rewrite(binary_operation_for(expr.operator.tokentype, left, right))
+        return self.binary_operation(expr.operator, left, right)
+
+    def binary_operation(self, operator: Token, left: Any, right: Any) -> object:
+        ttype = operator.tokentype
         # We could turn this into a dict that dispatches to callables,
         # but I don't feel like defining all those methods and I don't like lambdas :-p
         match ttype:
@@ -250,34 +386,34 @@ class Interpreter(ExprVisitor, StmtVisitor):
             case TokenType.BANG_EQUAL:
                 return not self._is_equal(left, right)
             case TokenType.GREATER:
-                self._check_number_operands(expr.operator, left, right)
-                return float(left) > float(right)
+                self._check_number_operands(operator, left, right)
+                return left > right
             case TokenType.GREATER_EQUAL:
-                self._check_number_operands(expr.operator, left, right)
-                return float(left) >= float(right)
+                self._check_number_operands(operator, left, right)
+                return left >= right
             case TokenType.LESS_EQUAL:
-                self._check_number_operands(expr.operator, left, right)
-                return float(left) <= float(right)
+                self._check_number_operands(operator, left, right)
+                return left <= right
             case TokenType.LESS:
-                self._check_number_operands(expr.operator, left, right)
-                return float(left) < float(right)
+                self._check_number_operands(operator, left, right)
+                return left < right
             case TokenType.MINUS:
-                self._check_number_operands(expr.operator, left, right)
-                return float(left) - float(right)
+                self._check_number_operands(operator, left, right)
+                return left - right
             case TokenType.PLUS:
                 if isinstance(left, float) and isinstance(right, float):
                     return left + right
                 if isinstance(left, str) and isinstance(right, str):
                     return left + right
                 raise LoxRuntimeError(
-                    "Operands must be two numbers or two strings.", expr.operator
+                    "Operands must be two numbers or two strings.", operator
                 )
             case TokenType.SLASH:
-                self._check_number_operands(expr.operator, left, right)
-                return float(left) / float(right)
+                self._check_number_operands(operator, left, right)
+                return divide(left, right)
             case TokenType.STAR:
-                self._check_number_operands(expr.operator, left, right)
-                return float(left) * float(right)
+                self._check_number_operands(operator, left, right)
+                return left * right
 
         # Supposedly unreachable.
         return None
@@ -295,18 +431,17 @@ class Interpreter(ExprVisitor, StmtVisitor):
         name: Token = expr.name
         return self.lookup_variable_using_resolver(name, expr)
 
-    def lookup_variable_using_resolver(self, name: Token, expr: Expr):
+    def lookup_variable_using_resolver(self, name: Token, expr: Variable | This | Super):
         # Corresponds to lookUpVariable in book code chapter 11.
-        distance = self._get_distance(expr)
-        if distance is not None:
-            return self._environment.get_at(distance, name.lexeme)
-        return self.globals.get(name)
-
-    def _get_distance(self, expr: Expr) -> Optional[int]:
-        return self._locals_distance.get(id(expr))
-
-    def _set_distance(self, expr: Expr, distance: int):
-        self._locals_distance[id(expr)] = distance
+        location = expr.location
+        if location is not None:
+            depth, slot, is_cell = location
+            value = self._environment.get_at(depth, slot)
+            return value.value if is_cell else value
+        value = self.globals.slots[expr.global_slot]  # type: ignore[union-attr, index]
+        if value is UNDEFINED:
+            raise LoxRuntimeError("Undefined variable '%s'." % name.lexeme, name)
+        return value
 
     def visit_assign_expr(self, expr: Assign) -> Any:
         value: Any = self.evaluate(expr.value)
@@ -321,50 +456,134 @@ class Interpreter(ExprVisitor, StmtVisitor):
     def _assign_value_for_variable_using_resolver(
         self, expr: Assign, value: Any
     ) -> Any:
-        distance = self._get_distance(expr)
-        if distance is not None:
-            self._environment.assign_at(distance, expr.name, value)
+        location = expr.location
+        if location is not None:
+            depth, slot, is_cell = location
+            if is_cell:
+                self._environment.get_at(depth, slot).value = value
+            else:
+                self._environment.assign_at(depth, slot, value)
         else:
-            self.globals.assign(expr.name, value)
+            self.globals.assign_slot(expr.global_slot, expr.name, value)  # type: ignore[arg-type]
         return value
 
+    def _define_variable_using_current_environment(self, name: str, value: Any):
+        self._environment.define(name, value)
+
+    def _define_variable_using_resolver(self, name: str, value: Any):
+        if self._environment is self.globals:
+            # Declarations aren't resolved, so globals are defined by name.
+            self.globals.define(name, value)
+        else:
+            self._environment.define_slot(value)
+
     def visit_logical_expr(self, expr: Logical) -> Any:
         # Supports 'and', 'or'
         left_val = self.evaluate(expr.left)
-        if self._is_truthy(left_val):
-            if expr.operator.tokentype == TokenType.OR:
-                return left_val
-        elif expr.operator.tokentype == TokenType.AND:
+        if self._short_circuits(expr, left_val):
             return left_val
         right_val = self.evaluate(expr.right)
         return right_val
 
+    def _short_circuits(self, expr: Logical, left: Any) -> bool:
+        # Quickened, just for its operator: see quickening.py.
+        short_circuits = expr.quickening.operation
+        if short_circuits is None:
+            short_circuits = logical_operation_for(expr.operator.tokentype)
+            expr.quickening.rewrite(short_circuits)
+        return short_circuits(left)
+
     def visit_call_expr(self, expr: Call) -> Any:
         # Might be a variable, or a callback, method reference ...
-        state = CallState()
-        self._call_stack.append(state)
-        try:
-            callee = self.evaluate(expr.callee)
-            if not isinstance(callee, LoxCallable):
-                raise LoxRuntimeError(
-                    "Can only call functions and classes.", expr.paren
-                )
-            args = [self.evaluate(arg) for arg in expr.arguments]
+        callee_expr = expr.callee
+        if type(callee_expr) is Get:
+            # `obj.method(...)`: like clox's OP_INVOKE, call the method with `this`
+            # in its frame, rather than making a bound method to call just once.
+            obj = self.evaluate(callee_expr.object_)
+            if not isinstance(obj, LoxInstance):
+                raise LoxRuntimeError("Only instances have properties.", callee_expr.name)
+            field_cache = callee_expr.field_cache
+            if obj.shape is field_cache.shape:
+                slot = field_cache.slot
+            else:
+                slot = obj.field_slot(callee_expr.name.lexeme, field_cache)
+            if slot is not None:
+                callee = obj.values[slot]
+            else:
+                method = obj.find_method(callee_expr.name, callee_expr.cache)
+                return self._invoke(expr, obj, method)
+        elif type(callee_expr) is Super:
+            obj, method = self._find_super_method(callee_expr)
+            return self._invoke(expr, obj, method)
+        else:
+            callee = self.evaluate(callee_expr)
+        if not isinstance(callee, LoxCallable):
+            raise LoxRuntimeError(
+                "Can only call functions and classes.", expr.paren
+            )
+        args = [self.evaluate(arg) for arg in expr.arguments]
+        if type(callee) is LoxClass:
             if len(args) != callee.arity():
                 raise LoxRuntimeError(
                     "Expected %d arguments but got %d." % (callee.arity(), len(args)),
                     expr.paren,
                 )
-            callee.call(self, args)
+            state = CallState()
+            self._call_stack.append(state)
+            try:
+                callee.instantiate(self, args, callee.initializer)
+            finally:
+                self._call_stack.pop()
             return state.return_value
+        if len(args) != callee.arity():
+            raise LoxRuntimeError(
+                "Expected %d arguments but got %d." % (callee.arity(), len(args)),
+                expr.paren,
+            )
+        if type(callee) is LoxFunction and callee.declaration.inline_body is not None:
+            # Just the expression it returns, without a frame (see lox/inliner.py).
+            self._arguments = args if callee.instance is None else [callee.instance, *args]
+            return self.evaluate(callee.declaration.inline_body)
+        state = CallState()
+        self._call_stack.append(state)
+        try:
+            callee.call(self, args)
+        finally:
+            self._call_stack.pop()
+        return state.return_value
+
+    def _invoke(self, expr: Call, obj: LoxInstance, method: LoxFunction) -> Any:
+        args = [self.evaluate(arg) for arg in expr.arguments]
+        if len(args) != method.arity():
+            raise LoxRuntimeError(
+                "Expected %d arguments but got %d." % (method.arity(), len(args)),
+                expr.paren,
+            )
+        inline_body = method.declaration.inline_body
+        if inline_body is not None:
+            # The resolver put `this` first, ahead of the params.
+            self._arguments = [obj, *args]
+            return self.evaluate(inline_body)
+        state = CallState()
+        self._call_stack.append(state)
+        try:
+            method.call_method(self, obj, args)
         finally:
             self._call_stack.pop()
+        return state.return_value
+
+    def visit_argument_expr(self, expr: Argument) -> Any:
+        # Inline bodies don't call anything, so these are still the call's arguments.
+        return self._arguments[expr.index]
 
     def visit_get_expr(self, expr: Get) -> Any:
         # Object dot access.
         obj = self.evaluate(expr.object_)
         if isinstance(obj, LoxInstance):
-            return obj.get(expr.name)
+            field_cache = expr.field_cache
+            if obj.shape is field_cache.shape and field_cache.slot is not None:
+                return obj.values[field_cache.slot]  # The usual case, so skip a call.
+            return obj.get(expr.name, expr.cache, field_cache)
         raise LoxRuntimeError("Only instances have properties.", expr.name)
 
     def visit_set_expr(self, expr: Set) -> Any:
@@ -372,38 +591,86 @@ class Interpreter(ExprVisitor, StmtVisitor):
         obj = self.evaluate(expr.object_)
         if isinstance(obj, LoxInstance):
             value = self.evaluate(expr.value)
-            obj.set(expr.name, value)
+            field_cache = expr.field_cache
+            if obj.shape is field_cache.shape and field_cache.slot is not None:
+                obj.values[field_cache.slot] = value  # The usual case, so skip a call.
+            else:
+                obj.set(expr.name, value, field_cache)
         else:
             raise LoxRuntimeError("Only instances have fields.", expr.name)
         return value
 
+    ############################################################
+    # Superinstructions: see superinstructions.py.
+
+    def visit_variable_op_constant_expr(self, expr: VariableOpConstant) -> Any:
+        depth = expr.depth
+        if depth == 0:
+            value = self._environment.slots[expr.slot]
+        elif depth is None:
+            value = self.globals.slots[expr.slot]
+        else:
+            value = self._environment.enclosing.slots[expr.slot]  # type: ignore[union-attr]
+        if type(value) is float:
+            return expr.operation(value, expr.constant)
+        return self.visit_binary_expr(expr.original)
+
+    def visit_increment_variable_expr(self, expr: IncrementVariable) -> Any:
+        depth = expr.depth
+        if depth == 0:
+            values = self._environment.slots
+        elif depth is None:
+            values = self.globals.slots
+        else:
+            values = self._environment.enclosing.slots  # type: ignore[union-attr]
+        value = values[expr.slot]
+        if type(value) is float:
+            value = values[expr.slot] = value + expr.amount
+            return value
+        return self.visit_assign_expr(expr.original)
+
+    def visit_increment_field_expr(self, expr: IncrementField) -> Any:
+        obj = self.evaluate(expr.original.object_)
+        if type(obj) is LoxInstance:
+            field_cache = expr.get.field_cache
+            slot = field_cache.slot
+            if obj.shape is field_cache.shape and slot is not None:
+                values = obj.values
+                value = values[slot]
+                if type(value) is float:
+                    value = values[slot] = value + expr.amount
+                    return value
+        return self.visit_set_expr(expr.original)
+
     def visit_this_expr(self, expr: This) -> Any:
+        if not self.use_resolver:
+            # Chapter 8 has no resolver: `this` is a name that call_method() defines.
+            return self._environment.get(expr.keyword)
         return self.lookup_variable_using_resolver(expr.keyword, expr)
 
     def visit_super_expr(self, expr: Super) -> Any:
-        distance = self._get_distance(expr)
-        assert distance is not None
-        superclass: LoxClass = self._environment.get_at(distance, "super")
+        obj, method = self._find_super_method(expr)
+        return obj.bind(method)
 
-        # Horrible hack, we just know that 'this' scope is one beyond 'superclass' scope.
-        obj: LoxInstance = self._environment.get_at(distance - 1, "this")
+    def _find_super_method(self, expr: Super) -> tuple[LoxInstance, LoxFunction]:
+        superclass: LoxClass = self.lookup_variable_using_resolver(expr.keyword, expr)
+        obj: LoxInstance = self.lookup_variable_using_resolver(expr.keyword, expr.this)
 
-        method = superclass.find_method(expr.method.lexeme)
+        method = expr.cache.find_method(superclass, expr.method.lexeme)
         if method is None:
             raise LoxRuntimeError(
                 "Undefined property '%s'." % expr.method.lexeme, expr.method
             )
-
-        return obj.bind(method)
+        return obj, method
 
     ############################################################
     # Helpers
 
-    def resolve(self, expr: Expr, depth: int):
+    def resolve_global(self, expr: Variable | Assign, name: str):
         """
-        Records how deep in the environment stack an expression is stored.
+        Records which slot of the globals a global variable's expression uses.
         """
-        self._set_distance(expr, depth)
+        expr.global_slot = self.globals.slot_for(name)
 
     def _is_equal(self, a, b) -> bool:
         if a is None and b is None:
@@ -4,71 +4,127 @@ from .lox_callable import LoxCallable
 from .function import LoxFunction
 from .token import Token
 from .error import LoxRuntimeError
-from .environment import Environment
+from .inline_cache import InlineCache
+from .shape import EMPTY_SHAPE, MAX_FIELDS, DictionaryShape, FieldCache, Shape
 
 
 class LoxClass(LoxCallable):
     def __init__(self, name: str, methods: dict[str, LoxFunction], superclass: Optional['LoxClass']):
         self.name = name
-        self.methods = methods
         self.superclass = superclass
+        # Copy the inherited methods down, so finding any method is a single dict
+        # get rather than a walk up the superclasses. Classes never change once made.
+        self.methods: dict[str, LoxFunction] = (
+            {} if superclass is None else dict(superclass.methods))
+        self.methods.update(methods)
+        # Needed for every instantiation, so found just once.
+        self.initializer: Optional[LoxFunction] = self.methods.get("init")
+        self._arity = 0 if self.initializer is None else self.initializer.arity()
 
     def __str__(self):
         return self.name
 
     def arity(self) -> int:
-        initializer = self.find_method("init")
-        if initializer is not None:
-            return initializer.arity()
-        else:
-            return 0
+        return self._arity
 
     def call(self, interpreter, arguments: list[object]):
+        self.instantiate(interpreter, arguments, self.initializer)
+
+    def instantiate(self, interpreter, arguments: list[object],
+                    initializer: Optional[LoxFunction]):
+        """
+        As call(), for callers who already looked up the initializer.
+        """
         instance: LoxInstance = LoxInstance(self)
         # We implicitly call `instance.init` with the args we got.
-        initializer = self.find_method("init")
         if initializer is not None:
-            instance.bind(initializer).call(interpreter, arguments)
+            initializer.call_method(interpreter, instance, arguments)
         # Special case per 12.7.1: Class initializers always return 'this'.
         # Needed here in case there is no explicit init method.
         interpreter.innermost_call_state.return_value = instance
 
     def find_method(self, name: str) -> Optional[LoxFunction]:
-        if name in self.methods:
-            return self.methods[name]
-
-        if self.superclass is not None:
-            return self.superclass.find_method(name)
-
-        return None
+        return self.methods.get(name)
 
 
 class LoxInstance:
+    __slots__ = ("klass", "shape", "values")
+
     def __init__(self, klass: LoxClass):
         self.klass = klass
-        self.fields: dict[str, object] = {}
+        # Field values, at the indexes our Shape gives for their names.
+        self.shape: Shape = EMPTY_SHAPE
+        self.values: list[object] = []
 
     def __str__(self):
         return self.klass.name + " instance"
 
-    def get(self, name: Token) -> Any:
-        if name.lexeme in self.fields:
-            return self.fields[name.lexeme]
-
-        method = self.klass.find_method(name.lexeme)
+    @property
+    def fields(self) -> dict[str, object]:
+        return {name: self.values[slot] for name, slot in self.shape.slots.items()}
+
+    def get(self, name: Token, cache: Optional[InlineCache] = None,
+            field_cache: Optional[FieldCache] = None) -> Any:
+        slot = self.field_slot(name.lexeme, field_cache)
+        if slot is not None:
+            return self.values[slot]
+        return self.bind(self.find_method(name, cache))  # Binding 'this' to the instance
+
+    def field_slot(self, name: str, cache: Optional[FieldCache] = None) -> Optional[int]:
+        """
+        Where our values has field `name`, or None if we don't have it.
+        """
+        shape = self.shape
+        if cache is not None and cache.shape is shape:
+            return cache.slot
+        slot = shape.slots.get(name)
+        if cache is not None and type(shape) is not DictionaryShape:
+            cache.shape, cache.slot, cache.next_shape = shape, slot, None
+        return slot
+
+    def find_method(self, name: Token, cache: Optional[InlineCache] = None) -> LoxFunction:
+        """
+        Look up a method of our class to bind or call, ignoring fields.
+        """
+        if cache is None:
+            method = self.klass.find_method(name.lexeme)
+        elif cache.klass is self.klass:
+            method = cache.method  # The usual case, so skip a call.
+        else:
+            method = cache.find_method(self.klass, name.lexeme)
         if method is not None:
-            method = self.bind(method)  # Binding 'this' to the instance
             return method
 
         raise LoxRuntimeError("Undefined property '%s'." % name.lexeme, name)
 
-    def set(self, name: Token, value: object):
-        self.fields[name.lexeme] = value
+    def set(self, name: Token, value: object, cache: Optional[FieldCache] = None):
+        shape = self.shape
+        if cache is not None and cache.shape is shape:
+            slot = cache.slot
+            if slot is not None:
+                self.values[slot] = value
+                return
+            if cache.next_shape is not None:
+                self.shape = cache.next_shape
+                self.values.append(value)
+                return
+            # A `obj.name` site's miss: we don't have the field yet.
+        slot = shape.slots.get(name.lexeme)
+        if slot is not None:
+            self.values[slot] = value
+            if cache is not None and type(shape) is not DictionaryShape:
+                cache.shape, cache.slot, cache.next_shape = shape, slot, None
+        elif type(shape) is DictionaryShape or len(shape.slots) >= MAX_FIELDS:
+            if type(shape) is not DictionaryShape:
+                self.shape = DictionaryShape(dict(shape.slots))
+            self.shape.add(name.lexeme)
+            self.values.append(value)
+        else:
+            self.shape = shape.add(name.lexeme)
+            self.values.append(value)
+            if cache is not None:
+                cache.shape, cache.slot, cache.next_shape = shape, None, self.shape
 
     def bind(self, method: LoxFunction) -> LoxFunction:
-        # I chose to put this here instead of LoxFunction
-        # because a) why should functions care?
-        # and b) prevents circular dependency between LoxFunction and LoxInstance
-        env = Environment(method.closure)
-        env.define("this", self)
-        return LoxFunction(method.declaration, env, is_initializer=method.is_initializer)
+        # The function knows how to build a bound copy of its own kind.
+        return method.bind(self)
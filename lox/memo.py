@@ -0,0 +1,360 @@
+"""
+Memoizing pure Lox functions.
+
+`find_pure_functions` works out which `fun` declarations in a whole program
+are pure: calling one with the same arguments always gives the same result,
+and does nothing else. A function is pure if it only:
+- assigns to its own local variables (not captured or global ones),
+- reads its own locals, or functions that are never reassigned and are pure
+  themselves (eg itself, if it's recursive),
+- calls those pure functions,
+and doesn't print, touch objects (`obj.name`, `this`, `super`), call anything
+else (which rules out `clock()`), or declare functions or classes (since
+memoizing would return the same closure twice).
+
+Calls to pure functions whose arguments are all numbers, strings, nil or bools
+can be answered from a Memo, a bounded LRU cache of earlier results.
+"""
+import math
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from .expression import (
+    Assign,
+    Binary,
+    Call,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from .function import LoxFunction
+from .statement import (
+    Block,
+    ClassStmt,
+    ExpressionStmt,
+    For,
+    Function,
+    If,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+
+DEFAULT_MAX_ENTRIES = 10000
+
+# What Memo.get returns if it has no result for the key.
+MISSING = object()
+
+_PRIMITIVES = (float, str, bool, type(None))
+
+
+@dataclass(eq=False)
+class FunctionInfo:
+    """What we learn about one function while analyzing it."""
+    declaration: Optional[Function]  # None for methods, which are never pure.
+    impure: bool = False
+    # Non-local variables it uses, which must all be pure functions.
+    uses: list['Binding'] = field(default_factory=list)
+    uses_globals: list[str] = field(default_factory=list)
+
+
+@dataclass(eq=False)
+class Binding:
+    """One declared variable."""
+    # The function it's local to, or None for top-level blocks.
+    owner: Optional[FunctionInfo]
+    # For a `fun` declaration, its info; None for any other variable.
+    function: Optional[FunctionInfo] = None
+    assigned: bool = False
+
+
+class PurityAnalyzer(ExprVisitor, StmtVisitor):
+
+    def __init__(self):
+        self.scopes: list[dict[str, Binding]] = []
+        # Globals are looked up by name at runtime, so we can only check them at the end.
+        self.globals: dict[str, list[Binding]] = {}
+        self.assigned_globals: set[str] = set()
+        self.current: Optional[FunctionInfo] = None
+        self.functions: list[FunctionInfo] = []
+
+    def pure_functions(self, statements: list[Stmt]) -> list[Function]:
+        for statement in statements:
+            statement.accept(self)
+        changed = True
+        while changed:
+            # Impurity spreads to the functions that use impure ones.
+            changed = False
+            for info in self.functions:
+                if not info.impure and not self._uses_are_pure(info):
+                    info.impure = changed = True
+        return [info.declaration for info in self.functions
+                if not info.impure and info.declaration is not None]
+
+    def _uses_are_pure(self, info: FunctionInfo) -> bool:
+        bindings = list(info.uses)
+        for name in info.uses_globals:
+            declared = self.globals.get(name, [])
+            if len(declared) != 1 or name in self.assigned_globals:
+                return False
+            bindings += declared
+        return all(
+            binding.function is not None and not binding.function.impure
+            and not binding.assigned
+            for binding in bindings)
+
+    ######################################################################
+    # Scopes
+
+    def _declare(self, name: str, binding: Binding):
+        if self.scopes:
+            self.scopes[-1][name] = binding
+        else:
+            self.globals.setdefault(name, []).append(binding)
+
+    def _lookup(self, name: str) -> Optional[Binding]:
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def _impure(self):
+        if self.current is not None:
+            self.current.impure = True
+
+    def _function(self, stmt: Function, info: FunctionInfo):
+        enclosing = self.current
+        if enclosing is not None:
+            # A fresh closure each call, so memoizing the caller would be wrong.
+            enclosing.impure = True
+        self.functions.append(info)
+        self.current = info
+        self.scopes.append({param.lexeme: Binding(info) for param in stmt.parameters})
+        for statement in stmt.body:
+            statement.accept(self)
+        self.scopes.pop()
+        self.current = enclosing
+
+    ######################################################################
+    # Statements
+
+    def visit_function_statement(self, stmt: Function):
+        info = FunctionInfo(stmt)
+        # Declared first, so it can call itself.
+        self._declare(stmt.name.lexeme, Binding(self.current, function=info))
+        self._function(stmt, info)
+
+    def visit_class_stmt(self, stmt: ClassStmt):
+        self._impure()
+        self._declare(stmt.name.lexeme, Binding(self.current))
+        if stmt.superclass is not None:
+            stmt.superclass.accept(self)
+        for method in stmt.methods:
+            self._function(method, FunctionInfo(None, impure=True))
+
+    def visit_var_stmt(self, stmt: Var):
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+        self._declare(stmt.name.lexeme, Binding(self.current))
+
+    def visit_block_stmt(self, stmt: Block):
+        self.scopes.append({})
+        for statement in stmt.statements:
+            statement.accept(self)
+        self.scopes.pop()
+
+    def visit_print_stmt(self, stmt: Print):
+        self._impure()
+        stmt.expression.accept(self)
+
+    def visit_expression_stmt(self, stmt: ExpressionStmt):
+        stmt.expression.accept(self)
+
+    def visit_if_stmt(self, stmt: If):
+        stmt.condition.accept(self)
+        stmt.then_branch.accept(self)
+        if stmt.else_branch is not None:
+            stmt.else_branch.accept(self)
+
+    def visit_while_stmt(self, stmt: While):
+        stmt.condition.accept(self)
+        stmt.statement.accept(self)
+
+    def visit_for_stmt(self, stmt: For):
+        self.scopes.append({})
+        for part in (stmt.initializer, stmt.condition, stmt.body, stmt.increment):
+            if part is not None:
+                part.accept(self)
+        self.scopes.pop()
+
+    def visit_return_stmt(self, stmt: Return):
+        if stmt.value is not None:
+            stmt.value.accept(self)
+
+    ######################################################################
+    # Expressions
+
+    def visit_variable_expr(self, expr: Variable):
+        if self.current is None:
+            return
+        binding = self._lookup(expr.name.lexeme)
+        if binding is None:
+            self.current.uses_globals.append(expr.name.lexeme)
+        elif binding.owner is not self.current:
+            self.current.uses.append(binding)
+
+    def visit_assign_expr(self, expr: Assign):
+        expr.value.accept(self)
+        binding = self._lookup(expr.name.lexeme)
+        if binding is None:
+            self.assigned_globals.add(expr.name.lexeme)
+            self._impure()
+        else:
+            binding.assigned = True
+            if binding.owner is not self.current:
+                self._impure()
+
+    def visit_call_expr(self, expr: Call):
+        if self.current is not None:
+            binding = None
+            if isinstance(expr.callee, Variable):
+                binding = self._lookup(expr.callee.name.lexeme)
+            if not isinstance(expr.callee, Variable) or (
+                    binding is not None and binding.owner is self.current):
+                # Calling something we can't know is pure, eg a parameter.
+                self._impure()
+        expr.callee.accept(self)
+        for argument in expr.arguments:
+            argument.accept(self)
+
+    def visit_get_expr(self, expr: Get):
+        self._impure()
+        expr.object_.accept(self)
+
+    def visit_set_expr(self, expr: Set):
+        self._impure()
+        expr.object_.accept(self)
+        expr.value.accept(self)
+
+    def visit_this_expr(self, expr: This):
+        self._impure()
+
+    def visit_super_expr(self, expr: Super):
+        self._impure()
+
+    def visit_binary_expr(self, expr: Binary):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_logical_expr(self, expr: Logical):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_grouping_expr(self, expr: Grouping):
+        expr.expression.accept(self)
+
+    def visit_unary_expr(self, expr: Unary):
+        expr.right.accept(self)
+
+    def visit_literal_expr(self, expr: Literal):
+        pass
+
+
+def find_pure_functions(statements: list[Stmt]) -> list[Function]:
+    """
+    The pure `fun` declarations in a whole program.
+    """
+    return PurityAnalyzer().pure_functions(statements)
+
+
+class Memo:
+    """
+    Results of calls to pure functions, evicting the least recently used
+    beyond max_entries.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[tuple, Any] = OrderedDict()
+        self.pure: set[int] = set()  # id() of pure Function statements.
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+        self.evictions = 0
+
+    def analyze(self, statements: list[Stmt]):
+        self.pure.update(id(function) for function in find_pure_functions(statements))
+
+    def is_pure(self, declaration: Function) -> bool:
+        return id(declaration) in self.pure
+
+    def key(self, function, arguments: list) -> Optional[tuple]:
+        """
+        What to remember a call's result by, or None if it can't be memoized.
+        """
+        key: list[Any] = [function]
+        for argument in arguments:
+            if not isinstance(argument, _PRIMITIVES):
+                return None  # An object or function, which might change.
+            # The type too, since in Python `true == 1` and they hash the same.
+            key.append(type(argument))
+            if argument == 0 and type(argument) is float and math.copysign(1.0, argument) < 0:
+                argument = "-0"  # Equal to 0 in Python, but eg 1/x differs.
+            key.append(argument)
+        return tuple(key)
+
+    def get(self, key: tuple) -> Any:
+        name = key[0].declaration.name.lexeme
+        value = self.entries.get(key, MISSING)
+        if value is MISSING:
+            self.misses[name] += 1
+        else:
+            self.hits[name] += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def store(self, key: tuple, value: Any):
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def report(self) -> str:
+        lines = ["%-20s %10s %10s %8s" % ("function", "hits", "misses", "hit rate")]
+        for name in sorted(set(self.hits) | set(self.misses)):
+            hits, misses = self.hits[name], self.misses[name]
+            lines.append("%-20s %10d %10d %7.1f%%" % (
+                name, hits, misses, 100.0 * hits / (hits + misses)))
+        lines.append("%d entries (max %d), %d evictions" % (
+            len(self.entries), self.max_entries, self.evictions))
+        return "\n".join(lines)
+
+
+@dataclass(eq=False)
+class MemoizedFunction(LoxFunction):
+    """
+    A pure function, whose results are remembered in a Memo.
+    """
+    memo: Memo = field(kw_only=True)
+
+    def call(self, interpreter, arguments: list):
+        key = self.memo.key(self, arguments)
+        if key is None:
+            super().call(interpreter, arguments)
+            return
+        value = self.memo.get(key)
+        if value is MISSING:
+            super().call(interpreter, arguments)
+            value = interpreter.innermost_call_state.return_value
+            self.memo.store(key, value)
+        interpreter.innermost_call_state.return_value = value
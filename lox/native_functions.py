@@ -8,7 +8,7 @@ class Clock(LoxCallable):
         return 0
 
     def call(self, interpreter, arguments):
-        return time.time()
+        interpreter.innermost_call_state.return_value = time.time()
 
     def __str__(self):
         return "<native fn>"
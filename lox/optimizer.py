@@ -0,0 +1,246 @@
+"""
+An optional pass over the resolved AST, before it's run, that does at compile
+time what would otherwise be redone every time the code runs.
+
+Level 1:
+- Folds operators whose operands are all literals, eg `1 + 2 * 3` to `7` and
+  `"a" + "b"` to `"ab"`, using the Interpreter's own operations so the results
+  are exactly Lox's. Anything that would be a runtime error, like `-"a"`, is
+  left alone to fail at runtime as before.
+- Drops Groupings, which only mattered to the parser.
+- Simplifies `and`/`or` with a literal on the left, eg `nil or x` to `x`.
+Level 2 also removes dead code:
+- `if`, `while` and `for` with literal conditions, eg `if (false) {...}`.
+- Statements after one that always returns.
+
+Algebraic identities like `x + 0` or `x * 1` aren't used, since in a dynamically
+typed language they'd hide the runtime error when `x` isn't a number.
+
+Nodes are changed in place rather than copied, since the resolver has stored
+where their variables are on them. It's done after resolving so dead code still
+gets its compile errors reported, and so removing it can't change which slots
+variables get.
+"""
+from typing import Optional
+
+from .error import LoxRuntimeError
+from .expression import (
+    Assign,
+    Binary,
+    Call,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from .interpreter import Interpreter
+from .statement import (
+    Block,
+    ClassStmt,
+    ExpressionStmt,
+    For,
+    Function,
+    If,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+from .tokentype import TokenType
+
+MAX_LEVEL = 2
+
+
+class Optimizer(ExprVisitor, StmtVisitor):
+
+    def __init__(self, level: int = MAX_LEVEL):
+        self.level = level
+        # For Lox's semantics of operators and truthiness.
+        self._interpreter = Interpreter()
+
+    def optimize(self, statements: list[Stmt]) -> list[Stmt]:
+        """
+        The optimized statements. The nodes that are kept are changed in place.
+        """
+        if self.level <= 0:
+            return statements
+        return self._statements(statements)
+
+    def _statements(self, statements: list[Stmt]) -> list[Stmt]:
+        optimized = []
+        for statement in statements:
+            statement = statement.accept(self)
+            if statement is None:
+                continue
+            optimized.append(statement)
+            if self.level >= 2 and always_returns(statement):
+                # The rest can't be reached.
+                break
+        return optimized
+
+    def _expr(self, expr: Expr) -> Expr:
+        return expr.accept(self)
+
+    ######################################################################
+    # Statements: each returns the statement to replace it, or None to remove it.
+
+    def visit_print_stmt(self, stmt: Print) -> Optional[Stmt]:
+        stmt.expression = self._expr(stmt.expression)
+        return stmt
+
+    def visit_expression_stmt(self, stmt: ExpressionStmt) -> Optional[Stmt]:
+        stmt.expression = self._expr(stmt.expression)
+        return stmt
+
+    def visit_var_stmt(self, stmt: Var) -> Optional[Stmt]:
+        if stmt.initializer is not None:
+            stmt.initializer = self._expr(stmt.initializer)
+        return stmt
+
+    def visit_block_stmt(self, stmt: Block) -> Optional[Stmt]:
+        stmt.statements = self._statements(stmt.statements)
+        return stmt
+
+    def visit_if_stmt(self, stmt: If) -> Optional[Stmt]:
+        stmt.condition = self._expr(stmt.condition)
+        then_branch = stmt.then_branch.accept(self)
+        else_branch = None if stmt.else_branch is None else stmt.else_branch.accept(self)
+        if self.level >= 2 and isinstance(stmt.condition, Literal):
+            # Branches are statements, not declarations, so have no variables
+            # of their own to keep in a scope.
+            if self._interpreter._is_truthy(stmt.condition.value):
+                return then_branch
+            return else_branch
+        stmt.then_branch = then_branch or Block([])
+        stmt.else_branch = else_branch
+        return stmt
+
+    def visit_while_stmt(self, stmt: While) -> Optional[Stmt]:
+        stmt.condition = self._expr(stmt.condition)
+        stmt.statement = stmt.statement.accept(self) or Block([])
+        if (self.level >= 2 and isinstance(stmt.condition, Literal)
+                and not self._interpreter._is_truthy(stmt.condition.value)):
+            return None
+        return stmt
+
+    def visit_for_stmt(self, stmt: For) -> Optional[Stmt]:
+        if stmt.initializer is not None:
+            stmt.initializer = stmt.initializer.accept(self)
+        if stmt.condition is not None:
+            stmt.condition = self._expr(stmt.condition)
+        if stmt.increment is not None:
+            stmt.increment = self._expr(stmt.increment)
+        stmt.body = stmt.body.accept(self) or Block([])
+        if (self.level >= 2 and isinstance(stmt.condition, Literal)
+                and not self._interpreter._is_truthy(stmt.condition.value)):
+            # The initializer still runs, in a scope of its own.
+            if stmt.initializer is None:
+                return None
+            stmt.body = Block([])
+        return stmt
+
+    def visit_function_statement(self, stmt: Function) -> Optional[Stmt]:
+        stmt.body = self._statements(stmt.body)
+        return stmt
+
+    def visit_return_stmt(self, stmt: Return) -> Optional[Stmt]:
+        if stmt.value is not None:
+            stmt.value = self._expr(stmt.value)
+        return stmt
+
+    def visit_class_stmt(self, stmt: ClassStmt) -> Optional[Stmt]:
+        for method in stmt.methods:
+            method.accept(self)
+        return stmt
+
+    ######################################################################
+    # Expressions: each returns the expression to replace it.
+
+    def visit_literal_expr(self, expr: Literal) -> Expr:
+        return expr
+
+    def visit_grouping_expr(self, expr: Grouping) -> Expr:
+        return self._expr(expr.expression)
+
+    def visit_unary_expr(self, expr: Unary) -> Expr:
+        expr.right = self._expr(expr.right)
+        if isinstance(expr.right, Literal):
+            try:
+                value = self._interpreter.unary_operation(expr.operator, expr.right.value)
+            except LoxRuntimeError:
+                return expr
+            return Literal(value, expr.operator)
+        return expr
+
+    def visit_binary_expr(self, expr: Binary) -> Expr:
+        expr.left = self._expr(expr.left)
+        expr.right = self._expr(expr.right)
+        if isinstance(expr.left, Literal) and isinstance(expr.right, Literal):
+            try:
+                value = self._interpreter.binary_operation(
+                    expr.operator, expr.left.value, expr.right.value)
+            except LoxRuntimeError:
+                return expr
+            return Literal(value, expr.operator)
+        return expr
+
+    def visit_logical_expr(self, expr: Logical) -> Expr:
+        expr.left = self._expr(expr.left)
+        expr.right = self._expr(expr.right)
+        if isinstance(expr.left, Literal):
+            truthy = self._interpreter._is_truthy(expr.left.value)
+            if truthy == (expr.operator.tokentype == TokenType.OR):
+                # Short-circuits, so is just the left side.
+                return expr.left
+            return expr.right
+        return expr
+
+    def visit_assign_expr(self, expr: Assign) -> Expr:
+        expr.value = self._expr(expr.value)
+        return expr
+
+    def visit_call_expr(self, expr: Call) -> Expr:
+        expr.callee = self._expr(expr.callee)
+        expr.arguments = [self._expr(argument) for argument in expr.arguments]
+        return expr
+
+    def visit_get_expr(self, expr: Get) -> Expr:
+        expr.object_ = self._expr(expr.object_)
+        return expr
+
+    def visit_set_expr(self, expr: Set) -> Expr:
+        expr.object_ = self._expr(expr.object_)
+        expr.value = self._expr(expr.value)
+        return expr
+
+    def visit_variable_expr(self, expr: Variable) -> Expr:
+        return expr
+
+    def visit_this_expr(self, expr: This) -> Expr:
+        return expr
+
+    def visit_super_expr(self, expr: Super) -> Expr:
+        return expr
+
+
+def always_returns(statement: Stmt) -> bool:
+    """
+    Whether running the statement always ends in a `return`.
+    """
+    if isinstance(statement, Return):
+        return True
+    if isinstance(statement, Block):
+        return any(always_returns(s) for s in statement.statements)
+    if isinstance(statement, If):
+        return (statement.else_branch is not None and always_returns(statement.then_branch)
+                and always_returns(statement.else_branch))
+    return False
@@ -1,4 +1,5 @@
-from typing import Optional, List
+from collections.abc import Iterator
+from typing import List, Optional
 from .expression import (
     Assign,
     Binary,
@@ -18,6 +19,7 @@ from .statement import (
     Block,
     ClassStmt,
     ExpressionStmt,
+    For,
     Function,
     If,
     Print,
@@ -28,6 +30,7 @@ from .statement import (
 )
 from .tokentype import TokenType
 from .scanner import Token
+from .token import TokenBuffer
 from .error import ErrorReporter
 
 
@@ -37,11 +40,23 @@ MAX_ARGS = 255
 class Parser:
     def __init__(
         self,
-        tokens: Optional[list[Token]] = None,
+        tokens: Optional[list[Token] | TokenBuffer | Iterator[Token]] = None,
         error_reporter: Optional[ErrorReporter] = None,
     ):
+        """
+        `tokens` can be a list or a TokenBuffer, or an iterator, eg
+        RegexScanner.iter_tokens(), in which case they're only read as the
+        parser gets to them.
+        """
         self.current = 0
-        self.tokens = tokens or []
+        # Where to read more tokens from, if they're not all in self.tokens.
+        self._more_tokens: Optional[Iterator[Token]] = None
+        self.tokens: list[Token] | TokenBuffer
+        if isinstance(tokens, Iterator):
+            self.tokens = []
+            self._more_tokens = tokens
+        else:
+            self.tokens = tokens or []
         self.error_reporter = error_reporter or ErrorReporter()
 
     def parse(self) -> List[Stmt]:
@@ -52,6 +67,20 @@ class Parser:
                 statements.append(stmt)
         return statements
 
+    def declarations(self) -> Iterator[Stmt]:
+        """
+        Like parse(), but yields each top-level declaration as soon as it's
+        parsed, and forgets the tokens it's finished with.
+        """
+        while not self.is_at_end():
+            stmt = self.declaration()
+            if isinstance(self.tokens, list):
+                # Only previous() is needed from here on.
+                del self.tokens[:self.current - 1]
+                self.current = 1
+            if stmt is not None:
+                yield stmt
+
     def parse_expr(self) -> Optional[Expr]:
         # Legacy  method for chapters < 8
         try:
@@ -129,7 +158,8 @@ class Parser:
         elif self.match(TokenType.RETURN):
             return self._return_statement()
         elif self.match(TokenType.LEFT_BRACE):
-            return Block(self._block())
+            statements = self._block()
+            return Block(statements, closing_brace=self.previous())
         else:
             return self._expression_statement()
 
@@ -162,7 +192,7 @@ class Parser:
         statement: Stmt = self.statement()
         return While(condition, statement)
 
-    def _for_statement(self) -> Stmt:
+    def _for_statement(self) -> For:
         # "for" "(" ( varDecl | exprStmt | ";" ) expression? ";" expression? ")" statement
         self.consume(TokenType.LEFT_PAREN, "Expect '(' after 'for'.")
         initializer: Optional[Stmt] = None
@@ -184,27 +214,9 @@ class Parser:
         self.consume(TokenType.RIGHT_PAREN, "Expect ')' after for clauses.")
 
         body: Stmt = self.statement()
-
-        ######################################################################
-        # De-sugaring!
-        # https://craftinginterpreters.com/control-flow.html#desugaring
-        ######################################################################
-
-        if increment is not None:
-            # The increment expression just runs after every time we do the body,
-            # so combine them into a block.
-            body = Block([body, ExpressionStmt(increment)])
-
-        # You can always express 'for' as an equivalent 'while'.
-        if condition is None:
-            condition = Literal(True)
-        body = While(condition, body)
-
-        # SHove the whole thing into a block that does the initialization first.
-        if initializer is not None:
-            body = Block([initializer, body])
-
-        return body
+        # Unlike the book, not desugared into a Block around a While around a
+        # Block, which made a new scope every iteration just for the increment.
+        return For(initializer, condition, increment, body)
 
     def _return_statement(self):
         keyword: Token = self.previous()
@@ -372,13 +384,13 @@ class Parser:
         #      | NUMBER | STRING | IDENTIFIER | "(" expression ")"
         #      | "super" "." IDENTIFIER ;
         if self.match(TokenType.FALSE):
-            return Literal(False)
+            return Literal(False, self.previous())
         if self.match(TokenType.TRUE):
-            return Literal(True)
+            return Literal(True, self.previous())
         if self.match(TokenType.NIL):
-            return Literal(None)
+            return Literal(None, self.previous())
         if self.match(TokenType.NUMBER, TokenType.STRING):
-            return Literal(self.previous().literal)
+            return Literal(self.previous().literal, self.previous())
 
         if self.match(TokenType.SUPER):
             keyword: Token = self.previous()
@@ -412,21 +424,43 @@ class Parser:
         return False
 
     def check(self, ttype: TokenType) -> bool:
-        if self.is_at_end():
+        # Same as `not self.is_at_end() and self.peek().tokentype == ttype`,
+        # but only peeking once, since this is the parser's busiest method.
+        try:
+            tokentype = self.peek().tokentype
+        except ParseError:
             return False
-        return self.peek().tokentype == ttype
+        return tokentype == ttype and tokentype != TokenType.EOF
 
     def is_at_end(self) -> bool:
-        if self.current >= len(self.tokens):
+        try:
+            return self.peek().tokentype == TokenType.EOF
+        except ParseError:
             # This wasn't in book, but catches eg empty token list
             return True
-        return self.peek().tokentype == TokenType.EOF
 
     def peek(self) -> Token:
-        if self.current >= len(self.tokens):
+        # Rather than checking len(self.tokens) each time, which is slow for a TokenBuffer.
+        try:
+            return self.tokens[self.current]
+        except IndexError:
+            if self._read_token():
+                return self.tokens[self.current]
             # This wasn't in book, but catches eg empty token list
             raise ParseError("Unexpected end of stream")
-        return self.tokens[self.current]
+
+    def _read_token(self) -> bool:
+        """
+        Read the next token from the iterator, if there is one.
+        """
+        if self._more_tokens is not None:
+            token = next(self._more_tokens, None)
+            if token is not None:
+                assert isinstance(self.tokens, list)
+                self.tokens.append(token)
+                return True
+            self._more_tokens = None
+        return False
 
     def previous(self) -> Token:
         return self.tokens[self.current - 1]
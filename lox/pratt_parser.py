@@ -0,0 +1,169 @@
+"""
+A Parser whose expressions are parsed by precedence climbing (a Pratt parser,
+as in clox's compiler), instead of one method per precedence level.
+
+The book's recursive descent makes ~11 nested calls, each trying to match()
+its operators, to get from expression() down to a literal or variable. Here
+each token type has a prefix rule (what it means at the start of an
+expression) and/or an infix rule (what it means after one) with a
+precedence, so parsing `1` is one table lookup for its prefix rule and one
+for the next token's infix rule. The AST nodes and error messages are the
+same as Parser's, and statements are still parsed by Parser's methods.
+"""
+from typing import Callable
+
+from .expression import (
+    Assign,
+    Binary,
+    Expr,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from .parser import Parser
+from .token import Token
+from .tokentype import TokenType
+
+# Precedences, lowest first.
+(
+    ASSIGNMENT,
+    OR,
+    AND,
+    EQUALITY,
+    COMPARISON,
+    TERM,
+    FACTOR,
+    UNARY,
+    CALL,
+) = range(1, 10)
+
+
+class PrattParser(Parser):
+    """
+    Drop-in replacement for the Parser, with faster expression parsing.
+    """
+
+    def expression(self) -> Expr:
+        return self._parse_precedence(ASSIGNMENT)
+
+    def _parse_precedence(self, precedence: int) -> Expr:
+        """
+        Parse an expression whose operators all have at least this precedence.
+        """
+        token = self.peek()
+        prefix = PREFIX_RULES.get(token.tokentype)
+        if prefix is None:
+            raise self.error(token, "Expect expression.")
+        self.current += 1
+        expr = prefix(self, token)
+        while True:
+            token = self.peek()
+            rule = INFIX_RULES.get(token.tokentype)
+            if rule is None or rule[0] < precedence:
+                return expr
+            self.current += 1
+            expr = rule[1](self, expr, token)
+
+    ############################################################
+    # Prefix rules: given the token that was just consumed.
+
+    def _literal(self, token: Token) -> Expr:
+        return Literal(token.literal, token)
+
+    def _false(self, token: Token) -> Expr:
+        return Literal(False, token)
+
+    def _true(self, token: Token) -> Expr:
+        return Literal(True, token)
+
+    def _nil(self, token: Token) -> Expr:
+        return Literal(None, token)
+
+    def _variable(self, token: Token) -> Expr:
+        return Variable(token)
+
+    def _this(self, token: Token) -> Expr:
+        return This(token)
+
+    def _super(self, token: Token) -> Expr:
+        self.consume(TokenType.DOT, "Expect '.' after 'super'.")
+        method = self.consume(TokenType.IDENTIFIER, "Expect superclass method name.")
+        return Super(token, method)
+
+    def _grouping(self, token: Token) -> Expr:
+        expr = self.expression()
+        self.consume(TokenType.RIGHT_PAREN, "Expect ')' after expression")
+        return Grouping(expr)
+
+    def _unary(self, token: Token) -> Expr:
+        return Unary(token, self._parse_precedence(UNARY))
+
+    ############################################################
+    # Infix rules: given the expression so far, and the operator just consumed.
+
+    def _binary(self, left: Expr, operator: Token) -> Expr:
+        # Left associative, so the right side only has tighter operators.
+        precedence = INFIX_RULES[operator.tokentype][0]
+        return Binary(left, operator, self._parse_precedence(precedence + 1))
+
+    def _or(self, left: Expr, operator: Token) -> Expr:
+        return Logical(left, operator, self._parse_precedence(AND))
+
+    def _and(self, left: Expr, operator: Token) -> Expr:
+        return Logical(left, operator, self._parse_precedence(EQUALITY))
+
+    def _call(self, callee: Expr, paren: Token) -> Expr:
+        return self._finish_call(callee)
+
+    def _get(self, obj: Expr, dot: Token) -> Expr:
+        name = self.consume(TokenType.IDENTIFIER, "Expect property name after '.'.")
+        return Get(obj, name)
+
+    def _assign(self, target: Expr, equals: Token) -> Expr:
+        # Right associative, like Parser.assignment().
+        value = self._parse_precedence(ASSIGNMENT)
+        if isinstance(target, Variable):
+            return Assign(target.name, value)
+        elif isinstance(target, Get):
+            return Set(target.object_, target.name, value)
+        self.error(equals, "Invalid assignment target.")
+        return target
+
+
+PREFIX_RULES: dict[TokenType, Callable[[PrattParser, Token], Expr]] = {
+    TokenType.NUMBER: PrattParser._literal,
+    TokenType.STRING: PrattParser._literal,
+    TokenType.FALSE: PrattParser._false,
+    TokenType.TRUE: PrattParser._true,
+    TokenType.NIL: PrattParser._nil,
+    TokenType.IDENTIFIER: PrattParser._variable,
+    TokenType.THIS: PrattParser._this,
+    TokenType.SUPER: PrattParser._super,
+    TokenType.LEFT_PAREN: PrattParser._grouping,
+    TokenType.BANG: PrattParser._unary,
+    TokenType.MINUS: PrattParser._unary,
+}
+
+INFIX_RULES: dict[TokenType, tuple[int, Callable[[PrattParser, Expr, Token], Expr]]] = {
+    TokenType.EQUAL: (ASSIGNMENT, PrattParser._assign),
+    TokenType.OR: (OR, PrattParser._or),
+    TokenType.AND: (AND, PrattParser._and),
+    TokenType.BANG_EQUAL: (EQUALITY, PrattParser._binary),
+    TokenType.EQUAL_EQUAL: (EQUALITY, PrattParser._binary),
+    TokenType.GREATER: (COMPARISON, PrattParser._binary),
+    TokenType.GREATER_EQUAL: (COMPARISON, PrattParser._binary),
+    TokenType.LESS: (COMPARISON, PrattParser._binary),
+    TokenType.LESS_EQUAL: (COMPARISON, PrattParser._binary),
+    TokenType.MINUS: (TERM, PrattParser._binary),
+    TokenType.PLUS: (TERM, PrattParser._binary),
+    TokenType.SLASH: (FACTOR, PrattParser._binary),
+    TokenType.STAR: (FACTOR, PrattParser._binary),
+    TokenType.LEFT_PAREN: (CALL, PrattParser._call),
+    TokenType.DOT: (CALL, PrattParser._get),
+}
@@ -0,0 +1,823 @@
+"""
+Another execution engine: translate the resolved Lox AST into a Python `ast.Module`,
+compile that with `compile()`, and let CPython's own bytecode interpreter run it.
+
+How Lox maps onto Python:
+
+* Lox globals are Python globals, named `<name>_g`. The whole script runs
+  inside one Python function, `lox_script`, so locals at the top level are
+  fast Python locals.
+* Each Lox local gets its own Python local, `<name>_l<n>`, numbered across the
+  whole program, so shadowing and sibling blocks never collide.
+* Locals captured by a closure live in a one element list (a "box"), which is
+  passed to the closure as a keyword-only default argument. Python's own
+  closures won't do, because a Lox block in a loop gets fresh variables on
+  every iteration while a Python function only has one set.
+* Operators inline the number checks, falling back to helpers in
+  python_runtime for the error (or string) case, so `a < b` becomes
+  `a < b if (type(a) is float) & (type(b) is float) else lox_error(...)`.
+* Generated nodes carry the line of the Lox token they came from, so runtime
+  errors can report the right line from the traceback.
+
+Anything we can't translate (or that CPython refuses to compile, eg more than
+20 nested loops) runs on the tree-walking Interpreter instead.
+"""
+import ast
+import copy
+import sys
+import types
+import warnings
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+from . import python_runtime
+from .error import LoxRuntimeError
+from .expression import (
+    Assign,
+    Binary,
+    Call,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from .interpreter import Interpreter
+from .resolver import FunctionType
+from .statement import (
+    Block,
+    ClassStmt,
+    ExpressionStmt,
+    For,
+    Function,
+    If,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+from .token import Token
+from .tokentype import TokenType
+
+FILENAME = "<lox>"
+SCRIPT = "lox_script"
+
+NUMERIC_OPERATORS = {
+    TokenType.GREATER: ast.Gt,
+    TokenType.GREATER_EQUAL: ast.GtE,
+    TokenType.LESS: ast.Lt,
+    TokenType.LESS_EQUAL: ast.LtE,
+    TokenType.MINUS: ast.Sub,
+    TokenType.STAR: ast.Mult,
+    TokenType.SLASH: ast.Div,
+    TokenType.PLUS: ast.Add,
+}
+
+# Operators whose result is always a Python bool.
+BOOLEAN_OPERATORS = {
+    TokenType.GREATER,
+    TokenType.GREATER_EQUAL,
+    TokenType.LESS,
+    TokenType.LESS_EQUAL,
+    TokenType.EQUAL_EQUAL,
+    TokenType.BANG_EQUAL,
+}
+
+
+class Unsupported(Exception):
+    """
+    Raised for Lox we can't turn into Python; the program runs on the tree walker.
+    """
+
+
+class PythonInterpreter(Interpreter):
+    """
+    Runs programs by compiling them to Python, falling back to the tree-walking
+    Interpreter it extends when that doesn't work out.
+
+    With `emit_python`, prints the generated Python instead of running it.
+    """
+
+    def __init__(self, error_reporter=None, emit_python: bool = False):
+        super().__init__(error_reporter=error_reporter, use_resolver=True)
+        self.emit_python = emit_python
+        # Persists between calls to interpret(), as globals do in the REPL.
+        self.namespace = python_runtime.namespace()
+
+    def interpret(self, statements: List[Stmt]):
+        try:
+            module = PythonCompiler().compile(statements)
+            with warnings.catch_warnings():
+                # Eg "is not" with a literal, which is just what we mean.
+                warnings.simplefilter("ignore", SyntaxWarning)
+                code = compile(module, FILENAME, "exec")
+        except (Unsupported, SyntaxError, RecursionError, ValueError, MemoryError) as e:
+            if self.emit_python:
+                print("Can't compile this program to Python: %s" % e, file=sys.stderr)
+                return
+            super().interpret(statements)
+            return
+
+        if self.emit_python:
+            print(ast.unparse(module))
+            return
+
+        exec(code, self.namespace)
+        try:
+            self.namespace[SCRIPT]()
+        except LoxRuntimeError as _error:
+            _error.line = _lox_line(_error.__traceback__)
+            self.error_reporter.runtime_error(_error)
+        except NameError as _error:
+            # Reading or assigning an undefined global.
+            name = (_error.name or "")[:-2]
+            error = LoxRuntimeError("Undefined variable '%s'." % name, None,
+                                    _lox_line(_error.__traceback__))
+            self.error_reporter.runtime_error(error)
+        except RecursionError as _error:
+            error = LoxRuntimeError("Stack overflow.", None,
+                                    _lox_line(_error.__traceback__))
+            self.error_reporter.runtime_error(error)
+
+
+def _lox_line(traceback: Optional[types.TracebackType]) -> int:
+    """
+    The line in the innermost frame of generated code.
+    """
+    line = 0
+    while traceback is not None:
+        if traceback.tb_frame.f_code.co_filename == FILENAME:
+            line = traceback.tb_lineno
+        traceback = traceback.tb_next
+    return line
+
+
+@dataclass
+class LocalVariable:
+    name: str  # The Python name.
+    function: 'FunctionScope'
+    boxed: bool
+    # id() of the token that declared it; None for `this` and `super`.
+    declaration: Optional[int] = None
+
+
+@dataclass
+class FunctionScope:
+    enclosing: Optional['FunctionScope']
+    function_type: FunctionType
+    # Variables of enclosing functions that this one (or a function nested in
+    # it) uses, which are passed in as keyword-only defaults.
+    free: dict[str, None] = field(default_factory=dict)
+    assigned_globals: set[str] = field(default_factory=set)
+
+
+class PythonCompiler:
+    """
+    Compiles the program twice: the first pass just finds out which locals are
+    captured by closures, so the second knows which ones need boxes.
+    """
+
+    def compile(self, statements: List[Stmt]) -> ast.Module:
+        first_pass = ModuleBuilder(boxed=set())
+        first_pass.build(statements)
+        return ModuleBuilder(boxed=first_pass.captured).build(statements)
+
+
+class ModuleBuilder(ExprVisitor, StmtVisitor):
+    """
+    Statement visitors return a list of Python statements,
+    expression visitors return a Python expression.
+    """
+
+    def __init__(self, boxed: set[int]):
+        # ids of the declaring tokens of locals that need boxes, and that we've
+        # seen captured so far.
+        self.boxed = boxed
+        self.captured: set[int] = set()
+        self.function = FunctionScope(None, FunctionType.NONE)
+        self._scopes: list[dict[str, LocalVariable]] = []
+        self._counter = 0
+
+    def build(self, statements: List[Stmt]) -> ast.Module:
+        body = self._statements(statements)
+        body = self._globals_declaration() + body
+        script = ast.FunctionDef(
+            name=SCRIPT, args=_arguments([]), body=body or [ast.Pass()],
+            decorator_list=[], returns=None,
+        )
+        module = ast.Module(body=[script], type_ignores=[])
+        return ast.fix_missing_locations(module)
+
+    def compile_stmt(self, stmt: Stmt) -> list[ast.stmt]:
+        result = stmt.accept(self)
+        if result is None:
+            raise Unsupported("no translation for %s" % type(stmt).__name__)
+        return result
+
+    def compile_expr(self, expr: Expr) -> ast.expr:
+        result = expr.accept(self)
+        if result is None:
+            raise Unsupported("no translation for %s" % type(expr).__name__)
+        return result
+
+    ############################################################
+    # StmtVisitor methods
+
+    def visit_expression_stmt(self, stmt: ExpressionStmt):
+        expr = stmt.expression
+        # Assignments as statements don't need to produce a value,
+        # which saves a helper call or two.
+        if isinstance(expr, Assign):
+            return self._assign_stmt(expr)
+        if isinstance(expr, Set):
+            return self._set_stmt(expr)
+        return [ast.Expr(self.compile_expr(expr))]
+
+    def visit_print_stmt(self, stmt: Print):
+        return [ast.Expr(_call("lox_print", [self.compile_expr(stmt.expression)]))]
+
+    def visit_var_stmt(self, stmt: Var):
+        if stmt.initializer is None:
+            value: ast.expr = ast.Constant(None)
+        else:
+            value = self.compile_expr(stmt.initializer)
+        return self._define(stmt.name, value)
+
+    def visit_block_stmt(self, stmt: Block):
+        self._begin_scope()
+        body = self._statements(stmt.statements)
+        self._end_scope()
+        return body
+
+    def visit_if_stmt(self, stmt: If):
+        condition = self._truthy(stmt.condition)
+        then_branch = self._body([stmt.then_branch])
+        else_branch = []
+        if stmt.else_branch is not None:
+            else_branch = self._statements([stmt.else_branch])
+        return [ast.If(test=condition, body=then_branch, orelse=else_branch)]
+
+    def visit_while_stmt(self, stmt: While):
+        condition = self._truthy(stmt.condition)
+        return [ast.While(test=condition, body=self._body([stmt.statement]), orelse=[])]
+
+    def visit_for_stmt(self, stmt: For):
+        self._begin_scope()
+        statements = []
+        if stmt.initializer is not None:
+            statements = self.compile_stmt(stmt.initializer)
+        condition: ast.expr = ast.Constant(True)
+        if stmt.condition is not None:
+            condition = self._truthy(stmt.condition)
+        body = self._statements([stmt.body])
+        if stmt.increment is not None:
+            body += self.visit_expression_stmt(ExpressionStmt(stmt.increment))
+        self._end_scope()
+        statements.append(ast.While(test=condition, body=body or [ast.Pass()], orelse=[]))
+        return statements
+
+    def visit_function_statement(self, stmt: Function):
+        # Declared first, so the function can refer to itself.
+        variable = self._declare(stmt.name)
+        statements = self._create_box(variable)
+        statements.append(self._function(stmt, FunctionType.FUNCTION))
+        statements += self._store(stmt.name, variable, _name(stmt.name.lexeme + "_f"))
+        return statements
+
+    def visit_return_stmt(self, stmt: Return):
+        if self.function.function_type == FunctionType.INITIALIZER:
+            return [ast.Return(_name("this"))]
+        if stmt.value is None:
+            return [ast.Return(None)]
+        return [ast.Return(self.compile_expr(stmt.value))]
+
+    def visit_class_stmt(self, stmt: ClassStmt):
+        variable = self._declare(stmt.name)
+        statements = self._create_box(variable)
+
+        superclass: ast.expr = ast.Constant(None)
+        if stmt.superclass is not None:
+            superclass = _name(self._temp())
+            check = _call("lox_superclass", [self.compile_expr(stmt.superclass)],
+                          stmt.superclass.name)
+            statements.append(_assign(superclass.id, check))
+            self._begin_scope()
+            self._scopes[-1]["super"] = LocalVariable(superclass.id, self.function, False)
+
+        methods = ast.Dict(keys=[], values=[])
+        for method in stmt.methods:
+            is_init = method.name.lexeme == "init"
+            function_type = FunctionType.INITIALIZER if is_init else FunctionType.METHOD
+            statements.append(self._function(method, function_type))
+            methods.keys.append(ast.Constant(method.name.lexeme))
+            methods.values.append(_name(method.name.lexeme + "_f"))
+
+        if stmt.superclass is not None:
+            self._end_scope()
+
+        klass = _call("lox_class", [ast.Constant(stmt.name.lexeme), superclass, methods])
+        statements += self._store(stmt.name, variable, klass)
+        return statements
+
+    ############################################################
+    # ExprVisitor methods
+
+    def visit_literal_expr(self, expr: Literal):
+        return ast.Constant(expr.value)
+
+    def visit_grouping_expr(self, expr: Grouping):
+        return self.compile_expr(expr.expression)
+
+    def visit_unary_expr(self, expr: Unary):
+        if expr.operator.tokentype == TokenType.BANG:
+            return ast.UnaryOp(ast.Not(), self._truthy(expr.right))
+        test, (operand,) = self._checked_operands(expr.right)
+        negate = ast.UnaryOp(ast.USub(), operand)
+        if test is None:
+            return negate
+        error = _call("lox_error", [ast.Constant("Operand must be a number.")],
+                      expr.operator)
+        return _at(ast.IfExp(test=test, body=negate, orelse=error), expr.operator)
+
+    def visit_binary_expr(self, expr: Binary):
+        tokentype = expr.operator.tokentype
+        if tokentype in (TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL):
+            return self._equality(expr)
+
+        test, (left, right) = self._checked_operands(expr.left, expr.right)
+        op = NUMERIC_OPERATORS[tokentype]()
+        if isinstance(op, (ast.Add, ast.Sub, ast.Mult)):
+            fast: ast.expr = ast.BinOp(left, op, right)
+        elif isinstance(op, ast.Div):
+            # Python raises on division by zero, where Lox gives inf or nan.
+            fast = ast.IfExp(
+                test=_copy(right),
+                body=ast.BinOp(left, op, right),
+                orelse=_call("lox_divide", [_copy(left), _copy(right)]),
+            )
+        else:
+            fast = ast.Compare(left, [op], [right])
+
+        if tokentype == TokenType.PLUS:
+            # Strings are rare enough to leave to the helper, which also errors.
+            slow = _call("lox_add", [_copy(left), _copy(right)], expr.operator)
+        else:
+            slow = _call("lox_error", [ast.Constant("Operands must be numbers.")],
+                         expr.operator)
+        if test is None:
+            return fast
+        return _at(ast.IfExp(test=test, body=fast, orelse=slow), expr.operator)
+
+    def _equality(self, expr: Binary) -> ast.expr:
+        left, right = self._operands(expr.left, expr.right)
+        if isinstance(left[0], ast.Constant):
+            left, right = right, left
+        result: ast.expr
+        if isinstance(right[0], ast.Constant) and right[0].value is None:
+            result = ast.Compare(left[0], [ast.Is()], [ast.Constant(None)])
+        else:
+            if isinstance(right[0], ast.Constant):
+                right_type: ast.expr = _name(type(right[0].value).__name__)
+            else:
+                right_type = _type(right[0])
+            # Compare the types too, so eg `true == 1` is false like in Lox.
+            same_type = ast.Compare(_type(left[0]), [ast.Is()], [right_type])
+            equal = ast.Compare(left[1], [ast.Eq()], [right[1]])
+            result = ast.BoolOp(ast.And(), [same_type, equal])
+        if expr.operator.tokentype == TokenType.BANG_EQUAL:
+            result = ast.UnaryOp(ast.Not(), result)
+        return result
+
+    def visit_variable_expr(self, expr: Variable):
+        return self._load(expr.name)
+
+    def visit_assign_expr(self, expr: Assign):
+        value = self.compile_expr(expr.value)
+        variable = self._resolve(expr.name)
+        if variable is None:
+            # Evaluate the value, then check the global exists, then assign.
+            temp = self._temp()
+            python_name = self._global(expr.name, assigned=True)
+            assign = ast.Tuple([
+                ast.NamedExpr(_name(temp, ast.Store()), value),
+                _at(_name(python_name), expr.name),
+                ast.NamedExpr(_name(python_name, ast.Store()), _name(temp)),
+            ], ast.Load())
+            return ast.Subscript(assign, ast.Constant(2), ast.Load())
+        if variable.boxed:
+            return _call("lox_store", [_name(variable.name), value])
+        return ast.NamedExpr(_name(variable.name, ast.Store()), value)
+
+    def visit_logical_expr(self, expr: Logical):
+        temp = self._temp()
+        left = ast.NamedExpr(_name(temp, ast.Store()), self.compile_expr(expr.left))
+        truthy = _truthy_test(left, _name(temp))
+        right = self.compile_expr(expr.right)
+        if expr.operator.tokentype == TokenType.AND:
+            return ast.IfExp(test=truthy, body=right, orelse=_name(temp))
+        return ast.IfExp(test=truthy, body=_name(temp), orelse=right)
+
+    def visit_call_expr(self, expr: Call):
+        if isinstance(expr.callee, Get):
+            return self._invoke(expr, expr.callee)
+        if isinstance(expr.callee, Super):
+            return self._super_invoke(expr, expr.callee)
+
+        temp = self._temp()
+        callee = ast.NamedExpr(_name(temp, ast.Store()), self.compile_expr(expr.callee))
+        arguments = [self.compile_expr(argument) for argument in expr.arguments]
+        # A Lox function with the right arity can be called directly.
+        test = ast.BoolOp(ast.And(), [
+            ast.Compare(_type(callee), [ast.Is()], [_name("lox_function_type")]),
+            _arity_is(_name(temp), len(arguments)),
+        ])
+        fast = ast.Call(_name(temp), arguments, [])
+        slow = _call("lox_call", [_name(temp)] + [_copy(a) for a in arguments], expr.paren)
+        return _at(ast.IfExp(test=test, body=fast, orelse=slow), expr.paren)
+
+    def _invoke(self, expr: Call, get: Get) -> ast.expr:
+        """
+        obj.method(args): call the method directly, without making a BoundMethod.
+        """
+        name = ast.Constant(get.name.lexeme)
+        if isinstance(get.object_, This):
+            receiver: ast.expr = self.compile_expr(get.object_)
+            receiver_ref: ast.expr = _copy(receiver)
+        else:
+            temp = self._temp()
+            receiver = ast.NamedExpr(_name(temp, ast.Store()), self.compile_expr(get.object_))
+            receiver_ref = _name(temp)
+        method = self._temp()
+        arguments = [self.compile_expr(argument) for argument in expr.arguments]
+        test = ast.BoolOp(ast.And(), [
+            ast.Compare(_type(receiver), [ast.Is()], [_name("lox_instance_type")]),
+            # Fields shadow methods.
+            ast.Compare(name, [ast.NotIn()], [_attribute(_copy(receiver_ref), "fields")]),
+            ast.Compare(
+                ast.NamedExpr(
+                    _name(method, ast.Store()),
+                    _method_lookup(_attribute(_copy(receiver_ref), "klass"), name),
+                ),
+                [ast.IsNot()], [ast.Constant(None)],
+            ),
+            _arity_is(_name(method), len(arguments) + 1),
+        ])
+        fast = ast.Call(_name(method), [_copy(receiver_ref)] + arguments, [])
+        bound = _call("lox_get", [_copy(receiver_ref), name], get.name)
+        slow = _call("lox_call", [bound] + [_copy(a) for a in arguments], expr.paren)
+        return _at(ast.IfExp(test=test, body=fast, orelse=slow), expr.paren)
+
+    def _super_invoke(self, expr: Call, super_expr: Super) -> ast.expr:
+        superclass = self._load(super_expr.keyword)
+        this = self._load(Token(TokenType.THIS, "this", None, super_expr.keyword.line))
+        name = ast.Constant(super_expr.method.lexeme)
+        method = self._temp()
+        arguments = [self.compile_expr(argument) for argument in expr.arguments]
+        test = ast.BoolOp(ast.And(), [
+            ast.Compare(
+                ast.NamedExpr(_name(method, ast.Store()), _method_lookup(superclass, name)),
+                [ast.IsNot()], [ast.Constant(None)],
+            ),
+            _arity_is(_name(method), len(arguments) + 1),
+        ])
+        fast = ast.Call(_name(method), [this] + arguments, [])
+        bound = _call("lox_get_super", [_copy(this), _copy(superclass), name],
+                      super_expr.method)
+        slow = _call("lox_call", [bound] + [_copy(a) for a in arguments], expr.paren)
+        return _at(ast.IfExp(test=test, body=fast, orelse=slow), expr.paren)
+
+    def visit_get_expr(self, expr: Get):
+        return _call("lox_get", [self.compile_expr(expr.object_),
+                                 ast.Constant(expr.name.lexeme)], expr.name)
+
+    def visit_set_expr(self, expr: Set):
+        fields = _call("lox_fields", [self.compile_expr(expr.object_)], expr.name)
+        value = self.compile_expr(expr.value)
+        return _call("lox_set", [fields, ast.Constant(expr.name.lexeme), value])
+
+    def visit_this_expr(self, expr: This):
+        return self._load(expr.keyword)
+
+    def visit_super_expr(self, expr: Super):
+        superclass = self._load(expr.keyword)
+        this = self._load(Token(TokenType.THIS, "this", None, expr.keyword.line))
+        return _call("lox_get_super", [this, superclass, ast.Constant(expr.method.lexeme)],
+                     expr.method)
+
+    ############################################################
+    # Statements
+
+    def _statements(self, statements: List[Stmt]) -> list[ast.stmt]:
+        body: list[ast.stmt] = []
+        for statement in statements:
+            body += self.compile_stmt(statement)
+        return body
+
+    def _body(self, statements: List[Stmt]) -> list[ast.stmt]:
+        return self._statements(statements) or [ast.Pass()]
+
+    def _assign_stmt(self, expr: Assign) -> list[ast.stmt]:
+        value = self.compile_expr(expr.value)
+        variable = self._resolve(expr.name)
+        if variable is None:
+            # Evaluate the value, then check the global exists, then assign.
+            temp = self._temp()
+            python_name = self._global(expr.name, assigned=True)
+            return [
+                _assign(temp, value),
+                ast.Expr(_at(_name(python_name), expr.name)),
+                _assign(python_name, _name(temp)),
+            ]
+        return self._store(expr.name, variable, value)
+
+    def _set_stmt(self, expr: Set) -> list[ast.stmt]:
+        if isinstance(expr.object_, This):
+            # Always an instance, so there's nothing to check first.
+            fields: ast.expr = _attribute(self.compile_expr(expr.object_), "fields")
+            statements: list[ast.stmt] = []
+        else:
+            temp = self._temp()
+            statements = [_assign(temp, _call(
+                "lox_fields", [self.compile_expr(expr.object_)], expr.name))]
+            fields = _name(temp)
+        target = ast.Subscript(fields, ast.Constant(expr.name.lexeme), ast.Store())
+        statements.append(ast.Assign([target], self.compile_expr(expr.value)))
+        return statements
+
+    def _truthy(self, expr: Expr) -> ast.expr:
+        value = self.compile_expr(expr)
+        if _is_boolean(expr):
+            return value
+        if isinstance(value, ast.Constant):
+            return ast.Constant(value.value is not None and value.value is not False)
+        if _is_simple(value):
+            return _truthy_test(value, _copy(value))
+        temp = self._temp()
+        return _truthy_test(ast.NamedExpr(_name(temp, ast.Store()), value), _name(temp))
+
+    ############################################################
+    # Operands
+
+    def _operands(self, *exprs: Expr) -> list[tuple[ast.expr, ast.expr]]:
+        """
+        Compile operands, returning for each one an expression to evaluate it the
+        first time, and one to refer to its value after that.
+        Anything that might have side effects is stored in a temporary.
+        """
+        compiled = [self.compile_expr(expr) for expr in exprs]
+        all_simple = all(_is_simple(operand) for operand in compiled)
+        operands = []
+        for i, operand in enumerate(compiled):
+            # A simple operand can be evaluated twice, but only if nothing
+            # evaluated after it could assign to it.
+            if isinstance(operand, ast.Constant) or (
+                _is_simple(operand) and (all_simple or i == len(compiled) - 1)
+            ):
+                operands.append((operand, _copy(operand)))
+            else:
+                temp = self._temp()
+                operands.append((ast.NamedExpr(_name(temp, ast.Store()), operand),
+                                 _name(temp)))
+        return operands
+
+    def _checked_operands(self, *exprs: Expr):
+        """
+        As _operands, plus a test that they're all numbers, or None if they're
+        all number literals.
+        """
+        operands = self._operands(*exprs)
+        checks: list[ast.expr] = []
+        for first, _ in operands:
+            if isinstance(first, ast.Constant) and type(first.value) is float:
+                continue
+            checks.append(ast.Compare(_type(first), [ast.Is()], [_name("float")]))
+        if len(checks) == 2:
+            # `&` not `and`, so the second operand is evaluated even if the first
+            # isn't a number: it needs to be for the error (and its side effects).
+            test: Optional[ast.expr] = ast.BinOp(checks[0], ast.BitAnd(), checks[1])
+        elif checks:
+            test = checks[0]
+        else:
+            test = None
+        return test, [operand[1] for operand in operands]
+
+    ############################################################
+    # Functions
+
+    def _function(self, stmt: Function, function_type: FunctionType) -> ast.FunctionDef:
+        self.function = FunctionScope(self.function, function_type)
+        self._begin_scope()
+        parameters = []
+        if function_type in (FunctionType.METHOD, FunctionType.INITIALIZER):
+            parameters.append("this")
+            self._scopes[-1]["this"] = LocalVariable("this", self.function, False)
+        body: list[ast.stmt] = []
+        for param in stmt.parameters:
+            variable = self._declare(param)
+            assert variable is not None  # We're in the function's scope.
+            parameters.append(variable.name)
+            if variable.boxed:
+                body.append(_assign(variable.name, ast.List([_name(variable.name)], ast.Load())))
+        body += self._statements(stmt.body)
+        if function_type == FunctionType.INITIALIZER:
+            body.append(ast.Return(_name("this")))
+        self._end_scope()
+
+        function = self.function
+        self.function = function.enclosing  # type: ignore
+        body = self._globals_declaration(function) + body
+        free = list(function.free)
+        arguments = _arguments(parameters)
+        arguments.kwonlyargs = [ast.arg(name) for name in free]
+        arguments.kw_defaults = [_name(name) for name in free]
+        return _at(ast.FunctionDef(
+            name=stmt.name.lexeme + "_f", args=arguments, body=body or [ast.Pass()],
+            decorator_list=[], returns=None,
+        ), stmt.name)
+
+    def _globals_declaration(self, function: Optional[FunctionScope] = None) -> list[ast.stmt]:
+        function = function or self.function
+        if not function.assigned_globals:
+            return []
+        return [ast.Global(sorted(function.assigned_globals))]
+
+    ############################################################
+    # Variables
+
+    def _begin_scope(self):
+        self._scopes.append({})
+
+    def _end_scope(self):
+        self._scopes.pop()
+
+    def _temp(self) -> str:
+        self._counter += 1
+        return "lox_t%d" % self._counter
+
+    def _declare(self, name: Token) -> Optional[LocalVariable]:
+        """
+        Returns the new local, or None for globals.
+        """
+        if not self._scopes:
+            return None
+        self._counter += 1
+        variable = LocalVariable(
+            "%s_l%d" % (name.lexeme, self._counter), self.function,
+            boxed=id(name) in self.boxed, declaration=id(name),
+        )
+        self._scopes[-1][name.lexeme] = variable
+        return variable
+
+    def _define(self, name: Token, value: ast.expr) -> list[ast.stmt]:
+        # The value is compiled before declaring, so it can't see the new variable.
+        variable = self._declare(name)
+        if variable is not None and variable.boxed:
+            value = ast.List([value], ast.Load())
+            return [_assign(variable.name, value)]
+        return self._store(name, variable, value)
+
+    def _create_box(self, variable: Optional[LocalVariable]) -> list[ast.stmt]:
+        # For functions and classes, which may be captured by their own bodies.
+        if variable is None or not variable.boxed:
+            return []
+        return [_assign(variable.name, ast.List([ast.Constant(None)], ast.Load()))]
+
+    def _store(self, name: Token, variable: Optional[LocalVariable],
+               value: ast.expr) -> list[ast.stmt]:
+        if variable is None:
+            return [_assign(self._global(name, assigned=True), value)]
+        self._use(variable)
+        if variable.boxed:
+            target = ast.Subscript(_name(variable.name), ast.Constant(0), ast.Store())
+            return [ast.Assign([target], value)]
+        return [_assign(variable.name, value)]
+
+    def _resolve(self, name: Token) -> Optional[LocalVariable]:
+        for scope in reversed(self._scopes):
+            if name.lexeme in scope:
+                variable = scope[name.lexeme]
+                self._use(variable)
+                return variable
+        return None
+
+    def _use(self, variable: LocalVariable):
+        # Pass the variable down through every function between here and where
+        # it was declared.
+        function = self.function
+        while function is not variable.function:
+            if variable.declaration is not None:
+                self.captured.add(variable.declaration)
+            function.free[variable.name] = None
+            function = function.enclosing  # type: ignore
+
+    def _global(self, name: Token, assigned: bool = False) -> str:
+        python_name = name.lexeme + "_g"
+        if assigned:
+            self.function.assigned_globals.add(python_name)
+        return python_name
+
+    def _load(self, name: Token) -> ast.expr:
+        variable = self._resolve(name)
+        if variable is None:
+            return _at(_name(self._global(name)), name)
+        if variable.boxed:
+            return ast.Subscript(_name(variable.name), ast.Constant(0), ast.Load())
+        return _name(variable.name)
+
+
+############################################################
+# Building Python AST nodes.
+
+def _name(name: str, ctx: Optional[ast.expr_context] = None) -> ast.Name:
+    return ast.Name(name, ctx or ast.Load())
+
+
+def _attribute(value: ast.expr, attr: str) -> ast.Attribute:
+    return ast.Attribute(value, attr, ast.Load())
+
+
+def _assign(name: str, value: ast.expr) -> ast.Assign:
+    return ast.Assign([_name(name, ast.Store())], value)
+
+
+def _call(helper: str, args: list[ast.expr], token: Optional[Token] = None) -> ast.Call:
+    call = ast.Call(_name(helper), args, [])
+    if token is not None:
+        _at(call, token)
+    return call
+
+
+def _type(value: ast.expr) -> ast.Call:
+    return ast.Call(_name("type"), [value], [])
+
+
+def _arity_is(function: ast.expr, arity: int) -> ast.Compare:
+    code = _attribute(function, "__code__")
+    return ast.Compare(_attribute(code, "co_argcount"), [ast.Eq()], [ast.Constant(arity)])
+
+
+def _method_lookup(klass: ast.expr, name: ast.Constant) -> ast.Call:
+    get = _attribute(_attribute(klass, "methods"), "get")
+    return ast.Call(get, [name], [])
+
+
+def _truthy_test(first: ast.expr, then: ast.expr) -> ast.expr:
+    return ast.BoolOp(ast.And(), [
+        ast.Compare(first, [ast.IsNot()], [ast.Constant(None)]),
+        ast.Compare(then, [ast.IsNot()], [ast.Constant(False)]),
+    ])
+
+
+def _arguments(names: list[str]) -> ast.arguments:
+    return ast.arguments(
+        posonlyargs=[], args=[ast.arg(name) for name in names], vararg=None,
+        kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[],
+    )
+
+
+def _is_simple(node: ast.expr) -> bool:
+    """
+    Can be evaluated more than once, with the same result and no side effects.
+    (A global might not be defined, but then the first evaluation raises.)
+    """
+    if isinstance(node, (ast.Name, ast.Constant)):
+        return True
+    return (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name)
+            and isinstance(node.slice, ast.Constant))
+
+
+def _is_boolean(expr: Expr) -> bool:
+    if isinstance(expr, Grouping):
+        return _is_boolean(expr.expression)
+    if isinstance(expr, Binary):
+        return expr.operator.tokentype in BOOLEAN_OPERATORS
+    if isinstance(expr, Unary):
+        return expr.operator.tokentype == TokenType.BANG
+    return isinstance(expr, Literal) and isinstance(expr.value, bool)
+
+
+def _copy(node: ast.expr) -> ast.expr:
+    """
+    A fresh node referring to the same value as a simple one.
+    """
+    if isinstance(node, ast.Name):
+        return _name(node.id)
+    if isinstance(node, ast.Constant):
+        return ast.Constant(node.value)
+    if isinstance(node, ast.Subscript) and _is_simple(node):
+        return ast.Subscript(_copy(node.value), _copy(node.slice), ast.Load())
+    return copy.deepcopy(node)
+
+
+def _at(node: Any, token: Token) -> Any:
+    node.lineno = node.end_lineno = token.line
+    node.col_offset = node.end_col_offset = 0
+    return node
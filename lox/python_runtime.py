@@ -0,0 +1,198 @@
+"""
+Runtime support for the Python code generated by lox/python_compiler.py.
+
+Generated code only calls out to these helpers (all named `lox_...`) when it
+needs Lox semantics that plain Python doesn't give us: type checks that fail,
+calling something that might be a class or native function, properties, etc.
+The common cases are inlined into the generated code instead.
+
+Lox functions are plain Python functions. Methods take `this` as their
+first argument, and are stored unbound in their class.
+"""
+from types import FunctionType
+from typing import Any, NoReturn, Optional
+
+from . import native_functions
+from .error import LoxRuntimeError
+from .interpreter import CallState, Interpreter, divide
+from .lox_callable import LoxCallable
+
+
+class Class:
+    __slots__ = ("name", "methods")
+
+    def __init__(self, name: str, methods: dict[str, FunctionType]):
+        self.name = name
+        self.methods = methods
+
+    def __str__(self):
+        return self.name
+
+
+class Instance:
+    __slots__ = ("klass", "fields")
+
+    def __init__(self, klass: Class):
+        self.klass = klass
+        self.fields: dict[str, Any] = {}
+
+    def __str__(self):
+        return self.klass.name + " instance"
+
+
+class BoundMethod:
+    __slots__ = ("this", "method")
+
+    def __init__(self, this: Instance, method: FunctionType):
+        self.this = this
+        self.method = method
+
+    def __str__(self):
+        return "<fn %s>" % function_name(self.method)
+
+
+class NativeCallContext:
+    """
+    Native functions are LoxCallables, which report their result via
+    `interpreter.innermost_call_state`; this stands in for the interpreter.
+    """
+
+    def __init__(self):
+        self.innermost_call_state = CallState()
+
+
+def function_name(function: FunctionType) -> str:
+    # The compiler names the def after the Lox function, plus a "_f" suffix.
+    return function.__name__[:-2]
+
+
+def arity(function: FunctionType) -> int:
+    return function.__code__.co_argcount
+
+
+############################################################
+# Helpers called from generated code.
+
+def lox_error(message: str) -> NoReturn:
+    # The line number gets filled in from the traceback.
+    raise LoxRuntimeError(message, None)
+
+
+def lox_truthy(value: Any) -> bool:
+    return value is not None and value is not False
+
+
+def lox_add(left: Any, right: Any) -> Any:
+    # Numbers are handled inline; we only get here for anything else.
+    if type(left) is str and type(right) is str:
+        return left + right
+    if type(left) is float and type(right) is float:
+        return left + right
+    lox_error("Operands must be two numbers or two strings.")
+
+
+lox_divide = divide
+
+
+def lox_print(value: Any):
+    print(stringify(value))
+
+
+def stringify(value: Any) -> str:
+    if type(value) is FunctionType:
+        return "<fn %s>" % function_name(value)
+    return Interpreter.stringify(value)
+
+
+def lox_store(box: list, value: Any) -> Any:
+    # Assignment to a variable captured by a closure, as an expression.
+    box[0] = value
+    return value
+
+
+def lox_call(callee: Any, *arguments) -> Any:
+    # The common case of calling a function with the right number of arguments
+    # is inlined, so this handles everything else.
+    kind = type(callee)
+    if kind is FunctionType:
+        _check_arity(arity(callee), arguments)
+        return callee(*arguments)
+    if kind is BoundMethod:
+        _check_arity(arity(callee.method) - 1, arguments)
+        return callee.method(callee.this, *arguments)
+    if kind is Class:
+        instance = Instance(callee)
+        initializer = callee.methods.get("init")
+        if initializer is None:
+            _check_arity(0, arguments)
+        else:
+            _check_arity(arity(initializer) - 1, arguments)
+            initializer(instance, *arguments)
+        return instance
+    if isinstance(callee, LoxCallable):
+        _check_arity(callee.arity(), arguments)
+        context = NativeCallContext()
+        callee.call(context, list(arguments))
+        return context.innermost_call_state.return_value
+    lox_error("Can only call functions and classes.")
+
+
+def _check_arity(expected: int, arguments: tuple):
+    if len(arguments) != expected:
+        lox_error("Expected %d arguments but got %d." % (expected, len(arguments)))
+
+
+def lox_get(instance: Any, name: str) -> Any:
+    if type(instance) is not Instance:
+        lox_error("Only instances have properties.")
+    fields = instance.fields
+    if name in fields:
+        return fields[name]
+    method = instance.klass.methods.get(name)
+    if method is None:
+        lox_error("Undefined property '%s'." % name)
+    return BoundMethod(instance, method)
+
+
+def lox_fields(instance: Any) -> dict[str, Any]:
+    # Checked before the value being assigned is evaluated, as in jlox.
+    if type(instance) is not Instance:
+        lox_error("Only instances have fields.")
+    return instance.fields
+
+
+def lox_set(fields: dict[str, Any], name: str, value: Any) -> Any:
+    fields[name] = value
+    return value
+
+
+def lox_get_super(this: Instance, superclass: Class, name: str) -> BoundMethod:
+    method = superclass.methods.get(name)
+    if method is None:
+        lox_error("Undefined property '%s'." % name)
+    return BoundMethod(this, method)
+
+
+def lox_superclass(value: Any) -> Class:
+    if type(value) is not Class:
+        lox_error("Superclass must be a class.")
+    return value
+
+
+def lox_class(name: str, superclass: Optional[Class],
+              methods: dict[str, FunctionType]) -> Class:
+    # Copy the inherited methods down, so method lookup is a single dict get.
+    all_methods = {} if superclass is None else dict(superclass.methods)
+    all_methods.update(methods)
+    return Class(name, all_methods)
+
+
+def namespace() -> dict[str, Any]:
+    """
+    A fresh set of globals for generated code to run in.
+    """
+    names = {name: value for name, value in globals().items() if name.startswith("lox_")}
+    names["lox_function_type"] = FunctionType
+    names["lox_instance_type"] = Instance
+    names["clock_g"] = native_functions.Clock()
+    return names
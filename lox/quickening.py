@@ -0,0 +1,217 @@
+"""
+Quickening: self-specializing `Binary`, `Unary` and `Logical` nodes, for the
+tree-walking interpreters.
+
+Run generically, an operator checks which one it is, then the types of its
+operands, every time. But a given node usually sees the same types each time
+(`i < 10` compares numbers, `a + b` in a string-building loop adds strings),
+so the first time it runs, a node rewrites its operation into one specialized
+for the types it saw, like CPython's specializing interpreter. That checks
+those types and does just the one thing. If the types change, the check fails,
+and the node deoptimizes back to the generic operation, which specializes it
+again for the new types. A node whose types keep changing gives up, after
+MAX_REWRITES, and stays generic.
+
+`!`, `and` and `or` only care about truthiness, which is the same quick check
+for any type, so they're specialized just for their operator and never
+deoptimize.
+"""
+from typing import Any, Callable, Optional
+
+from .tokentype import TokenType
+
+# Returned by a specialized operation whose operands aren't the types it's for.
+DEOPTIMIZE = object()
+
+# How many times a node can be rewritten before it stays generic.
+MAX_REWRITES = 4
+
+
+class Quickening:
+    __slots__ = ("operation", "rewrites")
+
+    def __init__(self):
+        # The specialized operation, or None to run the generic one.
+        self.operation: Optional[Callable] = None
+        self.rewrites = 0
+
+    def rewrite(self, operation: Optional[Callable]):
+        """
+        Specialize into this operation for the types just seen, if there is one
+        and we haven't given up yet.
+        """
+        self.rewrites += 1
+        self.operation = operation if self.rewrites < MAX_REWRITES else None
+
+
+def binary_operation_for(tokentype: TokenType, left: Any, right: Any) -> Optional[Callable]:
+    """
+    The operation specialized for the types of these operands, if any.
+    """
+    left_type, right_type = type(left), type(right)
+    if left_type is float and right_type is float:
+        return NUMBER_OPERATIONS.get(tokentype)
+    if left_type is str and right_type is str:
+        return STRING_OPERATIONS.get(tokentype)
+    if tokentype == TokenType.EQUAL_EQUAL or tokentype == TokenType.BANG_EQUAL:
+        return _equality(tokentype == TokenType.BANG_EQUAL, left_type, right_type)
+    return None
+
+
+def unary_operation_for(tokentype: TokenType, right: Any) -> Optional[Callable]:
+    if tokentype == TokenType.BANG:
+        return not_
+    if tokentype == TokenType.MINUS and type(right) is float:
+        return number_negate
+    return None
+
+
+def logical_operation_for(tokentype: TokenType) -> Callable[[Any], bool]:
+    """
+    Whether the left operand of an `and` or `or` is its result.
+    """
+    if tokentype == TokenType.OR:
+        return or_short_circuits
+    return and_short_circuits
+
+
+######################################################################
+# Specialized operations: each checks its operands' types first.
+
+def number_add(left, right):
+    if type(left) is float and type(right) is float:
+        return left + right
+    return DEOPTIMIZE
+
+
+def number_subtract(left, right):
+    if type(left) is float and type(right) is float:
+        return left - right
+    return DEOPTIMIZE
+
+
+def number_multiply(left, right):
+    if type(left) is float and type(right) is float:
+        return left * right
+    return DEOPTIMIZE
+
+
+def number_divide(left, right):
+    # Dividing by zero deoptimizes too, and is left to the generic operation.
+    if type(left) is float and type(right) is float and right:
+        return left / right
+    return DEOPTIMIZE
+
+
+def number_less(left, right):
+    if type(left) is float and type(right) is float:
+        return left < right
+    return DEOPTIMIZE
+
+
+def number_less_equal(left, right):
+    if type(left) is float and type(right) is float:
+        return left <= right
+    return DEOPTIMIZE
+
+
+def number_greater(left, right):
+    if type(left) is float and type(right) is float:
+        return left > right
+    return DEOPTIMIZE
+
+
+def number_greater_equal(left, right):
+    if type(left) is float and type(right) is float:
+        return left >= right
+    return DEOPTIMIZE
+
+
+def number_equal(left, right):
+    if type(left) is float and type(right) is float:
+        return left == right
+    return DEOPTIMIZE
+
+
+def number_not_equal(left, right):
+    if type(left) is float and type(right) is float:
+        return left != right
+    return DEOPTIMIZE
+
+
+def string_add(left, right):
+    if type(left) is str and type(right) is str:
+        return left + right
+    return DEOPTIMIZE
+
+
+def string_equal(left, right):
+    if type(left) is str and type(right) is str:
+        return left == right
+    return DEOPTIMIZE
+
+
+def string_not_equal(left, right):
+    if type(left) is str and type(right) is str:
+        return left != right
+    return DEOPTIMIZE
+
+
+NUMBER_OPERATIONS: dict[TokenType, Callable[[Any, Any], Any]] = {
+    TokenType.PLUS: number_add,
+    TokenType.MINUS: number_subtract,
+    TokenType.STAR: number_multiply,
+    TokenType.SLASH: number_divide,
+    TokenType.LESS: number_less,
+    TokenType.LESS_EQUAL: number_less_equal,
+    TokenType.GREATER: number_greater,
+    TokenType.GREATER_EQUAL: number_greater_equal,
+    TokenType.EQUAL_EQUAL: number_equal,
+    TokenType.BANG_EQUAL: number_not_equal,
+}
+
+STRING_OPERATIONS: dict[TokenType, Callable[[Any, Any], Any]] = {
+    TokenType.PLUS: string_add,
+    TokenType.EQUAL_EQUAL: string_equal,
+    TokenType.BANG_EQUAL: string_not_equal,
+}
+
+
+def _equality(negate: bool, left_type: type, right_type: type) -> Callable[[Any, Any], Any]:
+    """
+    `==` or `!=` for other types, eg `nil == nil` or `x == nil`.
+    """
+    if left_type is right_type:
+        # Lox values of the same type are equal just when Python says so.
+        def same_type_equal(left, right):
+            if type(left) is left_type and type(right) is right_type:
+                return (left == right) is not negate
+            return DEOPTIMIZE
+
+        return same_type_equal
+
+    # Values of different types are never equal in Lox, even `true` and `1`.
+    def different_type_equal(left, right):
+        if type(left) is left_type and type(right) is right_type:
+            return negate
+        return DEOPTIMIZE
+
+    return different_type_equal
+
+
+def number_negate(right):
+    if type(right) is float:
+        return -right
+    return DEOPTIMIZE
+
+
+def not_(right):
+    return right is None or right is False
+
+
+def or_short_circuits(left) -> bool:
+    return left is not None and left is not False
+
+
+def and_short_circuits(left) -> bool:
+    return left is None or left is False
@@ -1,4 +1,6 @@
 import enum
+from dataclasses import dataclass, field
+from typing import Optional
 from .expression import (
     Assign,
     Expr,
@@ -9,7 +11,7 @@ from .expression import (
     This,
     Variable
     )
-from .statement import StmtVisitor, Stmt, Block, Var, Function, Return, ClassStmt
+from .statement import StmtVisitor, Stmt, Block, For, Var, Function, Return, ClassStmt
 from .token import Token
 from .error import ErrorReporter
 
@@ -27,6 +29,32 @@ class ClassType(enum.Enum):
     SUBCLASS = 3
 
 
+@dataclass
+class LocalVariable:
+    """What the resolver knows about one variable declared in a local scope."""
+    slot: int  # Index into the runtime Environment's slots.
+    defined: bool = False
+    # Whether a function declared in a nested scope uses it, so it lives in a Cell.
+    captured: bool = False
+    # The Var, Function or ClassStmt that declares it; None for parameters,
+    # `this` and `super`.
+    declaration: Optional[Stmt] = None
+    # Where it's used from within its own function, as (expr, depth). These are
+    # only given their locations at the end of its scope, when we know whether
+    # it's captured.
+    uses: list[tuple[Variable | Assign | This | Super, int]] = field(default_factory=list)
+
+
+@dataclass
+class FunctionScope:
+    """What the resolver knows about the function it's inside."""
+    declaration: Function
+    base: int  # Index in Resolver.scopes of the function's own scope.
+    # Index in declaration.free of each variable captured from an enclosing
+    # function, by (index of its scope, name).
+    free: dict[tuple[int, str], int] = field(default_factory=dict)
+
+
 class Resolver(ExprVisitor, StmtVisitor):
     """
     Chapter 11:
@@ -40,14 +68,27 @@ class Resolver(ExprVisitor, StmtVisitor):
       if same names later get added to nearer ancestor scope(s) after function definition.
       (eg the bug example in
       https://craftinginterpreters.com/resolving-and-binding.html#static-scope)
+    - Unlike the book, also numbers the variables of each local scope in declaration
+      order, so the interpreter can store them in a list and access them by index.
+    - Also unlike the book, closures are flat: a function only reaches the variables
+      of its own scopes through environments. Those of enclosing functions that it
+      uses are "free", and are passed to it in Cells when it's declared. So each
+      variable resolves to (depth, slot, is_cell): where the cell is, if it's free
+      or captured by a closure, or where its value is.
+    - Unlike the book, what it finds is stored on the Variable, Assign, This and
+      Super nodes themselves, as their `location`, rather than in the interpreter.
+    - Uses of globals are resolved too, to the global's slot in the interpreter's
+      GlobalEnvironment, by name since they may be declared later.
     """
     def __init__(self, interpreter, error_reporter: ErrorReporter):
         self.interpreter = interpreter
         self.error_reporter = error_reporter or ErrorReporter()
-        self.scopes: list[dict[str, bool]] = []
+        self.scopes: list[dict[str, LocalVariable]] = []
         # This is just here so we can track if we're inside a function definition or not.
         self._current_function: FunctionType = FunctionType.NONE
         self._current_class: ClassType = ClassType.NONE
+        # The functions we're inside, innermost last.
+        self._functions: list[FunctionScope] = []
 
     ######################################################################
     # Var resolution
@@ -61,41 +102,111 @@ class Resolver(ExprVisitor, StmtVisitor):
     def resolve_expr(self, expr: Expr):
         expr.accept(self)
 
-    def resolve_local(self, expr: Expr, name: Token):
-        for depth, scope in enumerate(reversed(self.scopes)):
-            if name.lexeme in scope:
-                self.interpreter.resolve(expr, depth)
-                return
-
-    def declare(self, name: Token):
+    def resolve_local(self, expr: Variable | Assign | This | Super, name: str):
+        base = self._functions[-1].base if self._functions else 0
+        for index in range(len(self.scopes) - 1, -1, -1):
+            local = self.scopes[index].get(name)
+            if local is None:
+                continue
+            if index >= base:
+                # Declared in this function.
+                local.uses.append((expr, len(self.scopes) - 1 - index))
+            else:
+                # One of the function's cells, which are in an environment just
+                # outside its own scope.
+                cell = self._free_variable(len(self._functions) - 1, index, name)
+                expr.location = (len(self.scopes) - base, cell, True)
+            return
+        # Not found, so assume it's global, even if it's not declared yet.
+        self.interpreter.resolve_global(expr, name)
+
+    def _free_variable(self, level: int, index: int, name: str) -> int:
+        """
+        The index of the function's cell for the variable in this scope,
+        capturing it from the enclosing function first if need be.
+        """
+        function = self._functions[level]
+        key = (index, name)
+        if key in function.free:
+            return function.free[key]
+        enclosing_base = self._functions[level - 1].base if level > 0 else 0
+        # Where the cell is when the function is declared, relative to the
+        # scope it's declared in.
+        declared_in = function.base - 1
+        if index >= enclosing_base:
+            local = self.scopes[index][name]
+            local.captured = True
+            location = (declared_in - index, local.slot)
+        else:
+            enclosing_cell = self._free_variable(level - 1, index, name)
+            location = (declared_in - enclosing_base + 1, enclosing_cell)
+        function.declaration.free.append(location)
+        function.free[key] = len(function.declaration.free) - 1
+        return function.free[key]
+
+    def declare(self, name: Token, declaration: Optional[Stmt] = None):
         if not self.scopes:
             return
         scope = self.scopes[-1]
         if name.lexeme in scope:
             self.error_reporter.token_error(name, "Already a variable with this name in this scope.")
-        scope[name.lexeme] = False
+            # Doesn't matter what we do, we won't be running this program.
+            return
+        scope[name.lexeme] = LocalVariable(slot=len(scope), declaration=declaration)
 
     def define(self, name: Token):
         if not self.scopes:
             return
         scope = self.scopes[-1]
-        scope[name.lexeme] = True
+        scope[name.lexeme].defined = True
 
     ######################################################################
     # Statement visitor overrides
 
     def visit_block_stmt(self, stmt: Block):
+        self._resolve_block(stmt)
+
+    def _resolve_block(self, stmt: Block) -> dict[str, LocalVariable]:
+        """
+        Returns the block's scope: empty if it doesn't need one.
+        """
+        # Only these declare anything in the block's own scope.
+        stmt.needs_scope = any(
+            isinstance(s, (Var, Function, ClassStmt)) for s in stmt.statements)
+        if not stmt.needs_scope:
+            # Its statements resolve as if they were in the enclosing block,
+            # so the interpreter can run them in the enclosing environment.
+            self.resolve_stmts(stmt.statements)
+            return {}
         self._begin_scope()
         self.resolve_stmts(stmt.statements)
-        self._end_scope()
+        return self._end_scope()
+
+    def visit_for_stmt(self, stmt: For):
+        # Like the book's desugaring, the initializer gets a scope of its own.
+        if stmt.initializer is not None:
+            self._begin_scope()
+            self.resolve_stmt(stmt.initializer)
+        if stmt.condition is not None:
+            self.resolve_expr(stmt.condition)
+        if isinstance(stmt.body, Block):
+            scope = self._resolve_block(stmt.body)
+            stmt.reuse_body_scope = stmt.body.needs_scope and not any(
+                local.captured for local in scope.values())
+        else:
+            self.resolve_stmt(stmt.body)
+        if stmt.increment is not None:
+            self.resolve_expr(stmt.increment)
+        if stmt.initializer is not None:
+            self._end_scope()
 
     def visit_function_statement(self, stmt: Function):
-        self.declare(stmt.name)
+        self.declare(stmt.name, stmt)
         self.define(stmt.name)
         self._resolve_function(stmt, FunctionType.FUNCTION)
 
     def visit_var_stmt(self, stmt: Var):
-        self.declare(stmt.name)
+        self.declare(stmt.name, stmt)
         if stmt.initializer is not None:
             self.resolve_expr(stmt.initializer)
         self.define(stmt.name)
@@ -103,7 +214,7 @@ class Resolver(ExprVisitor, StmtVisitor):
     def visit_class_stmt(self, stmt: ClassStmt):
         _old_enclosing_class = self._current_class
         self._current_class = ClassType.CLASS
-        self.declare(stmt.name)
+        self.declare(stmt.name, stmt)
         self.define(stmt.name)
 
         if stmt.superclass is not None:
@@ -117,10 +228,8 @@ class Resolver(ExprVisitor, StmtVisitor):
             self.resolve_expr(stmt.superclass)
 
             self._begin_scope()  # Scope for superclass
-            self.scopes[-1]["super"] = True
+            self._declare_implicit("super")
 
-        self._begin_scope() # Implicit scope for 'this'
-        self.scopes[-1]["this"] = True
         for method in stmt.methods:
             ftype = FunctionType.INITIALIZER if method.name.lexeme == "init" else FunctionType.METHOD
             self._resolve_function(method, ftype)
@@ -128,22 +237,21 @@ class Resolver(ExprVisitor, StmtVisitor):
         if stmt.superclass is not None:
             self._end_scope()
 
-        self._end_scope()
         self._current_class = _old_enclosing_class
 
     ######################################################################
     # Expr visitor overrides, the important ones
 
     def visit_variable_expr(self, expr: Variable):
-        if self.scopes and self.scopes[-1].get(expr.name.lexeme) == False:
+        if self.scopes and self._is_declared_but_not_defined(expr.name):
             self.error_reporter.token_error(
                 expr.name, "Can't read local variable in its own initializer."
             )
-        self.resolve_local(expr, expr.name)
+        self.resolve_local(expr, expr.name.lexeme)
 
     def visit_assign_expr(self, expr: Assign):
         self.resolve_expr(expr.value)
-        self.resolve_local(expr, expr.name)
+        self.resolve_local(expr, expr.name.lexeme)
 
     ######################################################################
     # Boring expr visitor overrides
@@ -183,14 +291,15 @@ class Resolver(ExprVisitor, StmtVisitor):
         if self._current_class == ClassType.NONE:
             self.error_reporter.token_error(expr.keyword, "Can't use 'this' outside of a class.")
             return None
-        self.resolve_local(expr, expr.keyword)
+        self.resolve_local(expr, "this")
 
     def visit_super_expr(self, expr: Super):
         if self._current_class == ClassType.NONE:
             self.error_reporter.token_error(expr.keyword, "Can't use 'super' outside of a class.")
         elif self._current_class != ClassType.SUBCLASS:
             self.error_reporter.token_error(expr.keyword, "Can't use 'super' in a class with no superclass.")
-        self.resolve_local(expr, expr.keyword)
+        self.resolve_local(expr, "super")
+        self.resolve_local(expr.this, "this")
 
     ######################################################################
     # Boring stmt visitor overrides
@@ -230,11 +339,26 @@ class Resolver(ExprVisitor, StmtVisitor):
     # Scope management
 
     def _begin_scope(self):
-        scope: dict[str, bool] = {}
+        scope: dict[str, LocalVariable] = {}
         self.scopes.append(scope)
 
-    def _end_scope(self):
-        self.scopes.pop()
+    def _end_scope(self) -> dict[str, LocalVariable]:
+        scope = self.scopes.pop()
+        for local in scope.values():
+            if local.captured and local.declaration is not None:
+                local.declaration.captured = True  # type: ignore[attr-defined]
+            for expr, depth in local.uses:
+                expr.location = (depth, local.slot, local.captured)
+        return scope
+
+    def _declare_implicit(self, name: str):
+        # For 'super', which gets its own scope, and 'this', which is a method's first local.
+        scope = self.scopes[-1]
+        scope[name] = LocalVariable(slot=len(scope), defined=True)
+
+    def _is_declared_but_not_defined(self, name: Token) -> bool:
+        local = self.scopes[-1].get(name.lexeme)
+        return local is not None and not local.defined
 
     ######################################################################
     # private
@@ -242,10 +366,20 @@ class Resolver(ExprVisitor, StmtVisitor):
     def _resolve_function(self, function: Function, function_type: FunctionType):
         enclosing_function: FunctionType = self._current_function
         self._current_function = function_type
+        function.free = []
+        self._functions.append(FunctionScope(function, base=len(self.scopes)))
         self._begin_scope()
+        if function_type in (FunctionType.METHOD, FunctionType.INITIALIZER):
+            # Unlike the book, 'this' is slot 0 of the method's own scope rather than
+            # alone in an enclosing one, so calling a method needn't bind it first.
+            self._declare_implicit("this")
         for param in function.parameters:
             self.declare(param)
             self.define(param)
         self.resolve_stmts(function.body)
-        self._end_scope()
+        scope = self._end_scope()
+        function.cell_slots = tuple(
+            local.slot for local in scope.values()
+            if local.captured and local.declaration is None)
+        self._functions.pop()
         self._current_function = enclosing_function
@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 
-from typing import Optional, List
+import re
+from typing import AnyStr, Iterable, Iterator, List, Optional
 
 from . import error
 from .tokentype import TokenType
-from .token import Token
+from .token import TYPE_CODES, Token, TokenBuffer
 
 keywords = {
     "and": TokenType.AND,
@@ -192,3 +193,183 @@ class Scanner:
         value = self.source[self.start:self.current]
         tokentype = keywords.get(value, TokenType.IDENTIFIER)
         self.add_token(tokentype, literal=None)
+
+
+# Every token, or run of whitespace or comment, that RegexScanner can match.
+# Identifiers and punctuators share a group since both are looked up by lexeme.
+# Both the str and the bytes pattern are made from this, so its classes are
+# spelled out in ASCII: \d would match other digits in a str, but not in bytes.
+_TOKEN_REGEX = r"""
+    (?P<word>[A-Za-z_][A-Za-z_0-9]* | [!=<>]=? | [(){},.\-+;*] | /(?!/))
+  | (?P<space>[ \t\r]+ | //[^\n]*)
+  | (?P<newline>\n[ \t\r\n]*)
+  | (?P<number>[0-9]+(?:\.[0-9]+)?)
+  | (?P<string>"[^"]*"?)
+  | (?P<unexpected>%s)
+"""
+_TOKEN_PATTERN = re.compile(_TOKEN_REGEX % ".", re.VERBOSE | re.DOTALL)
+# The same for UTF-8 bytes, eg a memory-mapped file, where an unexpected
+# character can take several bytes but should only be one error.
+_BYTES_TOKEN_PATTERN = re.compile(
+    (_TOKEN_REGEX % r"[\xc0-\xff][\x80-\xbf]* | .").encode(), re.VERBOSE | re.DOTALL)
+
+_WORD, _SPACE, _NEWLINE, _NUMBER, _STRING = range(1, 6)
+
+_PUNCTUATORS = {
+    '(': TokenType.LEFT_PAREN,
+    ')': TokenType.RIGHT_PAREN,
+    '{': TokenType.LEFT_BRACE,
+    '}': TokenType.RIGHT_BRACE,
+    ',': TokenType.COMMA,
+    '.': TokenType.DOT,
+    '-': TokenType.MINUS,
+    '+': TokenType.PLUS,
+    ';': TokenType.SEMICOLON,
+    '*': TokenType.STAR,
+    '/': TokenType.SLASH,
+    '!': TokenType.BANG,
+    '!=': TokenType.BANG_EQUAL,
+    '=': TokenType.EQUAL,
+    '==': TokenType.EQUAL_EQUAL,
+    '<': TokenType.LESS,
+    '<=': TokenType.LESS_EQUAL,
+    '>': TokenType.GREATER,
+    '>=': TokenType.GREATER_EQUAL,
+}
+
+# What each `word` lexeme is, unless it's an identifier.
+_WORDS = {**keywords, **_PUNCTUATORS}
+_WORD_CODES = {lexeme: TYPE_CODES[tokentype] for lexeme, tokentype in _WORDS.items()}
+_BYTES_WORD_CODES = {lexeme.encode(): code for lexeme, code in _WORD_CODES.items()}
+
+
+class RegexScanner:
+    """
+    Drop-in replacement for the Scanner, giving the same tokens and errors,
+    that matches a whole token at a time with one compiled regular expression
+    instead of dispatching on every character.
+    """
+
+    def __init__(self, source, error_reporter: Optional[error.ErrorReporter]=None):
+        self.error_reporter = error_reporter or error.ErrorReporter()
+        self.source = source
+        self.line = 1
+        self.tokens: List[Token] = []
+
+    def scan_tokens(self):
+        self.tokens.extend(self.iter_tokens())
+        return self.tokens
+
+    def scan_buffer(self) -> TokenBuffer:
+        """
+        Like scan_tokens(), but into a TokenBuffer, which takes much less
+        memory than a list of Tokens.
+
+        The source can also be UTF-8 bytes, or anything like them such as an
+        mmap, in which case only the lexemes the parser asks for get decoded.
+        """
+        source = self.source
+        buffer = TokenBuffer(source)
+        if isinstance(source, str):
+            self.line = self._scan_matches(
+                buffer, _TOKEN_PATTERN.finditer(source), _WORD_CODES, '\n', '"')
+        else:
+            self.line = self._scan_matches(
+                buffer, _BYTES_TOKEN_PATTERN.finditer(source), _BYTES_WORD_CODES, b'\n', b'"')
+        buffer.append(TokenType.EOF, len(source), 0, self.line)
+        return buffer
+
+    def _scan_matches(self, buffer: TokenBuffer, matches: Iterator[re.Match[AnyStr]],
+                      codes: dict[AnyStr, int], newline: AnyStr, quote: AnyStr) -> int:
+        """
+        Append the tokens for the token pattern's matches on a str, or on bytes,
+        to the buffer. Returns the line the source ends on.
+        """
+        types, starts, lengths, lines = buffer.types, buffer.starts, buffer.lengths, buffer.lines
+        literals = buffer.literals
+        identifier = TYPE_CODES[TokenType.IDENTIFIER]
+        line = self.line
+        for match in matches:
+            kind = match.lastindex
+            if kind == _WORD:
+                types.append(codes.get(match.group(), identifier))
+            elif kind == _SPACE:
+                continue
+            elif kind == _NEWLINE:
+                line += match.group().count(newline)
+                continue
+            elif kind == _NUMBER:
+                literals[len(types)] = float(match.group())
+                types.append(TYPE_CODES[TokenType.NUMBER])
+            elif kind == _STRING:
+                text = match.group()
+                line += text.count(newline)
+                if len(text) > 1 and text.endswith(quote):
+                    value = text[1:-1]
+                    if isinstance(value, bytes):
+                        literals[len(types)] = value.decode()
+                    else:
+                        literals[len(types)] = value
+                    types.append(TYPE_CODES[TokenType.STRING])
+                else:
+                    self.error_reporter.error(line, "Unterminated string.")
+                    continue
+            else:
+                self.error_reporter.error(line, "Unexpected character.")
+                continue
+            start, end = match.span()
+            starts.append(start)
+            lengths.append(end - start)
+            lines.append(line)
+        return line
+
+    def iter_tokens(self, lines: Optional[Iterable[str]] = None) -> Iterator[Token]:
+        """
+        Yield the tokens as they're scanned, ending with EOF. Scans `lines`
+        instead of the source if given, eg a file or stdin, without reading
+        them all first; each must end with a line break, except the last.
+        """
+        words = _WORDS
+        identifier = TokenType.IDENTIFIER
+        line = self.line
+        # A string that's still going at the end of a chunk.
+        string = ""
+        for chunk in [self.source] if lines is None else lines:
+            start = 0
+            if string:
+                end = chunk.find('"')
+                if end == -1:
+                    string += chunk
+                    continue
+                start = end + 1
+                text = string + chunk[:start]
+                string = ""
+                line += text.count('\n')
+                yield Token(TokenType.STRING, text, text[1:-1], line)
+            for match in _TOKEN_PATTERN.finditer(chunk, start):
+                kind = match.lastindex
+                if kind == _WORD:
+                    text = match.group()
+                    yield Token(words.get(text, identifier), text, None, line)
+                elif kind == _SPACE:
+                    pass
+                elif kind == _NEWLINE:
+                    line += match.group().count('\n')
+                elif kind == _NUMBER:
+                    text = match.group()
+                    yield Token(TokenType.NUMBER, text, float(text), line)
+                elif kind == _STRING:
+                    text = match.group()
+                    if len(text) > 1 and text[-1] == '"':
+                        # Like the Scanner, a string's token is on the line it ends on.
+                        line += text.count('\n')
+                        yield Token(TokenType.STRING, text, text[1:-1], line)
+                    else:
+                        string = text
+                else:
+                    self.error_reporter.error(line, "Unexpected character.")
+        if string:
+            line += string.count('\n')
+            self.error_reporter.error(line, "Unterminated string.")
+        self.line = line
+        yield Token(TokenType.EOF, "", None, line)
@@ -0,0 +1,71 @@
+"""
+Shapes (aka hidden classes, or maps in V8) for the fields of LoxInstances.
+
+Instead of a dict per instance, each instance keeps its field values in a list,
+and points to a Shape that maps field names to indexes in that list. Instances
+that got the same fields in the same order share a Shape, found by following
+the same transitions from EMPTY_SHAPE, so the names are only stored once.
+
+Sharing a Shape also means "same fields in the same places", so a `obj.name`
+site can remember (in a FieldCache) where the last instance's Shape kept `name`,
+and find it again without a dict lookup.
+
+An instance with more than MAX_FIELDS fields switches to a DictionaryShape of
+its own, which it adds fields to in place, so odd instances can't blow up the
+transitions. Its values are still a list.
+"""
+from typing import Optional
+
+MAX_FIELDS = 32
+
+
+class Shape:
+    __slots__ = ("slots", "transitions")
+
+    def __init__(self, slots: Optional[dict[str, int]] = None):
+        # Field name -> index in the instance's values.
+        self.slots: dict[str, int] = {} if slots is None else slots
+        # Field name -> the Shape you get by adding that field.
+        self.transitions: dict[str, Shape] = {}
+
+    def add(self, name: str) -> 'Shape':
+        """
+        The Shape of an instance with our fields, plus `name` in the next slot.
+        """
+        shape = self.transitions.get(name)
+        if shape is None:
+            slots = dict(self.slots)
+            slots[name] = len(slots)
+            shape = self.transitions[name] = Shape(slots)
+        return shape
+
+
+class DictionaryShape(Shape):
+    """
+    The Shape of just one instance, with too many fields to share one: adding a
+    field changes it in place. Never cached, since a site's next instance won't
+    have it, and a cached miss would go stale.
+    """
+    __slots__ = ()
+
+    def add(self, name: str) -> Shape:
+        self.slots[name] = len(self.slots)
+        return self
+
+
+EMPTY_SHAPE = Shape()
+
+
+class FieldCache:
+    """
+    Where the last instance seen by a `obj.name` or `obj.name = value` site kept
+    the field: instances of the same Shape keep it in the same place.
+    """
+    __slots__ = ("shape", "slot", "next_shape")
+
+    def __init__(self):
+        self.shape: Optional[Shape] = None
+        # None if instances of `shape` don't have the field.
+        self.slot: Optional[int] = None
+        # For assignments that add the field: the Shape that makes.
+        self.next_shape: Optional[Shape] = None
@@ -0,0 +1,409 @@
+"""
+A tree-walking interpreter whose Lox calls don't recurse in Python.
+
+In the Interpreter, each Lox call nests a handful of Python frames, so deep
+Lox recursion hits Python's recursion limit (or, if that's raised, the C stack)
+long before anything Lox would call a stack overflow. Here, any statement or
+expression that might call a function is run as a generator instead: it yields
+the child nodes it needs evaluated, and `_run` keeps those generators on an
+explicit stack (a list) and sends each one the results. Calls push a generator
+for the function body, so Lox depth is limited only by `max_frames`, which
+gives a clean "Stack overflow." runtime error.
+
+Nodes that can't call anything (which is most of them) are still evaluated
+recursively by the Interpreter's visitor methods, since their depth is bounded
+by the source code rather than by how deep the program recurses.
+"""
+from types import GeneratorType
+from typing import Any, Callable, Generator, List, Optional
+
+from .environment import Cell, Environment, make_cells
+from .error import ErrorReporter, LoxRuntimeError
+from .expression import (
+    Assign,
+    Binary,
+    Call,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from .function import LoxFunction
+from .interpreter import CallState, Interpreter
+from .lox_callable import LoxCallable
+from .lox_class import LoxClass, LoxInstance
+from .statement import (
+    Block,
+    ClassStmt,
+    ExpressionStmt,
+    For,
+    Function,
+    If,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+
+MAX_FRAMES = 10000
+
+# What node generators yield: a node to evaluate, or a generator to run.
+Step = Generator[Any, Any, Any]
+
+
+class CallFinder(ExprVisitor, StmtVisitor):
+    """
+    Finds which nodes contain a call, including the nodes of function bodies,
+    and marks them `has_call`. Each visit returns whether the node contains one.
+    """
+
+    def find(self, node) -> bool:
+        found = node.accept(self)
+        if found:
+            node.has_call = True
+        return found
+
+    def _any(self, nodes) -> bool:
+        # Not any(), which would stop at the first call it found.
+        found = False
+        for node in nodes:
+            if node is not None and self.find(node):
+                found = True
+        return found
+
+    def visit_call_expr(self, expr: Call):
+        self._any([expr.callee, *expr.arguments])
+        return True
+
+    def visit_binary_expr(self, expr: Binary):
+        return self._any([expr.left, expr.right])
+
+    def visit_logical_expr(self, expr: Logical):
+        return self._any([expr.left, expr.right])
+
+    def visit_grouping_expr(self, expr: Grouping):
+        return self.find(expr.expression)
+
+    def visit_unary_expr(self, expr: Unary):
+        return self.find(expr.right)
+
+    def visit_assign_expr(self, expr: Assign):
+        return self.find(expr.value)
+
+    def visit_get_expr(self, expr: Get):
+        return self.find(expr.object_)
+
+    def visit_set_expr(self, expr: Set):
+        return self._any([expr.object_, expr.value])
+
+    def visit_literal_expr(self, expr: Literal):
+        return False
+
+    def visit_variable_expr(self, expr: Variable):
+        return False
+
+    def visit_this_expr(self, expr: This):
+        return False
+
+    def visit_super_expr(self, expr: Super):
+        return False
+
+    def visit_expression_stmt(self, stmt: ExpressionStmt):
+        return self.find(stmt.expression)
+
+    def visit_print_stmt(self, stmt: Print):
+        return self.find(stmt.expression)
+
+    def visit_var_stmt(self, stmt: Var):
+        return self._any([stmt.initializer])
+
+    def visit_block_stmt(self, stmt: Block):
+        return self._any(stmt.statements)
+
+    def visit_if_stmt(self, stmt: If):
+        return self._any([stmt.condition, stmt.then_branch, stmt.else_branch])
+
+    def visit_while_stmt(self, stmt: While):
+        return self._any([stmt.condition, stmt.statement])
+
+    def visit_for_stmt(self, stmt: For):
+        return self._any([stmt.initializer, stmt.condition, stmt.increment, stmt.body])
+
+    def visit_return_stmt(self, stmt: Return):
+        return self._any([stmt.value])
+
+    def visit_function_statement(self, stmt: Function):
+        # Defining a function doesn't run its body.
+        self._any(stmt.body)
+        return False
+
+    def visit_class_stmt(self, stmt: ClassStmt):
+        for method in stmt.methods:
+            self.find(method)
+        # A superclass is just a variable.
+        return False
+
+
+class StackInterpreter(Interpreter):
+    """
+    Drop-in replacement for the Interpreter that keeps Lox calls on an explicit stack.
+    """
+
+    def __init__(self, error_reporter: Optional[ErrorReporter] = None,
+                 max_frames: int = MAX_FRAMES):
+        super().__init__(error_reporter=error_reporter, use_resolver=True)
+        # Calls are our own, below, and don't use inline bodies.
+        self.inliner = None
+        self.max_frames = max_frames
+        self._generators: dict[type, Callable[[Any], Step]] = {
+            ExpressionStmt: self._expression_stmt,
+            Print: self._print_stmt,
+            Var: self._var_stmt,
+            Block: self._block_stmt,
+            If: self._if_stmt,
+            While: self._while_stmt,
+            For: self._for_stmt,
+            Return: self._return_stmt,
+            Binary: self._binary_expr,
+            Logical: self._logical_expr,
+            Grouping: self._grouping_expr,
+            Unary: self._unary_expr,
+            Assign: self._assign_expr,
+            Get: self._get_expr,
+            Set: self._set_expr,
+            Call: self._call_expr,
+        }
+
+    def interpret(self, statements: List[Stmt]):
+        finder = CallFinder()
+        for statement in statements:
+            finder.find(statement)
+        try:
+            self._run(self._script(statements))
+        except LoxRuntimeError as _error:
+            self.error_reporter.runtime_error(_error)
+            # Nothing unwound these, so put them back for the next REPL line.
+            self._environment = self.globals
+            del self._call_stack[:]
+
+    def _run(self, generator: Step) -> Any:
+        """
+        Run a node generator, and everything it yields, to completion.
+        """
+        generators = self._generators
+        stack = [generator]
+        value = None
+        while stack:
+            try:
+                request = stack[-1].send(value)
+            except StopIteration as stop:
+                stack.pop()
+                value = stop.value
+                continue
+            if type(request) is GeneratorType:
+                stack.append(request)
+                value = None
+            elif request.has_call and type(request) in generators:
+                stack.append(generators[type(request)](request))
+                value = None
+            else:
+                # Can't call anything, so recursing is fine.
+                value = request.accept(self)
+        return value
+
+    def _script(self, statements: List[Stmt]) -> Step:
+        for statement in statements:
+            yield statement
+
+    ############################################################
+    # Statements
+
+    def _expression_stmt(self, stmt: ExpressionStmt) -> Step:
+        yield stmt.expression
+
+    def _print_stmt(self, stmt: Print) -> Step:
+        value = yield stmt.expression
+        print(self.stringify(value))
+
+    def _var_stmt(self, stmt: Var) -> Step:
+        value = None
+        if stmt.initializer is not None:
+            value = yield stmt.initializer
+        if stmt.captured:
+            value = Cell(value)
+        self._define_variable(stmt.name.lexeme, value)
+
+    def _block_stmt(self, stmt: Block) -> Step:
+        if not stmt.needs_scope:
+            yield self._statements(stmt.statements, self._environment)
+        else:
+            yield self._statements(stmt.statements, Environment(enclosing=self._environment))
+
+    def _statements(self, statements: List[Stmt], environment: Environment) -> Step:
+        # Like Interpreter.execute_block. There's no `finally` to restore the
+        # environment after an error, since generators only run theirs when
+        # they get garbage collected; interpret() cleans up instead.
+        previous_env = self._environment
+        self._environment = environment
+        for statement in statements:
+            yield statement
+            if self.is_returning:
+                break
+        self._environment = previous_env
+
+    def _if_stmt(self, stmt: If) -> Step:
+        condition = yield stmt.condition
+        if self._is_truthy(condition):
+            yield stmt.then_branch
+        elif stmt.else_branch is not None:
+            yield stmt.else_branch
+
+    def _while_stmt(self, stmt: While) -> Step:
+        while self._is_truthy((yield stmt.condition)):
+            yield stmt.statement
+            if self.is_returning:
+                break
+
+    def _for_stmt(self, stmt: For) -> Step:
+        # Like Interpreter.visit_for_stmt.
+        previous_env = self._environment
+        if stmt.initializer is not None:
+            self._environment = Environment(enclosing=previous_env)
+            yield stmt.initializer
+        call_state = self.innermost_call_state
+        body_env = Environment(enclosing=self._environment) if stmt.reuse_body_scope else None
+        while stmt.condition is None or self._is_truthy((yield stmt.condition)):
+            if body_env is None:
+                yield stmt.body
+            else:
+                body_env.slots.clear()
+                yield self._statements(stmt.body.statements, body_env)  # type: ignore[attr-defined]
+            if call_state.is_returning:
+                break
+            if stmt.increment is not None:
+                yield stmt.increment
+        self._environment = previous_env
+
+    def _return_stmt(self, stmt: Return) -> Step:
+        value = None
+        if stmt.value is not None:
+            value = yield stmt.value
+        self.innermost_call_state.return_value = value
+        self.innermost_call_state.is_returning = True
+
+    ############################################################
+    # Expressions
+
+    def _binary_expr(self, expr: Binary) -> Step:
+        left = yield expr.left
+        right = yield expr.right
+        return self._evaluate_binary(expr, left, right)
+
+    def _logical_expr(self, expr: Logical) -> Step:
+        left_val = yield expr.left
+        if self._short_circuits(expr, left_val):
+            return left_val
+        return (yield expr.right)
+
+    def _grouping_expr(self, expr: Grouping) -> Step:
+        return (yield expr.expression)
+
+    def _unary_expr(self, expr: Unary) -> Step:
+        right = yield expr.right
+        return self._evaluate_unary(expr, right)
+
+    def _assign_expr(self, expr: Assign) -> Step:
+        value = yield expr.value
+        return self._assign_value_for_variable(expr, value)
+
+    def _get_expr(self, expr: Get) -> Step:
+        obj = yield expr.object_
+        if isinstance(obj, LoxInstance):
+            return obj.get(expr.name, expr.cache, expr.field_cache)
+        raise LoxRuntimeError("Only instances have properties.", expr.name)
+
+    def _set_expr(self, expr: Set) -> Step:
+        obj = yield expr.object_
+        if not isinstance(obj, LoxInstance):
+            raise LoxRuntimeError("Only instances have fields.", expr.name)
+        value = yield expr.value
+        obj.set(expr.name, value, expr.field_cache)
+        return value
+
+    def _call_expr(self, expr: Call) -> Step:
+        # The same checks, in the same order, as Interpreter.visit_call_expr.
+        callee_expr = expr.callee
+        instance = None
+        if type(callee_expr) is Get:
+            obj = yield callee_expr.object_
+            if not isinstance(obj, LoxInstance):
+                raise LoxRuntimeError("Only instances have properties.", callee_expr.name)
+            slot = obj.field_slot(callee_expr.name.lexeme, callee_expr.field_cache)
+            if slot is not None:
+                callee = obj.values[slot]
+            else:
+                # Invoke the method directly, without binding it.
+                instance = obj
+                callee = obj.find_method(callee_expr.name, callee_expr.cache)
+        elif type(callee_expr) is Super:
+            instance, callee = self._find_super_method(callee_expr)
+        else:
+            callee = yield callee_expr
+        if not isinstance(callee, LoxCallable):
+            raise LoxRuntimeError("Can only call functions and classes.", expr.paren)
+
+        args = []
+        for argument in expr.arguments:
+            args.append((yield argument))
+
+        if type(callee) is LoxClass:
+            initializer = callee.initializer
+            self._check_arity(expr, callee.arity(), args)
+            instance = LoxInstance(callee)
+            if initializer is not None:
+                yield self._call_function(expr, initializer, instance, args)
+            return instance
+
+        self._check_arity(expr, callee.arity(), args)
+        if isinstance(callee, LoxFunction):
+            if instance is None:
+                instance = callee.instance  # Still None, unless it's a bound method.
+            return (yield self._call_function(expr, callee, instance, args))
+
+        # Native functions don't call back into Lox, so can just be called.
+        state = CallState()
+        self._call_stack.append(state)
+        callee.call(self, args)
+        self._call_stack.pop()
+        return state.return_value
+
+    def _call_function(self, expr: Call, function: LoxFunction, instance: Any,
+                       args: list) -> Step:
+        if len(self._call_stack) >= self.max_frames:
+            raise LoxRuntimeError("Stack overflow.", expr.paren)
+        state = CallState()
+        self._call_stack.append(state)
+        if instance is not None:
+            # As in LoxFunction.call_method, 'this' comes first.
+            args = [instance, *args]
+        environment = Environment(function.closure, args)
+        if function.declaration.cell_slots:
+            make_cells(environment, function.declaration.cell_slots)
+        yield self._statements(function.declaration.body, environment)
+        self._call_stack.pop()
+        if function.is_initializer:
+            return instance
+        return state.return_value
+
+    def _check_arity(self, expr: Call, arity: int, args: list):
+        if len(args) != arity:
+            raise LoxRuntimeError(
+                "Expected %d arguments but got %d." % (arity, len(args)), expr.paren)
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 import abc
 
@@ -7,6 +7,9 @@ from .expression import Expr, Variable
 
 
 class Stmt(abc.ABC):
+    # Whether it might call a function, as found by the StackInterpreter.
+    has_call: bool = False
+
     @abc.abstractmethod
     def accept(self, visitor: "StmtVisitor"):
         pass
@@ -17,7 +20,7 @@ class Print(Stmt):
     expression: Expr
 
     def accept(self, visitor: "StmtVisitor"):
-        visitor.visit_print_stmt(self)
+        return visitor.visit_print_stmt(self)
 
 
 @dataclass
@@ -25,24 +28,31 @@ class ExpressionStmt(Stmt):
     expression: Expr
 
     def accept(self, visitor: "StmtVisitor"):
-        visitor.visit_expression_stmt(self)
+        return visitor.visit_expression_stmt(self)
 
 
 @dataclass
 class Block(Stmt):
     statements: list[Stmt]
+    # The closing '}', for error messages. Not part of its identity.
+    closing_brace: Optional[Token] = field(default=None, compare=False, repr=False)
+    # Set by the resolver: False if it declares no variables, so it can run in
+    # the enclosing scope instead of making one of its own.
+    needs_scope: bool = field(default=True, compare=False, repr=False)
 
     def accept(self, visitor: "StmtVisitor"):
-        visitor.visit_block_stmt(self)
+        return visitor.visit_block_stmt(self)
 
 
 @dataclass
 class Var(Stmt):
     name: Token
     initializer: Optional[Expr]
+    # Set by the resolver if a closure captures it, so it's kept in a Cell.
+    captured: bool = field(default=False, compare=False, repr=False)
 
     def accept(self, visitor: "StmtVisitor"):
-        visitor.visit_var_stmt(self)
+        return visitor.visit_var_stmt(self)
 
 
 @dataclass
@@ -52,7 +62,7 @@ class If(Stmt):
     else_branch: Optional[Stmt]
 
     def accept(self, visitor: "StmtVisitor"):
-        visitor.visit_if_stmt(self)
+        return visitor.visit_if_stmt(self)
 
 
 @dataclass
@@ -61,7 +71,25 @@ class While(Stmt):
     statement: Stmt
 
     def accept(self, visitor: "StmtVisitor"):
-        visitor.visit_while_stmt(self)
+        return visitor.visit_while_stmt(self)
+
+
+@dataclass
+class For(Stmt):
+    """
+    A `for` loop, kept as one node rather than desugared into blocks and a while,
+    so its scope is made once per loop rather than once per iteration.
+    """
+    initializer: Optional[Stmt]
+    condition: Optional[Expr]
+    increment: Optional[Expr]
+    body: Stmt
+    # Set by the resolver: True if the body is a block with its own scope, but no
+    # closure can capture its variables, so one scope can be reused every iteration.
+    reuse_body_scope: bool = field(default=False, compare=False, repr=False)
+
+    def accept(self, visitor: "StmtVisitor"):
+        return visitor.visit_for_stmt(self)
 
 
 @dataclass
@@ -69,9 +97,17 @@ class Function(Stmt):
     name: Token
     parameters: list[Token]
     body: list[Stmt]
+    # Set by the resolver: whether a closure captures the function's name, the
+    # (depth, slot) where it's declared of each Cell its own closure needs, and
+    # the slots of its parameters (or `this`) that closures capture.
+    captured: bool = field(default=False, compare=False, repr=False)
+    free: list[tuple[int, int]] = field(default_factory=list, compare=False, repr=False)
+    cell_slots: tuple[int, ...] = field(default=(), compare=False, repr=False)
+    # Set by the Inliner: the expression calls can evaluate instead, if any.
+    inline_body: Optional[Expr] = field(default=None, compare=False, repr=False)
 
     def accept(self, visitor: "StmtVisitor"):
-        visitor.visit_function_statement(self)
+        return visitor.visit_function_statement(self)
 
 
 @dataclass
@@ -80,7 +116,7 @@ class Return(Stmt):
     value: Optional[Expr]
 
     def accept(self, visitor: "StmtVisitor"):
-        visitor.visit_return_stmt(self)
+        return visitor.visit_return_stmt(self)
 
 
 @dataclass
@@ -89,9 +125,11 @@ class ClassStmt(Stmt):
     methods: list[Function]
     # Superclass is expressed as a single name, but we access it as a variable.
     superclass: Optional[Variable]
+    # Set by the resolver if a closure captures it, so it's kept in a Cell.
+    captured: bool = field(default=False, compare=False, repr=False)
 
     def accept(self, visitor: "StmtVisitor"):
-        visitor.visit_class_stmt(self)
+        return visitor.visit_class_stmt(self)
 
 
 class StmtVisitor(abc.ABC):
@@ -122,6 +160,10 @@ class StmtVisitor(abc.ABC):
     def visit_while_stmt(self, stmt: While):
         pass
 
+    @abc.abstractmethod
+    def visit_for_stmt(self, stmt: For):
+        pass
+
     @abc.abstractmethod
     def visit_function_statement(self, stmt: Function):
         pass
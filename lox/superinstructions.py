@@ -0,0 +1,327 @@
+"""
+Superinstructions for the tree-walking Interpreter: a pass, run just before
+the resolved program is interpreted, that fuses a few common shapes of
+expression into single nodes that the interpreter runs in one step.
+
+- `x = x + 1` or `x = x - c`, for a number constant: IncrementVariable.
+- `x < 10`, `n - 1`, `i * 2`, ...: a variable, an arithmetic or comparison
+  operator, and a number constant: VariableOpConstant.
+- `x.f = x.f + 1`, where `x` is a variable or `this`: IncrementField.
+
+`i = i + 1` is otherwise five visits (Assign, Binary, Variable, Literal, then
+the assignment itself), and `this.count = this.count + 1` six.
+
+Only variables that are globals, or locals of the scope the expression is in
+or the one around it that aren't in a Cell, are fused, since those can be found
+without walking environments. Each fused node keeps the original expression,
+and when its operand isn't a number (or an instance, or has the field), runs
+that instead, so errors and anything unusual are exactly as before.
+
+The fused nodes are only for the Interpreter's own visitors: other visitors
+(the Resolver, Optimizer, compilers, ...) never see them, since they run first.
+"""
+import operator
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from .expression import (
+    Assign,
+    Binary,
+    Call,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from .statement import (
+    Block,
+    ClassStmt,
+    ExpressionStmt,
+    For,
+    Function,
+    If,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+from .tokentype import TokenType
+
+# Operators that can be fused with a number constant, given that the other
+# operand is a number too.
+OPERATIONS: dict[TokenType, Callable[[float, float], Any]] = {
+    TokenType.PLUS: operator.add,
+    TokenType.MINUS: operator.sub,
+    TokenType.STAR: operator.mul,
+    TokenType.SLASH: operator.truediv,  # Only by constants that aren't zero.
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.EQUAL_EQUAL: operator.eq,
+    TokenType.BANG_EQUAL: operator.ne,
+}
+
+
+@dataclass
+class VariableOpConstant(Expr):
+    """
+    `x < 10`, `n - 1` and so on.
+    """
+    original: Binary
+    operation: Callable[[float, float], Any]
+    constant: float
+    # Where the variable is: its depth, 0 or 1, or None for a global; and slot.
+    depth: Optional[int]
+    slot: int
+
+    def accept(self, visitor):
+        return visitor.visit_variable_op_constant_expr(self)
+
+
+@dataclass
+class IncrementVariable(Expr):
+    """
+    `x = x + 1`, or `x = x - c`, as adding -c.
+    """
+    original: Assign
+    amount: float
+    depth: Optional[int]
+    slot: int
+
+    def accept(self, visitor):
+        return visitor.visit_increment_variable_expr(self)
+
+
+@dataclass
+class IncrementField(Expr):
+    """
+    `x.f = x.f + 1`, or `x.f = x.f - c`, where `x` is a variable or `this`.
+    """
+    original: Set
+    amount: float
+    # The `x.f` being read, whose FieldCache says where instances keep `f`.
+    get: Get
+
+    def accept(self, visitor):
+        return visitor.visit_increment_field_expr(self)
+
+
+PATTERNS = {
+    IncrementVariable: "x = x + c",
+    VariableOpConstant: "x op c",
+    IncrementField: "x.f = x.f + c",
+}
+
+
+class Fuser(ExprVisitor, StmtVisitor):
+    """
+    Replaces the expressions it can fuse, in place, and counts them.
+    """
+
+    def __init__(self):
+        # Sites fused, by pattern.
+        self.fused: Counter[str] = Counter()
+
+    def fuse(self, statements: list[Stmt]):
+        for statement in statements:
+            statement.accept(self)
+
+    def report(self) -> str:
+        lines = ["%-20s %10s" % ("pattern", "sites")]
+        for pattern in PATTERNS.values():
+            lines.append("%-20s %10d" % (pattern, self.fused[pattern]))
+        return "\n".join(lines)
+
+    def _expr(self, expr: Expr) -> Expr:
+        return expr.accept(self)
+
+    def _fused(self, expr: Expr) -> Expr:
+        self.fused[PATTERNS[type(expr)]] += 1
+        return expr
+
+    ######################################################################
+    # Statements: their expressions are replaced in place.
+
+    def visit_print_stmt(self, stmt: Print):
+        stmt.expression = self._expr(stmt.expression)
+
+    def visit_expression_stmt(self, stmt: ExpressionStmt):
+        stmt.expression = self._expr(stmt.expression)
+
+    def visit_var_stmt(self, stmt: Var):
+        if stmt.initializer is not None:
+            stmt.initializer = self._expr(stmt.initializer)
+
+    def visit_block_stmt(self, stmt: Block):
+        self.fuse(stmt.statements)
+
+    def visit_if_stmt(self, stmt: If):
+        stmt.condition = self._expr(stmt.condition)
+        stmt.then_branch.accept(self)
+        if stmt.else_branch is not None:
+            stmt.else_branch.accept(self)
+
+    def visit_while_stmt(self, stmt: While):
+        stmt.condition = self._expr(stmt.condition)
+        stmt.statement.accept(self)
+
+    def visit_for_stmt(self, stmt: For):
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+        if stmt.condition is not None:
+            stmt.condition = self._expr(stmt.condition)
+        if stmt.increment is not None:
+            stmt.increment = self._expr(stmt.increment)
+        stmt.body.accept(self)
+
+    def visit_function_statement(self, stmt: Function):
+        self.fuse(stmt.body)
+
+    def visit_return_stmt(self, stmt: Return):
+        if stmt.value is not None:
+            stmt.value = self._expr(stmt.value)
+
+    def visit_class_stmt(self, stmt: ClassStmt):
+        for method in stmt.methods:
+            method.accept(self)
+
+    ######################################################################
+    # Expressions: each returns the expression to replace it.
+
+    def visit_binary_expr(self, expr: Binary) -> Expr:
+        operation = OPERATIONS.get(expr.operator.tokentype)
+        constant = _number(expr.right)
+        where = _where(expr.left) if isinstance(expr.left, Variable) else None
+        if (operation is not None and constant is not None and where is not None
+                and not (operation is operator.truediv and constant == 0)):
+            return self._fused(VariableOpConstant(expr, operation, constant, *where))
+        expr.left = self._expr(expr.left)
+        expr.right = self._expr(expr.right)
+        return expr
+
+    def visit_assign_expr(self, expr: Assign) -> Expr:
+        value = expr.value
+        if isinstance(value, Binary) and isinstance(value.left, Variable):
+            amount = _increment(value)
+            where = _where(value.left)
+            if (amount is not None and where is not None
+                    and value.left.name.lexeme == expr.name.lexeme
+                    and where == _where(expr)):
+                return self._fused(IncrementVariable(expr, amount, *where))
+        expr.value = self._expr(expr.value)
+        return expr
+
+    def visit_set_expr(self, expr: Set) -> Expr:
+        value = expr.value
+        if isinstance(value, Binary) and isinstance(value.left, Get):
+            amount = _increment(value)
+            get = value.left
+            if (amount is not None and get.name.lexeme == expr.name.lexeme
+                    and _same_object(expr.object_, get.object_)):
+                return self._fused(IncrementField(expr, amount, get))
+        expr.object_ = self._expr(expr.object_)
+        expr.value = self._expr(expr.value)
+        return expr
+
+    def visit_grouping_expr(self, expr: Grouping) -> Expr:
+        expr.expression = self._expr(expr.expression)
+        return expr
+
+    def visit_unary_expr(self, expr: Unary) -> Expr:
+        expr.right = self._expr(expr.right)
+        return expr
+
+    def visit_logical_expr(self, expr: Logical) -> Expr:
+        expr.left = self._expr(expr.left)
+        expr.right = self._expr(expr.right)
+        return expr
+
+    def visit_call_expr(self, expr: Call) -> Expr:
+        expr.callee = self._expr(expr.callee)
+        expr.arguments = [self._expr(argument) for argument in expr.arguments]
+        return expr
+
+    def visit_get_expr(self, expr: Get) -> Expr:
+        expr.object_ = self._expr(expr.object_)
+        return expr
+
+    def visit_literal_expr(self, expr: Literal) -> Expr:
+        return expr
+
+    def visit_variable_expr(self, expr: Variable) -> Expr:
+        return expr
+
+    def visit_this_expr(self, expr: This) -> Expr:
+        return expr
+
+    def visit_super_expr(self, expr: Super) -> Expr:
+        return expr
+
+    # Already fused, if a program's nodes are ever interpreted twice.
+
+    def visit_variable_op_constant_expr(self, expr: VariableOpConstant) -> Expr:
+        return expr
+
+    def visit_increment_variable_expr(self, expr: IncrementVariable) -> Expr:
+        return expr
+
+    def visit_increment_field_expr(self, expr: IncrementField) -> Expr:
+        return expr
+
+
+def _number(expr: Expr) -> Optional[float]:
+    if isinstance(expr, Literal) and type(expr.value) is float:
+        return expr.value
+    return None
+
+
+def _where(expr: Variable | Assign) -> Optional[tuple[Optional[int], int]]:
+    """
+    (depth, slot) of a variable that can be fused: (None, slot) for a global.
+    """
+    if expr.location is None:
+        if expr.global_slot is None:
+            return None
+        return None, expr.global_slot
+    depth, slot, is_cell = expr.location
+    if is_cell or depth > 1:
+        return None
+    return depth, slot
+
+
+def _increment(expr: Binary) -> Optional[float]:
+    """
+    How much `x + c` or `x - c` adds to x.
+    """
+    constant = _number(expr.right)
+    if constant is None:
+        return None
+    if expr.operator.tokentype == TokenType.PLUS:
+        return constant
+    if expr.operator.tokentype == TokenType.MINUS:
+        # x - c is x + -c for every x, even for zeros and NaN.
+        return -constant
+    return None
+
+
+def _same_object(a: Expr, b: Expr) -> bool:
+    """
+    Whether both are the same variable, or both `this`, so evaluate to the same object.
+    """
+    if isinstance(a, Variable) and isinstance(b, Variable):
+        return (a.name.lexeme == b.name.lexeme and a.location == b.location
+                and a.global_slot == b.global_slot)
+    if isinstance(a, This) and isinstance(b, This):
+        return a.location == b.location
+    return False
@@ -1,4 +1,6 @@
-from typing import Optional
+import mmap
+from array import array
+from typing import Any, Optional
 from .tokentype import TokenType
 
 
@@ -6,7 +8,9 @@ class Token:
 
     """Representing a typed unit of Lox source, along with metadata such as line number."""
 
-    def __init__(self, tokentype: TokenType, lexeme: str, literal: Optional[str], line: int = 0):
+    __slots__ = ("tokentype", "lexeme", "literal", "line")
+
+    def __init__(self, tokentype: TokenType, lexeme: str, literal: object, line: int = 0):
         """Literal will be None except for literal types such as strings, numbers."""
         self.tokentype = tokentype
         self.lexeme = lexeme
@@ -25,8 +29,74 @@ class Token:
     def __eq__(self, other):
         if not isinstance(other, Token):
             return False
-        return all([
-            self.tokentype == other.tokentype,
-            self.lexeme == other.lexeme,
-            self.literal == other.literal
-            ])  # Ignore line
+        return (self.tokentype == other.tokentype
+                and self.lexeme == other.lexeme
+                and self.literal == other.literal)  # Ignore line
+
+
+# TokenType for each code in TokenBuffer.types, and the other way round.
+TOKEN_TYPES = list(TokenType)
+TYPE_CODES = {tokentype: code for code, tokentype in enumerate(TOKEN_TYPES)}
+
+
+class TokenBuffer:
+    """
+    Tokens stored a column at a time in parallel arrays, instead of as an
+    object each: a small int per token for its type, start offset in the
+    source, length and line. Lexemes are sliced from the source only when
+    asked for, and the few literals are kept in a dict by token index.
+
+    Indexing it gives an ordinary Token, so it can stand in for the list of
+    Tokens given to the Parser.
+
+    The source can be UTF-8 bytes (or an mmap of them) rather than a str, in
+    which case starts and lengths are in bytes.
+    """
+
+    def __init__(self, source: str | bytes | mmap.mmap):
+        self.source = source
+        self.types = array('B')
+        self.starts = array('I')
+        self.lengths = array('I')
+        self.lines = array('I')
+        self.literals: dict[int, Any] = {}
+        # The parser asks for the same token (or the one before it) many
+        # times over, so remember the last two made.
+        self._index = self._previous_index = -1
+        self._token: Optional[Token] = None
+        self._previous_token: Optional[Token] = None
+
+    def append(self, tokentype: TokenType, start: int, length: int, line: int,
+               literal: Any = None):
+        if literal is not None:
+            self.literals[len(self.types)] = literal
+        self.types.append(TYPE_CODES[tokentype])
+        self.starts.append(start)
+        self.lengths.append(length)
+        self.lines.append(line)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> Token:
+        if index < 0:
+            index += len(self.types)
+        if index == self._index:
+            assert self._token is not None
+            return self._token
+        if index == self._previous_index:
+            assert self._previous_token is not None
+            return self._previous_token
+        start = self.starts[index]
+        lexeme = self.source[start:start + self.lengths[index]]
+        if not isinstance(lexeme, str):
+            lexeme = lexeme.decode()
+        token = Token(TOKEN_TYPES[self.types[index]], lexeme,
+                      self.literals.get(index), self.lines[index])
+        self._previous_index, self._previous_token = self._index, self._token
+        self._index, self._token = index, token
+        return token
+
+    def __iter__(self):
+        for index in range(len(self.types)):
+            yield self[index]
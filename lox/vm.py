@@ -0,0 +1,456 @@
+"""
+A stack-based bytecode VM, following clox:
+https://craftinginterpreters.com/a-virtual-machine.html
+
+Runs the FunctionProto produced by bytecode_compiler.Compiler.
+Values live on one explicit stack rather than in Environments, and Lox calls
+push a CallFrame instead of recursing in Python, so deep Lox recursion is
+limited by `max_frames` ("Stack overflow.") rather than by Python.
+"""
+from typing import Any, List, Optional
+
+from . import native_functions
+from .bytecode_compiler import Compiler
+from .chunk import FunctionProto, OpCode
+from .error import ErrorReporter, LoxRuntimeError
+from .interpreter import CallState, Interpreter, divide
+from .lox_callable import LoxCallable
+from .statement import Stmt
+
+FRAMES_MAX = 64  # Same as clox.
+
+# Plain ints are quicker to compare than IntEnum members in the dispatch loop.
+CONSTANT = OpCode.CONSTANT.value
+NIL = OpCode.NIL.value
+TRUE = OpCode.TRUE.value
+FALSE = OpCode.FALSE.value
+POP = OpCode.POP.value
+GET_LOCAL = OpCode.GET_LOCAL.value
+SET_LOCAL = OpCode.SET_LOCAL.value
+GET_GLOBAL = OpCode.GET_GLOBAL.value
+DEFINE_GLOBAL = OpCode.DEFINE_GLOBAL.value
+SET_GLOBAL = OpCode.SET_GLOBAL.value
+GET_UPVALUE = OpCode.GET_UPVALUE.value
+SET_UPVALUE = OpCode.SET_UPVALUE.value
+GET_PROPERTY = OpCode.GET_PROPERTY.value
+SET_PROPERTY = OpCode.SET_PROPERTY.value
+GET_SUPER = OpCode.GET_SUPER.value
+EQUAL = OpCode.EQUAL.value
+GREATER = OpCode.GREATER.value
+GREATER_EQUAL = OpCode.GREATER_EQUAL.value
+LESS = OpCode.LESS.value
+LESS_EQUAL = OpCode.LESS_EQUAL.value
+ADD = OpCode.ADD.value
+SUBTRACT = OpCode.SUBTRACT.value
+MULTIPLY = OpCode.MULTIPLY.value
+DIVIDE = OpCode.DIVIDE.value
+NOT = OpCode.NOT.value
+NEGATE = OpCode.NEGATE.value
+PRINT = OpCode.PRINT.value
+JUMP = OpCode.JUMP.value
+JUMP_IF_FALSE = OpCode.JUMP_IF_FALSE.value
+LOOP = OpCode.LOOP.value
+CALL = OpCode.CALL.value
+INVOKE = OpCode.INVOKE.value
+SUPER_INVOKE = OpCode.SUPER_INVOKE.value
+CLOSURE = OpCode.CLOSURE.value
+CLOSE_UPVALUE = OpCode.CLOSE_UPVALUE.value
+RETURN = OpCode.RETURN.value
+CLASS = OpCode.CLASS.value
+INHERIT = OpCode.INHERIT.value
+METHOD = OpCode.METHOD.value
+
+
+class Upvalue:
+    """
+    A captured variable. While open, it refers to a slot on the VM stack;
+    once closed, it owns the value in a one element list of its own.
+    Either way, the value is at `cells[index]`.
+    """
+    __slots__ = ("cells", "index")
+
+    def __init__(self, stack: list, index: int):
+        self.cells = stack
+        self.index = index
+
+    def close(self):
+        self.cells = [self.cells[self.index]]
+        self.index = 0
+
+
+class Closure:
+    __slots__ = ("function", "upvalues")
+
+    def __init__(self, function: FunctionProto, upvalues: List[Upvalue]):
+        self.function = function
+        self.upvalues = upvalues
+
+    def __str__(self):
+        return str(self.function)
+
+
+class VMClass:
+    __slots__ = ("name", "methods")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.methods: dict[str, Closure] = {}
+
+    def __str__(self):
+        return self.name
+
+
+class VMInstance:
+    __slots__ = ("klass", "fields")
+
+    def __init__(self, klass: VMClass):
+        self.klass = klass
+        self.fields: dict[str, Any] = {}
+
+    def __str__(self):
+        return self.klass.name + " instance"
+
+
+class BoundMethod:
+    __slots__ = ("receiver", "method")
+
+    def __init__(self, receiver: Any, method: Closure):
+        self.receiver = receiver
+        self.method = method
+
+    def __str__(self):
+        return str(self.method)
+
+
+class CallFrame:
+    __slots__ = ("closure", "ip", "base")
+
+    def __init__(self, closure: Closure, base: int):
+        self.closure = closure
+        self.ip = 0
+        # Stack index of slot zero: the callee itself, or the receiver for methods.
+        self.base = base
+
+
+class VM:
+    """
+    Engine for `lox.py --engine vm`.
+    """
+
+    def __init__(self, error_reporter: Optional[ErrorReporter] = None,
+                 max_frames: int = FRAMES_MAX):
+        self.error_reporter = error_reporter or ErrorReporter()
+        self.max_frames = max_frames
+        self.globals: dict[str, Any] = {"clock": native_functions.Clock()}
+        self.stack: list[Any] = []
+        self.frames: list[CallFrame] = []
+        # Open upvalues by stack index, so closures share captured variables.
+        self._open_upvalues: dict[int, Upvalue] = {}
+        # Native functions report their result here, as with the Interpreter.
+        self.innermost_call_state = CallState()
+
+    def resolve_global(self, expr, name: str):
+        # The Resolver still checks the program for us, but the compiler
+        # works out where variables live on its own.
+        pass
+
+    def interpret(self, statements: List[Stmt]):
+        function = Compiler(self.error_reporter).compile(statements)
+        if function is None:
+            return
+        closure = Closure(function, [])
+        self.stack = [closure]
+        self.frames = [CallFrame(closure, 0)]
+        self._open_upvalues = {}
+        try:
+            self._run()
+        except LoxRuntimeError as _error:
+            self.error_reporter.runtime_error(_error)
+        except RecursionError:
+            # Shouldn't happen, since Lox calls don't recurse in Python.
+            self.error_reporter.runtime_error(
+                LoxRuntimeError("Stack overflow.", None, self._current_line()))
+
+    def _current_line(self) -> int:
+        frame = self.frames[-1]
+        return frame.closure.function.chunk.lines[frame.ip - 1]
+
+    def _error(self, message: str) -> LoxRuntimeError:
+        return LoxRuntimeError(message, None, self._current_line())
+
+    def _run(self):
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        globals_ = self.globals
+        stringify = Interpreter.stringify
+
+        frame = self.frames[-1]
+        code = frame.closure.function.chunk.code
+        constants = frame.closure.function.chunk.constants
+        ip = frame.ip
+        base = frame.base
+
+        while True:
+            op = code[ip]
+            ip += 1
+
+            if op == GET_LOCAL:
+                push(stack[base + code[ip]])
+                ip += 1
+            elif op == CONSTANT:
+                push(constants[code[ip]])
+                ip += 1
+            elif op == GET_GLOBAL:
+                name = constants[code[ip]]
+                ip += 1
+                try:
+                    push(globals_[name])
+                except KeyError:
+                    frame.ip = ip
+                    raise self._error("Undefined variable '%s'." % name)
+            elif op == SET_LOCAL:
+                stack[base + code[ip]] = stack[-1]
+                ip += 1
+            elif op == POP:
+                pop()
+            elif op == JUMP_IF_FALSE:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip += (code[ip] << 8 | code[ip + 1]) + 2
+                else:
+                    ip += 2
+            elif op == JUMP:
+                ip += (code[ip] << 8 | code[ip + 1]) + 2
+            elif op == LOOP:
+                ip -= (code[ip] << 8 | code[ip + 1]) - 2
+            elif op == LESS or op == GREATER or op == LESS_EQUAL or op == GREATER_EQUAL \
+                    or op == SUBTRACT or op == MULTIPLY or op == DIVIDE:
+                right = pop()
+                left = pop()
+                if type(left) is not float or type(right) is not float:
+                    frame.ip = ip
+                    raise self._error("Operands must be numbers.")
+                if op == LESS:
+                    push(left < right)
+                elif op == GREATER:
+                    push(left > right)
+                elif op == SUBTRACT:
+                    push(left - right)
+                elif op == MULTIPLY:
+                    push(left * right)
+                elif op == LESS_EQUAL:
+                    push(left <= right)
+                elif op == GREATER_EQUAL:
+                    push(left >= right)
+                else:
+                    push(divide(left, right))
+            elif op == ADD:
+                right = pop()
+                left = pop()
+                kind = type(left)
+                if kind is not type(right) or (kind is not float and kind is not str):
+                    frame.ip = ip
+                    raise self._error("Operands must be two numbers or two strings.")
+                push(left + right)
+            elif op == EQUAL:
+                right = pop()
+                left = pop()
+                # Check the type so eg `true == 1` is false.
+                push(type(left) is type(right) and left == right)
+            elif op == SET_GLOBAL:
+                name = constants[code[ip]]
+                ip += 1
+                if name not in globals_:
+                    frame.ip = ip
+                    raise self._error("Undefined variable '%s'." % name)
+                globals_[name] = stack[-1]
+            elif op == GET_UPVALUE:
+                upvalue = frame.closure.upvalues[code[ip]]
+                ip += 1
+                push(upvalue.cells[upvalue.index])
+            elif op == SET_UPVALUE:
+                upvalue = frame.closure.upvalues[code[ip]]
+                ip += 1
+                upvalue.cells[upvalue.index] = stack[-1]
+            elif op == GET_PROPERTY:
+                instance = stack[-1]
+                name = constants[code[ip]]
+                ip += 1
+                if type(instance) is not VMInstance:
+                    frame.ip = ip
+                    raise self._error("Only instances have properties.")
+                fields = instance.fields
+                if name in fields:
+                    stack[-1] = fields[name]
+                else:
+                    method = instance.klass.methods.get(name)
+                    if method is None:
+                        frame.ip = ip
+                        raise self._error("Undefined property '%s'." % name)
+                    stack[-1] = BoundMethod(instance, method)
+            elif op == SET_PROPERTY:
+                instance = stack[-2]
+                if type(instance) is not VMInstance:
+                    frame.ip = ip + 1
+                    raise self._error("Only instances have fields.")
+                value = pop()
+                instance.fields[constants[code[ip]]] = value
+                ip += 1
+                stack[-1] = value
+            elif op == CALL or op == INVOKE or op == SUPER_INVOKE:
+                if op == CALL:
+                    argc = code[ip]
+                    ip += 1
+                    callee = stack[-1 - argc]
+                else:
+                    name = constants[code[ip]]
+                    argc = code[ip + 1]
+                    ip += 2
+                    if op == SUPER_INVOKE:
+                        superclass = pop()
+                        callee = superclass.methods.get(name)
+                        if callee is None:
+                            frame.ip = ip
+                            raise self._error("Undefined property '%s'." % name)
+                    else:
+                        receiver = stack[-1 - argc]
+                        if type(receiver) is not VMInstance:
+                            frame.ip = ip
+                            raise self._error("Only instances have properties.")
+                        if name in receiver.fields:
+                            callee = stack[-1 - argc] = receiver.fields[name]
+                        else:
+                            callee = receiver.klass.methods.get(name)
+                            if callee is None:
+                                frame.ip = ip
+                                raise self._error("Undefined property '%s'." % name)
+                frame.ip = ip
+
+                # Work out which closure to run, if any, with the receiver in slot 0.
+                if type(callee) is BoundMethod:
+                    stack[-1 - argc] = callee.receiver
+                    callee = callee.method
+                elif type(callee) is VMClass:
+                    stack[-1 - argc] = VMInstance(callee)
+                    initializer = callee.methods.get("init")
+                    if initializer is None:
+                        if argc != 0:
+                            raise self._error("Expected 0 arguments but got %d." % argc)
+                        continue
+                    callee = initializer
+                elif type(callee) is not Closure:
+                    if not isinstance(callee, LoxCallable):
+                        raise self._error("Can only call functions and classes.")
+                    if callee.arity() != argc:
+                        raise self._error(
+                            "Expected %d arguments but got %d." % (callee.arity(), argc))
+                    # Native functions report their result via a CallState.
+                    self.innermost_call_state = state = CallState()
+                    arguments = stack[len(stack) - argc:]
+                    callee.call(self, arguments)
+                    del stack[len(stack) - argc - 1:]
+                    push(state.return_value)
+                    continue
+
+                function = callee.function
+                if function.arity != argc:
+                    raise self._error(
+                        "Expected %d arguments but got %d." % (function.arity, argc))
+                if len(self.frames) == self.max_frames:
+                    raise self._error("Stack overflow.")
+                frame = CallFrame(callee, len(stack) - argc - 1)
+                self.frames.append(frame)
+                code = function.chunk.code
+                constants = function.chunk.constants
+                ip = 0
+                base = frame.base
+            elif op == RETURN:
+                result = pop()
+                self._close_upvalues(base)
+                self.frames.pop()
+                if not self.frames:
+                    pop()  # The script itself.
+                    return
+                del stack[base:]
+                push(result)
+                frame = self.frames[-1]
+                code = frame.closure.function.chunk.code
+                constants = frame.closure.function.chunk.constants
+                ip = frame.ip
+                base = frame.base
+            elif op == NIL:
+                push(None)
+            elif op == TRUE:
+                push(True)
+            elif op == FALSE:
+                push(False)
+            elif op == NOT:
+                value = stack[-1]
+                stack[-1] = value is None or value is False
+            elif op == NEGATE:
+                value = stack[-1]
+                if type(value) is not float:
+                    frame.ip = ip
+                    raise self._error("Operand must be a number.")
+                stack[-1] = -value
+            elif op == PRINT:
+                print(stringify(pop()))
+            elif op == DEFINE_GLOBAL:
+                globals_[constants[code[ip]]] = pop()
+                ip += 1
+            elif op == GET_SUPER:
+                name = constants[code[ip]]
+                ip += 1
+                superclass = pop()
+                method = superclass.methods.get(name)
+                if method is None:
+                    frame.ip = ip
+                    raise self._error("Undefined property '%s'." % name)
+                stack[-1] = BoundMethod(stack[-1], method)
+            elif op == CLOSURE:
+                function = constants[code[ip]]
+                ip += 1
+                upvalues = []
+                for _ in range(function.upvalue_count):
+                    is_local = code[ip]
+                    index = code[ip + 1]
+                    ip += 2
+                    if is_local:
+                        upvalues.append(self._capture_upvalue(base + index))
+                    else:
+                        upvalues.append(frame.closure.upvalues[index])
+                push(Closure(function, upvalues))
+            elif op == CLOSE_UPVALUE:
+                self._close_upvalues(len(stack) - 1)
+                pop()
+            elif op == CLASS:
+                push(VMClass(constants[code[ip]]))
+                ip += 1
+            elif op == INHERIT:
+                superclass = stack[-2]
+                if type(superclass) is not VMClass:
+                    frame.ip = ip
+                    raise self._error("Superclass must be a class.")
+                # Copy-down inheritance, as in clox: methods defined later override.
+                pop().methods.update(superclass.methods)
+            elif op == METHOD:
+                method = pop()
+                stack[-1].methods[constants[code[ip]]] = method
+                ip += 1
+            else:
+                frame.ip = ip
+                raise self._error("Unknown opcode %d." % op)
+
+    def _capture_upvalue(self, index: int) -> Upvalue:
+        upvalue = self._open_upvalues.get(index)
+        if upvalue is None:
+            upvalue = self._open_upvalues[index] = Upvalue(self.stack, index)
+        return upvalue
+
+    def _close_upvalues(self, last: int):
+        # Close every open upvalue pointing at or above stack index `last`.
+        if not self._open_upvalues:
+            return
+        for index in [i for i in self._open_upvalues if i >= last]:
+            self._open_upvalues.pop(index).close()
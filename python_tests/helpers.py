@@ -0,0 +1,51 @@
+"""
+What the engines' tests share: running a program on an engine, and checking
+that it prints the same as the tree-walking Interpreter.
+"""
+import contextlib
+import io
+from typing import Callable, NamedTuple
+
+from lox.interpreter import Interpreter
+from lox.parser import Parser
+from lox.resolver import Resolver
+from lox.scanner import Scanner
+from lox.statement import Stmt
+
+
+class Run(NamedTuple):
+    output: str
+    errors: str
+    statements: list[Stmt]
+
+
+def parse(code: str) -> list[Stmt]:
+    return Parser(Scanner(code).scan_tokens()).parse()
+
+
+def run_program(interpreter, code: str) -> Run:
+    """
+    Scan, parse, resolve and interpret the code, capturing what it prints.
+    """
+    statements = parse(code)
+    Resolver(interpreter, error_reporter=interpreter.error_reporter).resolve_stmts(statements)
+    stdout, stderr = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        interpreter.interpret(statements)
+    return Run(stdout.getvalue(), stderr.getvalue(), statements)
+
+
+class SameOutputTests:
+    """
+    Mixin for an engine's TestCase: its `engine` should print `expected_output`
+    for `program`, just like the tree-walking Interpreter does.
+    """
+    engine: Callable
+    program: str
+    expected_output: str
+
+    def test_same_output_as_interpreter(self):
+        expected = run_program(Interpreter(use_resolver=True), self.program).output
+        self.assertEqual(self.expected_output, expected)
+        actual = run_program(self.engine(), self.program).output
+        self.assertEqual(expected, actual)
@@ -0,0 +1,80 @@
+import contextlib
+import io
+import os
+import tempfile
+import time
+import unittest
+
+from lox.cache import ProgramCache, ResolvedProgram
+from lox.interpreter import Interpreter
+from lox.parser import Parser
+from lox.resolver import Resolver
+from lox.scanner import Scanner
+
+
+SOURCE = """
+fun add(a, b) { var sum = a + b; return sum; }
+{ var x = 40; print add(x, 2); }
+"""
+
+
+def resolve(source):
+    statements = Parser(Scanner(source).scan_tokens()).parse()
+    program = ResolvedProgram(statements)
+    Resolver(program, error_reporter=Interpreter().error_reporter).resolve_stmts(statements)
+    return program
+
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self._tempdir = tempfile.TemporaryDirectory()
+        self.directory = self._tempdir.name
+
+    def tearDown(self):
+        self._tempdir.cleanup()
+
+    def test_round_trip(self):
+        cache = ProgramCache(self.directory)
+        self.assertIsNone(cache.load(SOURCE))
+        cache.store(SOURCE, resolve(SOURCE))
+
+        program = cache.load(SOURCE)
+        self.assertIsNotNone(program)
+        interpreter = Interpreter(use_resolver=True)
+        program.replay(interpreter)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            interpreter.interpret(program.statements)
+        self.assertEqual("42\n", output.getvalue())
+
+    def test_changed_source_misses(self):
+        cache = ProgramCache(self.directory)
+        cache.store(SOURCE, resolve(SOURCE))
+        self.assertIsNone(cache.load(SOURCE + "\n"))
+
+    def test_corrupt_entry_is_discarded(self):
+        cache = ProgramCache(self.directory)
+        cache.store(SOURCE, resolve(SOURCE))
+        path = cache.path_for(SOURCE)
+        with open(path, "wb") as f:
+            f.write(b"not a pickle")
+        self.assertIsNone(cache.load(SOURCE))
+        self.assertFalse(os.path.exists(path))
+
+    def test_evicts_least_recently_used(self):
+        sources = ["print %d;" % i for i in range(3)]
+        cache = ProgramCache(self.directory)
+        for age, source in enumerate(sources):
+            cache.store(source, resolve(source))
+            # mtimes can be coarse, so spread them out explicitly.
+            then = time.time() - 100 + age
+            os.utime(cache.path_for(source), (then, then))
+        cache.load(sources[0])  # Now the most recently used.
+
+        size = os.path.getsize(cache.path_for(sources[0]))
+        cache.max_bytes = 2 * size
+        cache.evict()
+        self.assertIsNotNone(cache.load(sources[0]))
+        self.assertIsNone(cache.load(sources[1]))
+        self.assertIsNotNone(cache.load(sources[2]))
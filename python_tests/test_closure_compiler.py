@@ -0,0 +1,53 @@
+import unittest
+from unittest import mock
+
+from lox.closure_compiler import ClosureInterpreter
+from lox.function import LoxFunction
+from lox.interpreter import Interpreter
+
+from .helpers import SameOutputTests, run_program
+
+
+PROGRAM = """
+fun fib(n) {
+  if (n < 2) return n;
+  return fib(n - 2) + fib(n - 1);
+}
+class Counter {
+  init() { this.count = 0; }
+  add(n) { this.count = this.count + n; return this; }
+}
+var c = Counter();
+for (var i = 0; i < 5; i = i + 1) c.add(i);
+print fib(10);
+print c.count;
+print "a" + "b" == "ab";
+print !nil and 1 != 2;
+"""
+
+
+class Tests(SameOutputTests, unittest.TestCase):
+    engine = ClosureInterpreter
+    program = PROGRAM
+    expected_output = "55\n10\ntrue\ntrue\n"
+
+    def test_runtime_error(self):
+        interpreter = ClosureInterpreter()
+        errors = run_program(interpreter, 'var a = 1;\nprint a < "x";').errors
+        self.assertTrue(interpreter.error_reporter.had_runtime_error)
+        self.assertEqual("Operands must be numbers.\n[line 2]\n", errors)
+
+    def test_method_calls_dont_bind(self):
+        code = """
+        class A { init(n) { this.n = n; } get() { return this.n; } }
+        class B < A { get() { return super.get() + 1; } }
+        print B(1).get();
+        var get = B(2).get;
+        print get();
+        """
+        for interpreter in [Interpreter(use_resolver=True), ClosureInterpreter()]:
+            with mock.patch.object(LoxFunction, "bind", side_effect=LoxFunction.bind,
+                                   autospec=True) as bind:
+                self.assertEqual("2\n3\n", run_program(interpreter, code).output)
+            # Only `var get = B(2).get` needs a bound method.
+            self.assertEqual(1, bind.call_count)
@@ -0,0 +1,59 @@
+import unittest
+
+from lox.inline_cache import MAX_ENTRIES, InlineCache
+from lox.interpreter import Interpreter
+
+from .helpers import run_program
+
+
+class FakeClass:
+
+    def __init__(self, methods):
+        self.methods = methods
+        self.lookups = 0
+
+    def find_method(self, name):
+        self.lookups += 1
+        return self.methods.get(name)
+
+
+class Tests(unittest.TestCase):
+
+    def test_remembers_lookups_per_class(self):
+        cache = InlineCache()
+        a, b = FakeClass({"m": "a.m"}), FakeClass({})
+        for _ in range(3):
+            self.assertEqual("a.m", cache.find_method(a, "m"))
+            self.assertIsNone(cache.find_method(b, "m"))
+        self.assertEqual((1, 1), (a.lookups, b.lookups))
+
+    def test_megamorphic_stops_caching(self):
+        cache = InlineCache()
+        classes = [FakeClass({"m": i}) for i in range(MAX_ENTRIES + 1)]
+        for klass in classes:
+            cache.find_method(klass, "m")
+        self.assertTrue(cache.megamorphic)
+        self.assertEqual(MAX_ENTRIES, cache.find_method(classes[-1], "m"))
+        self.assertEqual(2, classes[-1].lookups)
+
+    def test_field_shadows_cached_method(self):
+        output = run_program(Interpreter(use_resolver=True), """
+class A { m() { return "method"; } }
+fun get(o) { return o.m; }
+var a = A();
+print get(a);
+a.m = "field";
+print get(a);
+print get(A());
+""").output
+        self.assertEqual("<fn m>\nfield\n<fn m>\n", output)
+
+    def test_polymorphic_site(self):
+        output = run_program(Interpreter(use_resolver=True), """
+class A { name() { return "A"; } }
+class B < A {}
+class C < A { name() { return "C"; } }
+fun show(o) { print o.name(); }
+show(A()); show(B()); show(C()); show(B());
+""").output
+        self.assertEqual("A\nA\nC\nA\n", output)
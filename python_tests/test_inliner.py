@@ -0,0 +1,75 @@
+import unittest
+
+from lox.inliner import Argument
+from lox.interpreter import Interpreter
+
+from .helpers import run_program
+
+
+class Tests(unittest.TestCase):
+
+    def test_inlines_small_functions(self):
+        interpreter = Interpreter(use_resolver=True)
+        statements = run_program(interpreter, """
+class A {
+  init(x) { this.x = x; }
+  get() { return this.x; }
+  scale(n) { return this.x * n + 1; }
+}
+fun square(n) { return n * n; }
+var offset = 1;
+fun shift(n) { return n + offset; }
+""").statements
+        init, get, scale = statements[0].methods
+        self.assertIsNone(init.inline_body)
+        self.assertEqual(Argument, type(get.inline_body.object_))
+        self.assertEqual(0, get.inline_body.object_.index)
+        # `this` is slot 0 of a method, so its params come after it.
+        self.assertEqual(1, scale.inline_body.left.right.index)
+        self.assertEqual(0, statements[1].inline_body.left.index)
+        self.assertIsNotNone(statements[3].inline_body)
+        self.assertEqual(4, interpreter.inliner.inlined)
+
+    def test_leaves_other_functions(self):
+        interpreter = Interpreter(use_resolver=True)
+        statements = run_program(interpreter, """
+fun fib(n) { return fib(n - 1) + fib(n - 2); }
+fun twice(n) { print n; return n; }
+fun set(o) { return o.x = 1; }
+fun big(n) { return n + n + n + n + n + n; }
+fun outer(a) {
+  fun inner() { return a; }
+  return inner;
+}
+fun nothing() { return; }
+""").statements
+        for function in statements:
+            self.assertIsNone(function.inline_body, function.name.lexeme)
+        self.assertEqual(0, interpreter.inliner.inlined)
+
+    def test_same_results_as_calls(self):
+        code = """
+class A {
+  init(x) { this.x = x; }
+  get() { return this.x; }
+  plus(n) { return this.x + n; }
+}
+class B < A { get() { return -this.x; } }
+fun square(n) { return n * n; }
+var a = A(3);
+var b = B(4);
+print a.get(); print b.get(); print a.plus(2); print b.plus(1);
+print square(7);
+var get = b.get;
+print get();
+a.get = square;
+print a.get(5);
+print a.plus("x");
+"""
+        inlined = run_program(Interpreter(use_resolver=True), code)
+        interpreter = Interpreter(use_resolver=True)
+        interpreter.inliner = None
+        called = run_program(interpreter, code)
+        self.assertEqual("3\n-4\n5\n5\n49\n-4\n25\n", inlined.output)
+        self.assertEqual(called[:2], inlined[:2])
+        self.assertIn("Operands must be two numbers or two strings.\n[line 5]", inlined.errors)
@@ -67,3 +67,63 @@ class Tests(unittest.TestCase):
         interpreter = Interpreter()
         for stmt in stmts:
             interpreter.execute(stmt)
+
+    def test_closures_keep_only_what_they_capture(self):
+        from lox.closure_compiler import ClosureInterpreter
+        from lox.environment import Cell
+        from lox.resolver import Resolver
+        code = """
+        var f;
+        {
+          var big = "lots of data";
+          var count = 0;
+          fun increment() { count = count + 1; return count; }
+          increment();
+          f = increment;
+        }
+        """
+        for interpreter in (Interpreter(use_resolver=True), ClosureInterpreter()):
+            stmts = self.get_statements(code)
+            Resolver(interpreter, error_reporter=interpreter.error_reporter).resolve_stmts(stmts)
+            interpreter.interpret(stmts)
+            closure = interpreter.globals.get(stmts[0].name).closure
+            self.assertIsNone(closure.enclosing)
+            [cell] = closure.slots
+            self.assertIsInstance(cell, Cell)
+            self.assertEqual(1.0, cell.value)
+
+    def test_classes_copy_down_inherited_methods(self):
+        from lox.resolver import Resolver
+        code = """
+        class A { init(x) { this.x = x; } m() { return "A.m"; } n() { return "A.n"; } }
+        class B < A { n() { return "B.n"; } }
+        class C < B {}
+        """
+        interpreter = Interpreter(use_resolver=True)
+        stmts = self.get_statements(code)
+        Resolver(interpreter, error_reporter=interpreter.error_reporter).resolve_stmts(stmts)
+        interpreter.interpret(stmts)
+        a, b, c = (interpreter.globals.get(stmt.name) for stmt in stmts)
+        self.assertEqual({"init", "m", "n"}, set(c.methods))
+        self.assertIs(a.methods["m"], c.find_method("m"))
+        self.assertIs(b.methods["n"], c.find_method("n"))
+        self.assertIs(a.methods["init"], c.initializer)
+        self.assertEqual(1, c.arity())
+        self.assertIsNone(c.find_method("missing"))
+
+    def test_methods_without_resolver(self):
+        import contextlib
+        import io
+        code = """
+        class A { init(x) { this.x = x; } add(n) { return this.x + n; } }
+        var a = A(1);
+        print a.add(2);
+        var add = a.add;
+        print add(3);
+        """
+        interpreter = Interpreter(use_resolver=False)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            interpreter.interpret(self.get_statements(code))
+        self.assertFalse(interpreter.error_reporter.had_runtime_error)
+        self.assertEqual("3\n4\n", output.getvalue())
@@ -0,0 +1,71 @@
+import unittest
+
+from lox.closure_compiler import ClosureInterpreter
+from lox.interpreter import Interpreter
+from lox.memo import Memo, find_pure_functions
+
+from .helpers import parse, run_program
+
+
+def pure_names(code):
+    return sorted(function.name.lexeme for function in find_pure_functions(parse(code)))
+
+
+FIB = """
+fun fib(n) {
+  if (n < 2) return n;
+  return fib(n - 2) + fib(n - 1);
+}
+print fib(20);
+print fib(-0) == 0;
+"""
+
+
+class Tests(unittest.TestCase):
+
+    def test_purity(self):
+        code = """
+var total = 0;
+fun square(x) { var y = x * x; return y; }
+fun sum_squares(a, b) { return square(a) + square(b); }
+fun loud(x) { print x; return x; }
+fun calls_loud(x) { return loud(x); }
+fun adds(x) { total = total + x; return total; }
+fun reads_global(x) { return total + x; }
+fun timed() { return clock(); }
+fun apply(f, x) { return f(x); }
+fun counter() { var n = 0; fun inc() { n = n + 1; return n; } return inc; }
+fun field(obj) { return obj.x; }
+"""
+        self.assertEqual(["square", "sum_squares"], pure_names(code))
+
+    def test_reassigned_function_is_not_pure_to_call(self):
+        code = """
+fun one() { return 1; }
+fun calls_one() { return one(); }
+one = nil;
+"""
+        self.assertEqual(["one"], pure_names(code))
+
+    def test_same_output_as_without_memo(self):
+        for engine in (lambda: Interpreter(use_resolver=True), ClosureInterpreter):
+            expected = run_program(engine(), FIB).output
+            self.assertEqual("6765\ntrue\n", expected)
+            interpreter = engine()
+            interpreter.memo = memo = Memo()
+            self.assertEqual(expected, run_program(interpreter, FIB).output)
+            # Including fib(-0), which can't share fib(0)'s entry.
+            self.assertEqual(22, memo.misses["fib"])
+            self.assertEqual(18, memo.hits["fib"])
+
+    def test_least_recently_used_are_evicted(self):
+        interpreter = Interpreter(use_resolver=True)
+        interpreter.memo = memo = Memo(max_entries=2)
+        code = """
+fun double(x) { return x * 2; }
+print double(1) + double(2) + double(1) + double(3) + double(2);
+"""
+        self.assertEqual("18\n", run_program(interpreter, code).output)
+        self.assertEqual((1, 4, 2), (memo.hits["double"], memo.misses["double"],
+                                     memo.evictions))
+        self.assertEqual([(3.0,), (2.0,)], [key[2::2] for key in memo.entries])
@@ -0,0 +1,93 @@
+import contextlib
+import glob
+import io
+import os
+import unittest
+
+from lox.error import ErrorReporter
+from lox.expression import Literal
+from lox.interpreter import Interpreter
+from lox.optimizer import Optimizer
+from lox.parser import Parser
+from lox.resolver import Resolver
+from lox.scanner import Scanner
+from lox.statement import Print
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test")
+
+
+def optimize(code, level=2):
+    return Optimizer(level).optimize(Parser(Scanner(code).scan_tokens()).parse())
+
+
+def run(code, level):
+    """
+    Run the code like lox.py does with -O level, returning stdout and stderr.
+    """
+    stdout, stderr = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        error_reporter = ErrorReporter()
+        statements = Parser(Scanner(code, error_reporter=error_reporter).scan_tokens(),
+                            error_reporter=error_reporter).parse()
+        interpreter = Interpreter(error_reporter=error_reporter, use_resolver=True)
+        if not error_reporter.had_error:
+            Resolver(interpreter, error_reporter=error_reporter).resolve_stmts(statements)
+        if not error_reporter.had_error:
+            interpreter.interpret(Optimizer(level).optimize(statements))
+    return stdout.getvalue(), stderr.getvalue()
+
+
+class Tests(unittest.TestCase):
+
+    def assertFolds(self, code, value):
+        [statement] = optimize("print %s;" % code)
+        self.assertIsInstance(statement.expression, Literal, code)
+        self.assertEqual(repr(statement.expression.value), repr(value), code)
+
+    def assertDoesNotFold(self, code):
+        [statement] = optimize("print %s;" % code)
+        self.assertNotIsInstance(statement.expression, Literal, code)
+
+    def test_folds_constants(self):
+        self.assertFolds("1 + 2 * 3", 7.0)
+        self.assertFolds("(1 + 2) * 3", 9.0)
+        self.assertFolds("!true", False)
+        self.assertFolds("!nil", True)
+        self.assertFolds('"a" + "b"', "ab")
+        self.assertFolds("-0", -0.0)
+        self.assertFolds("1 / 0", float("inf"))
+        self.assertFolds('1 == "1"', False)
+        self.assertFolds("nil or 2", 2.0)
+        self.assertFolds("1 and 2", 2.0)
+        self.assertFolds("false and x", False)
+
+    def test_leaves_runtime_errors(self):
+        self.assertDoesNotFold('-"a"')
+        self.assertDoesNotFold('1 + "a"')
+        self.assertDoesNotFold("nil < 1")
+        self.assertDoesNotFold("x + 0")
+
+    def test_level_one_keeps_dead_code(self):
+        self.assertEqual(len(optimize("if (false) print 1; while (false) {}", level=1)), 2)
+        self.assertEqual(len(optimize("if (false) print 1;", level=0)), 1)
+
+    def test_removes_dead_code(self):
+        [statement] = optimize('if (1 == 1) print "yes"; else print "no"; while (nil) {}')
+        self.assertIsInstance(statement, Print)
+        self.assertEqual(statement.expression.value, "yes")
+        self.assertEqual(optimize("if (false) print 1;"), [])
+
+        [function] = optimize("""
+        fun f(x) {
+          if (x) { return 1; } else return 2;
+          print "unreachable";
+        }""")
+        self.assertEqual(len(function.body), 1)
+
+    def test_same_output_on_test_suite(self):
+        for path in sorted(glob.glob(os.path.join(TEST_DIR, "**", "*.lox"), recursive=True)):
+            if os.sep + "benchmark" + os.sep in path or os.sep + "limit" + os.sep in path:
+                continue
+            with open(path) as f:
+                code = f.read()
+            self.assertEqual(run(code, 0), run(code, 2), path)
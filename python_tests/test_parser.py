@@ -1,8 +1,9 @@
 import unittest
 from lox.parser import Parser, ParseError
 from lox.tokentype import TokenType
-from lox.scanner import Token
+from lox.scanner import RegexScanner, Token
 from lox.expression import Literal
+from lox.statement import ExpressionStmt, Print, Var
 
 class Tests(unittest.TestCase):
 
@@ -51,3 +52,20 @@ class Tests(unittest.TestCase):
         consumed = parser.consume(TokenType.VAR, "okay")
         self.assertEqual(consumed, tokens[0])
         self.assertEqual(parser.current, 1)
+
+    def test_declarations_read_tokens_lazily(self):
+        read = []
+
+        def lines():
+            for line in ['var a = 1;\n', 'print "two\n', 'lines";\n', 'a = 3;']:
+                read.append(line)
+                yield line
+
+        scanner = RegexScanner("")
+        declarations = Parser(scanner.iter_tokens(lines())).declarations()
+        self.assertIsInstance(next(declarations), Var)
+        self.assertEqual(['var a = 1;\n'], read)
+        statements = list(declarations)
+        self.assertEqual([Print, ExpressionStmt], [type(s) for s in statements])
+        self.assertEqual("two\nlines", statements[0].expression.value)
+        self.assertEqual(4, scanner.line)
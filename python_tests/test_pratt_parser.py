@@ -0,0 +1,35 @@
+import glob
+import os
+import unittest
+from unittest import mock
+
+from lox.parser import Parser
+from lox.pratt_parser import PrattParser
+from lox.scanner import Scanner
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test")
+
+
+def parse(parser_class, source):
+    error_reporter = mock.Mock()
+    tokens = Scanner(source, error_reporter=mock.Mock()).scan_tokens()
+    statements = parser_class(tokens, error_reporter=error_reporter).parse()
+    # repr, since eg Literal(1.0) == Literal(True).
+    return repr(statements), error_reporter.token_error.call_args_list
+
+
+class Tests(unittest.TestCase):
+
+    def test_same_as_parser(self):
+        sources = [
+            "a = b = c.d = 1 + 2 * -3 - !f(x, y)(z).w / (4 - 5);",
+            "print a or b and c == d != e < f <= g > h >= i;",
+            "a + b = c; -a = b; a.b.c = d or e; super.x(1).y = 2;",
+            "f(1, 2; print (1; 1 +; a.; super; super.; this.x = nil; !;",
+            "print f(%s);" % ", ".join(["x"] * 256),
+        ]
+        for path in sorted(glob.glob(os.path.join(TEST_DIR, "**", "*.lox"), recursive=True)):
+            with open(path) as f:
+                sources.append(f.read())
+        for source in sources:
+            self.assertEqual(parse(Parser, source), parse(PrattParser, source), source)
@@ -0,0 +1,49 @@
+import unittest
+
+from lox.python_compiler import PythonInterpreter
+
+from .helpers import SameOutputTests, run_program
+
+
+PROGRAM = """
+var callbacks = nil;
+for (var i = 0; i < 3; i = i + 1) {
+  var j = i;
+  fun show() { print j; j = j + 10; }
+  if (i == 1) callbacks = show;
+}
+callbacks();
+callbacks();
+class A {
+  init(name) { this.name = name; }
+  greet() { return "hi " + this.name; }
+}
+class B < A {
+  greet() { return super.greet() + "!"; }
+}
+print B("bob").greet();
+print 1 == true;
+print nil or "default";
+"""
+
+
+class Tests(SameOutputTests, unittest.TestCase):
+    engine = PythonInterpreter
+    program = PROGRAM
+    expected_output = "1\n11\nhi bob!\nfalse\ndefault\n"
+
+    def test_runtime_error_line(self):
+        interpreter = PythonInterpreter()
+        errors = run_program(interpreter, 'var a = 1;\nprint a;\nprint a < "x";').errors
+        self.assertTrue(interpreter.error_reporter.had_runtime_error)
+        self.assertEqual("Operands must be numbers.\n[line 3]\n", errors)
+
+    def test_falls_back_to_tree_walker(self):
+        # CPython can't compile this many nested loops.
+        code = "var x = 0;\n%s x = x + 1; %s\nprint x;" % (
+            "".join("while (x < %d) {" % (i + 1) for i in range(25)), "}" * 25)
+        self.assertEqual("25\n", run_program(PythonInterpreter(), code).output)
+
+    def test_emit_python(self):
+        output = run_program(PythonInterpreter(emit_python=True), "var a = 1;").output
+        self.assertIn("a_g = 1.0", output)
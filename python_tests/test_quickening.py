@@ -0,0 +1,82 @@
+import unittest
+
+from lox.interpreter import Interpreter
+from lox.quickening import (
+    MAX_REWRITES,
+    binary_operation_for,
+    number_less,
+    string_add,
+)
+from lox.stack_interpreter import StackInterpreter
+from lox.tokentype import TokenType
+
+from .helpers import run_program
+
+
+def tree_interpreter():
+    interpreter = Interpreter(use_resolver=True)
+    # So functions run their own nodes, rather than inlined copies of them.
+    interpreter.inliner = None
+    return interpreter
+
+
+class Tests(unittest.TestCase):
+
+    def test_specializes_for_operand_types(self):
+        self.assertIs(number_less, binary_operation_for(TokenType.LESS, 1.0, 2.0))
+        self.assertIs(string_add, binary_operation_for(TokenType.PLUS, "a", "b"))
+        self.assertIsNone(binary_operation_for(TokenType.PLUS, 1.0, "b"))
+        same = binary_operation_for(TokenType.EQUAL_EQUAL, None, None)
+        different = binary_operation_for(TokenType.BANG_EQUAL, True, 1.0)
+        self.assertIs(True, same(None, None))
+        self.assertIs(True, different(False, 0.0))
+
+    def test_deoptimizes_when_types_change(self):
+        for interpreter in (tree_interpreter(), StackInterpreter()):
+            output, errors, statements = run_program(interpreter, """
+fun add(a, b) { return a + b; }
+print add(1, 2);
+print add(3, 4);
+print add("a", "b");
+print add(5, 6);
+add(true, 1);
+""")
+            self.assertEqual("3\n7\nab\n11\n", output)
+            self.assertIn("Operands must be two numbers or two strings.", errors)
+            add = statements[0].body[0].value
+            # Numbers, then strings, then numbers again, then no specialization.
+            self.assertEqual(4, add.quickening.rewrites)
+            self.assertIsNone(add.quickening.operation)
+
+    def test_gives_up_when_types_keep_changing(self):
+        _, _, statements = run_program(tree_interpreter(), """
+fun eq(a, b) { return a == b; }
+for (var i = 0; i < 10; i = i + 1) {
+  eq(1, 1); eq("a", "a"); eq(nil, nil);
+}
+""")
+        eq = statements[0].body[0].value
+        self.assertEqual(MAX_REWRITES, eq.quickening.rewrites)
+        self.assertIsNone(eq.quickening.operation)
+
+    def test_same_results_as_generic(self):
+        output, errors, _ = run_program(tree_interpreter(), """
+fun show(a, b) {
+  print a == b; print a != b;
+  print !a; print a and b; print a or b;
+}
+show(1, 1); show(1, 2); show(0, nil); show(nil, nil); show(true, 1);
+show("a", "a"); show(false, nil);
+for (var i = 0; i < 3; i = i + 1) { print -i; print 1 / i; print i < 1; }
+""")
+        self.assertEqual("", errors)
+        self.assertEqual(
+            "true false false 1 1 "
+            "false true false 2 1 "
+            "false true false nil 0 "
+            "true false true nil nil "
+            "false true false 1 true "
+            "true false false a a "
+            "false true true false nil "
+            "-0 inf true -1 1 false -2 0.5 false".split(),
+            output.split())
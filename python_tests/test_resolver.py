@@ -0,0 +1,120 @@
+import unittest
+from lox.interpreter import Interpreter
+from lox.parser import Parser
+from lox.resolver import Resolver
+from lox.scanner import Scanner
+from lox.statement import Block, ClassStmt, For, Function, Print, Return, Var
+
+
+class Tests(unittest.TestCase):
+
+    def resolve(self, code):
+        statements = Parser(Scanner(code).scan_tokens()).parse()
+        interpreter = Interpreter(use_resolver=True)
+        Resolver(interpreter, error_reporter=interpreter.error_reporter).resolve_stmts(
+            statements)
+        return interpreter, statements
+
+    def test_locals_get_depth_and_slot(self):
+        interpreter, statements = self.resolve(
+            "{ var a = 1; var b = 2; { var c = 3; print b; print c; } }")
+        outer = statements[0]
+        assert isinstance(outer, Block)
+        inner = outer.statements[2]
+        assert isinstance(inner, Block)
+        print_b, print_c = inner.statements[1:]
+        assert isinstance(print_b, Print) and isinstance(print_c, Print)
+        self.assertEqual((1, 1, False), print_b.expression.location)
+        self.assertEqual((0, 0, False), print_c.expression.location)
+
+    def test_globals_have_no_location(self):
+        interpreter, statements = self.resolve("var a = 1; print a;")
+        assert isinstance(statements[0], Var)
+        assert isinstance(statements[1], Print)
+        self.assertIsNone(statements[1].expression.location)
+
+    def test_globals_get_slots_even_before_declaration(self):
+        interpreter, statements = self.resolve(
+            "fun f() { return a; } var a = 1; a = 2; print clock;")
+        function, _, assign, print_clock = statements
+        assert isinstance(function, Function) and isinstance(function.body[0], Return)
+        assert isinstance(print_clock, Print)
+        slot = function.body[0].value.global_slot
+        self.assertIsNotNone(slot)
+        self.assertEqual(slot, assign.expression.global_slot)
+        self.assertNotEqual(slot, print_clock.expression.global_slot)
+        self.assertEqual(interpreter.globals.slot_for("clock"),
+                         print_clock.expression.global_slot)
+
+    def test_this_is_first_slot_of_method(self):
+        interpreter, statements = self.resolve("class A { m(x) { return this; } }")
+        klass = statements[0]
+        assert isinstance(klass, ClassStmt)
+        return_this = klass.methods[0].body[0]
+        assert isinstance(return_this, Return)
+        self.assertEqual((0, 0, False), return_this.value.location)
+
+    def test_for_body_scope_is_reused_unless_captured(self):
+        sources = {
+            "for (var i = 0; i < 3; i = i + 1) { var j = i; print j; }": True,
+            "for (var i = 0; i < 3; i = i + 1) { var j = i; fun f() { return i; } }": True,
+            "for (var i = 0; i < 3; i = i + 1) { var j = i; fun f() { return j; } }": False,
+            "for (var i = 0; i < 3; i = i + 1) { fun f() { return f; } }": False,
+            "for (;;) { print 1; }": False,
+            "for (;;) print 1;": False,
+        }
+        for source, reuse in sources.items():
+            _, [loop] = self.resolve(source)
+            assert isinstance(loop, For)
+            self.assertEqual(reuse, loop.reuse_body_scope, source)
+
+    def test_blocks_without_declarations_have_no_scope(self):
+        interpreter, statements = self.resolve(
+            "{ var a = 1; { print a; { { var b = a; } } } }")
+        outer = statements[0]
+        assert isinstance(outer, Block)
+        middle = outer.statements[1]
+        assert isinstance(middle, Block)
+        print_a, empty = middle.statements
+        assert isinstance(print_a, Print) and isinstance(empty, Block)
+        inner = empty.statements[0]
+        assert isinstance(inner, Block)
+        var_b = inner.statements[0]
+        assert isinstance(var_b, Var)
+        self.assertEqual((True, False, False, True),
+                         (outer.needs_scope, middle.needs_scope, empty.needs_scope,
+                          inner.needs_scope))
+        # Distances skip the blocks with no scope.
+        self.assertEqual((0, 0, False), print_a.expression.location)
+        self.assertEqual((1, 0, False), var_b.initializer.location)
+
+    def test_closures_only_get_cells_they_use(self):
+        interpreter, [outer] = self.resolve("""
+        fun outer(p) {
+          var a = 1;
+          var b = 2;
+          fun middle() {
+            fun inner() { return b + p; }
+            return inner;
+          }
+          return a;
+        }""")
+        assert isinstance(outer, Function)
+        var_a, var_b, middle = outer.body[:3]
+        assert isinstance(var_a, Var) and isinstance(var_b, Var)
+        assert isinstance(middle, Function)
+        inner = middle.body[0]
+        assert isinstance(inner, Function)
+        self.assertEqual((False, True), (var_a.captured, var_b.captured))
+        self.assertEqual((0,), outer.cell_slots)  # p
+        # middle captures b and p from outer's scope to pass on to inner...
+        self.assertEqual([(0, 2), (0, 0)], middle.free)
+        # ...and inner finds them in middle's cells, just outside middle's scope.
+        self.assertEqual([(1, 0), (1, 1)], inner.free)
+        return_b_plus_p = inner.body[0]
+        assert isinstance(return_b_plus_p, Return)
+        self.assertEqual((1, 0, True),
+                         return_b_plus_p.value.left.location)
+        return_a = outer.body[3]
+        assert isinstance(return_a, Return)
+        self.assertEqual((0, 1, False), return_a.value.location)
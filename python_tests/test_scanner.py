@@ -1,5 +1,23 @@
+import glob
+import mmap
+import os
+import random
+import tempfile
 import unittest
-from lox.scanner import Token, TokenType, Scanner
+from unittest import mock
+
+from lox.scanner import RegexScanner, Token, TokenType, Scanner
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test")
+
+
+def scan(scanner_class, source, method="scan_tokens"):
+    error_reporter = mock.Mock()
+    scanner = scanner_class(source, error_reporter=error_reporter)
+    tokens = getattr(scanner, method)()
+    # Token.__eq__ ignores the line, so compare that too.
+    return ([(token, token.line) for token in tokens],
+            error_reporter.error.call_args_list)
 
 class Tests(unittest.TestCase):
 
@@ -52,3 +70,60 @@ class Tests(unittest.TestCase):
                 self.eof,
             ],
             tokens)
+
+    def test_regex_scanner_matches_scanner(self):
+        sources = [
+            '"unterminated\n\nstring', '"two\nlines" x', '1.2.3 a.b 1..2 // c\n/ /',
+            '@#$ x', 'a\r\n\tb', '123.', 'orange or _a1 9a', '!!===<=>=<>',
+            'print "héllo ☃";\n€ x',
+            '(a)/b', 'x;// c', 'a-/b', 'f(x)//c', '{/ }', 'print (6+2)/4;',
+        ]
+        for path in sorted(glob.glob(os.path.join(TEST_DIR, "**", "*.lox"), recursive=True)):
+            with open(path) as f:
+                sources.append(f.read())
+        for source in sources:
+            expected = scan(Scanner, source)
+            self.assertEqual(expected, scan(RegexScanner, source), source)
+            self.assertEqual(expected, scan(RegexScanner, source, "scan_buffer"), source)
+            # Scanning UTF-8 bytes, eg from an mmap, gives the same decoded tokens.
+            self.assertEqual(expected, scan(RegexScanner, source.encode(), "scan_buffer"),
+                             source)
+
+    def test_regex_scanner_matches_scanner_on_random_tokens(self):
+        pieces = list("(){},.-+;*/!=<>") + [
+            "//", "!=", "==", "<=", ">=", " ", "\n", "\t", "a", "or", "_x1", "1", "2.5", '"s"', '"']
+        generator = random.Random(1234)
+        for _ in range(500):
+            source = "".join(generator.choice(pieces) for _ in range(generator.randint(1, 12)))
+            expected = scan(Scanner, source)
+            self.assertEqual(expected, scan(RegexScanner, source), source)
+            self.assertEqual(expected, scan(RegexScanner, source, "scan_buffer"), source)
+            self.assertEqual(expected, scan(RegexScanner, source.encode(), "scan_buffer"),
+                             source)
+
+    def test_iter_tokens_matches_scanner(self):
+        source = 'print (6+2)/4;\nx;// c\na-/b;\n{/ }\nf(x)//c'
+        expected = scan(Scanner, source)
+        error_reporter = mock.Mock()
+        scanner = RegexScanner("", error_reporter=error_reporter)
+        tokens = list(scanner.iter_tokens(source.splitlines(keepends=True)))
+        self.assertEqual(expected, ([(token, token.line) for token in tokens],
+                                    error_reporter.error.call_args_list))
+
+    def test_mmap_matches_str(self):
+        sources = ['print (6+2)/4;', '٣ + 1;', 'a٣ = ²;', 'x1٣.5', 'var é = "é";\n€ x']
+        for source in sources:
+            with tempfile.TemporaryFile() as f:
+                f.write(source.encode())
+                f.flush()
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    self.assertEqual(scan(RegexScanner, source, "scan_buffer"),
+                                     scan(RegexScanner, data, "scan_buffer"), source)
+
+    def test_token_buffer(self):
+        buffer = RegexScanner('var s = "hi";\nprint s + 1;').scan_buffer()
+        self.assertEqual(11, len(buffer))
+        self.assertEqual(Token(TokenType.STRING, '"hi"', "hi", 1), buffer[3])
+        self.assertEqual((Token(TokenType.NUMBER, "1", 1.0), 2), (buffer[-3], buffer[-3].line))
+        self.assertIs(buffer[-3], buffer[8])  # Recently made, so not made again.
+        self.assertEqual(self.eof, buffer[-1])
@@ -0,0 +1,58 @@
+import unittest
+
+from lox.error import LoxRuntimeError
+from lox.lox_class import LoxClass, LoxInstance
+from lox.shape import EMPTY_SHAPE, MAX_FIELDS, DictionaryShape, FieldCache
+from lox.token import Token
+from lox.tokentype import TokenType
+
+
+def name(lexeme):
+    return Token(TokenType.IDENTIFIER, lexeme, None, 1)
+
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.klass = LoxClass("A", {}, None)
+
+    def test_same_fields_share_shape(self):
+        a, b, c = (LoxInstance(self.klass) for _ in range(3))
+        for instance, names in [(a, "xy"), (b, "xy"), (c, "yx")]:
+            for i, lexeme in enumerate(names):
+                instance.set(name(lexeme), i)
+        self.assertIs(a.shape, b.shape)
+        self.assertIsNot(a.shape, c.shape)
+        self.assertIs(a.shape, EMPTY_SHAPE.add("x").add("y"))
+        self.assertEqual({"x": 0, "y": 1}, a.fields)
+        self.assertEqual({"y": 0, "x": 1}, c.fields)
+
+    def test_field_cache(self):
+        set_cache, get_cache = FieldCache(), FieldCache()
+        a, b = LoxInstance(self.klass), LoxInstance(self.klass)
+        a.set(name("x"), 1, set_cache)
+        self.assertIs(EMPTY_SHAPE, set_cache.shape)
+        self.assertIs(a.shape, set_cache.next_shape)
+        b.set(name("x"), 2, set_cache)  # Takes the cached transition.
+        self.assertEqual(2, b.get(name("x"), field_cache=get_cache))
+        self.assertEqual((a.shape, 0), (get_cache.shape, get_cache.slot))
+        self.assertEqual(1, a.get(name("x"), field_cache=get_cache))
+
+    def test_too_many_fields_uses_own_shape(self):
+        instance, other = LoxInstance(self.klass), LoxInstance(self.klass)
+        cache = FieldCache()
+        for i in range(MAX_FIELDS + 1):
+            instance.set(name("f%d" % i), i, cache)
+            other.set(name("f%d" % i), i, cache)
+        self.assertIs(DictionaryShape, type(instance.shape))
+        self.assertIsNot(other.shape, instance.shape)
+        self.assertEqual({"f%d" % i: i for i in range(MAX_FIELDS + 1)}, instance.fields)
+        self.assertEqual(list(range(MAX_FIELDS + 1)), instance.values)
+        instance.set(name("f0"), "new", cache)
+        self.assertEqual("new", instance.get(name("f0"), field_cache=cache))
+        self.assertIsNot(instance.shape, cache.shape)
+        # A miss isn't cached, so can't hide a field set afterwards.
+        with self.assertRaises(LoxRuntimeError):
+            instance.get(name("late"), field_cache=cache)
+        instance.set(name("late"), "here", cache)
+        self.assertEqual("here", instance.get(name("late"), field_cache=cache))
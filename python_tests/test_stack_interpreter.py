@@ -0,0 +1,60 @@
+import sys
+import unittest
+
+from lox.stack_interpreter import StackInterpreter
+
+from .helpers import SameOutputTests, run_program
+
+
+PROGRAM = """
+fun fib(n) {
+  if (n < 2) return n;
+  return fib(n - 2) + fib(n - 1);
+}
+class Counter {
+  init() { this.count = 0; }
+  add(n) { this.count = this.count + n; return this; }
+}
+class Twice < Counter {
+  add(n) { super.add(n); return super.add(n); }
+}
+var c = Twice();
+for (var i = 0; i < 5; i = i + 1) c.add(i);
+var add = c.add;
+print fib(10);
+print add(1).count;
+print clock() > 0 and !nil;
+"""
+
+
+class Tests(SameOutputTests, unittest.TestCase):
+    engine = StackInterpreter
+    program = PROGRAM
+    expected_output = "55\n22\ntrue\n"
+
+    def test_deeper_than_python_recursion_limit(self):
+        depth = sys.getrecursionlimit() * 2
+        code = """
+fun depth(n) { if (n == 0) return 0; return 1 + depth(n - 1); }
+print depth(%d);
+""" % depth
+        output = run_program(StackInterpreter(max_frames=depth + 1), code).output
+        self.assertEqual("%d\n" % depth, output)
+
+    def test_stack_overflow(self):
+        interpreter = StackInterpreter(max_frames=100)
+        code = "fun f(n) {\n  return f(n + 1);\n}\nf(0);"
+        errors = run_program(interpreter, code).errors
+        self.assertEqual("Stack overflow.\n[line 2]\n", errors)
+        # Ready to run something else, eg the next line in the REPL.
+        self.assertEqual("<fn f>\n", run_program(interpreter, "print f;").output)
+
+    def test_marks_nodes_that_call(self):
+        statements = run_program(StackInterpreter(), """
+fun f() { return 1; }
+print 1 + f();
+print 2 + 3;
+""").statements
+        calls, plain = statements[1].expression, statements[2].expression
+        self.assertTrue(statements[1].has_call and calls.has_call and calls.right.has_call)
+        self.assertFalse(statements[2].has_call or plain.has_call or calls.left.has_call)
@@ -0,0 +1,55 @@
+import unittest
+
+from lox.interpreter import Interpreter
+from lox.superinstructions import IncrementField, IncrementVariable, VariableOpConstant
+
+from .helpers import run_program
+
+
+class Tests(unittest.TestCase):
+
+    def test_fuses_patterns(self):
+        interpreter = Interpreter(use_resolver=True)
+        statements = run_program(interpreter, """
+var i = 0;
+i = i + 1;
+print i < 10;
+class A { bump() { this.n = this.n - 1; } }
+""").statements
+        self.assertIsInstance(statements[1].expression, IncrementVariable)
+        self.assertEqual(1.0, statements[1].expression.amount)
+        self.assertIsInstance(statements[2].expression, VariableOpConstant)
+        [bump] = statements[3].methods
+        self.assertIsInstance(bump.body[0].expression, IncrementField)
+        self.assertEqual(-1.0, bump.body[0].expression.amount)
+        self.assertEqual(
+            {"x = x + c": 1, "x op c": 1, "x.f = x.f + c": 1}, interpreter.fuser.fused)
+
+    def test_leaves_other_shapes(self):
+        interpreter = Interpreter(use_resolver=True)
+        run_program(interpreter, """
+var i = 0; var j = 0;
+i = j + 1;
+i = i * 2;
+print 1 < i;
+print i / 0;
+fun f() { var c = 0; fun g() { c = c + 1; } }
+""")
+        # Just `j + 1` and `i * 2`, as operations rather than increments.
+        self.assertEqual({"x op c": 2}, interpreter.fuser.fused)
+
+    def test_falls_back_to_original(self):
+        output, errors, _ = run_program(Interpreter(use_resolver=True), """
+var s = "a";
+s = s + "b";
+print s;
+var z = -0;
+z = z - 0;
+print z;
+class A {}
+var a = A();
+a.n = nil;
+a.n = a.n + 1;
+""")
+        self.assertEqual("ab\n-0\n", output)
+        self.assertIn("Operands must be two numbers or two strings.", errors)
@@ -0,0 +1,52 @@
+import contextlib
+import io
+import unittest
+
+from lox.bytecode_compiler import Compiler
+from lox.vm import VM
+
+from .helpers import SameOutputTests, parse, run_program
+
+
+PROGRAM = """
+fun makeCounter() {
+  var count = 0;
+  fun increment() { count = count + 1; return count; }
+  return increment;
+}
+class A {
+  init(name) { this.name = name; }
+  greet() { return "hi " + this.name; }
+}
+class B < A {
+  greet() { return super.greet() + "!"; }
+}
+var counter = makeCounter();
+counter();
+print counter();
+print B("bob").greet();
+var total = 0;
+for (var i = 0; i < 10; i = i + 1) total = total + i;
+print total;
+print 0 / 0 == 0 / 0;
+"""
+
+
+class Tests(SameOutputTests, unittest.TestCase):
+    engine = VM
+    program = PROGRAM
+    expected_output = "2\nhi bob!\n45\nfalse\n"
+
+    def test_stack_overflow(self):
+        vm = VM(max_frames=10)
+        errors = run_program(vm, "fun f(n) {\n  return f(n + 1);\n}\nf(0);").errors
+        self.assertTrue(vm.error_reporter.had_runtime_error)
+        self.assertEqual("Stack overflow.\n[line 2]\n", errors)
+
+    def test_too_many_constants(self):
+        code = "fun f() {\n%s\n}" % "\n".join("%d;" % i for i in range(257))
+        statements = parse(code)
+        compiler = Compiler()
+        with contextlib.redirect_stderr(io.StringIO()) as errors:
+            self.assertIsNone(compiler.compile(statements))
+        self.assertIn("Too many constants in one chunk.", errors.getvalue())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Count the Environments and functions (including bound methods) that scripts
+allocate, alongside how long they take, under the tree and closure engines.
+
+Runs in-process, so it can count calls to the constructors. Each script runs
+twice: once timed, then once counting (which is slower), eg:
+    tools/allocation_benchmark.py
+    tools/allocation_benchmark.py --engine closure test/benchmark/zoo.lox
+
+Some scripts, like zoo_batch.lox, run for a fixed time rather than a fixed
+amount of work, so compare their counts per batch (the second line of output).
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import os
+import sys
+import time
+from collections import Counter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from lox import closure_compiler, environment, function  # noqa: E402
+
+# lox.py can't be imported by name, since the package is called `lox` too.
+_spec = importlib.util.spec_from_file_location("lox_main", os.path.join(ROOT, "lox.py"))
+assert _spec is not None and _spec.loader is not None
+lox_main = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(lox_main)
+
+DEFAULT_SCRIPTS = ["method_call.lox", "zoo_batch.lox"]
+COUNTED = {
+    "environments": [environment.Environment],
+    "functions": [function.LoxFunction, closure_compiler.CompiledFunction],
+}
+
+
+@contextlib.contextmanager
+def counting_allocations(counts: Counter):
+    originals = []
+    for label, classes in COUNTED.items():
+        for cls in classes:
+            original = cls.__init__
+
+            def counting_init(self, *args, _original=original, _label=label, **kwargs):
+                counts[_label] += 1
+                _original(self, *args, **kwargs)
+
+            originals.append((cls, original))
+            cls.__init__ = counting_init  # type: ignore
+    try:
+        yield counts
+    finally:
+        for cls, original in originals:
+            cls.__init__ = original  # type: ignore
+
+
+def run(engine: str, source: str) -> tuple[float, str]:
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        lox_main.Lox(engine=engine).run(source)
+    return time.perf_counter() - start, output.getvalue()
+
+
+def main(args: list[str]):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--engine", action="append", choices=["tree", "closure"],
+                        help="Repeat to compare several (default: both).")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Report the best time of this many runs.")
+    parser.add_argument("scripts", nargs="*")
+    options = parser.parse_args(args)
+    engines = options.engine or ["tree", "closure"]
+    scripts = options.scripts or [
+        os.path.join(ROOT, "test", "benchmark", name) for name in DEFAULT_SCRIPTS]
+
+    print("%-16s %-8s %9s %14s %14s  %s" % (
+        "script", "engine", "time", "environments", "functions", "output"))
+    for path in scripts:
+        with open(path) as f:
+            source = f.read()
+        for engine in engines:
+            elapsed = min(run(engine, source)[0] for _ in range(options.repeat))
+            counts: Counter = Counter()
+            with counting_allocations(counts):
+                _elapsed, output = run(engine, source)
+            print("%-16s %-8s %8.2fs %14d %14d  %s" % (
+                os.path.basename(path), engine, elapsed, counts["environments"],
+                counts["functions"], " ".join(output.split()[:2])))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Time the scripts in test/benchmark under different lox.py options,
+and report each option's speedup relative to the first one.
+
+eg:
+    tools/benchmark.py --config "" --config "--engine closure"
+    tools/benchmark.py --config "" --config "--engine closure" test/benchmark/fib.lox
+
+Note that at full size some of these scripts take many minutes in Python;
+use --timeout to give up on slow ones.
+"""
+import argparse
+import glob
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+LOX = os.path.join(ROOT, "lox.py")
+
+
+def time_script(config: str, path: str, repeat: int, timeout: float) -> float | None:
+    """Best wall clock time of `repeat` runs, or None if it failed or timed out."""
+    best = None
+    command = [sys.executable, LOX, *shlex.split(config), path]
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            result = subprocess.run(command, capture_output=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return None
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            return None
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(args: list[str]):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--config", action="append", default=[],
+        help="lox.py options to benchmark; repeat to compare several.")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=None)
+    parser.add_argument("scripts", nargs="*")
+    options = parser.parse_args(args)
+    configs = options.config or [""]
+    scripts = options.scripts or sorted(
+        glob.glob(os.path.join(ROOT, "test", "benchmark", "*.lox")))
+
+    header = "%-22s" % "script" + "".join(" %20s" % (c or "(default)") for c in configs)
+    print(header)
+    for path in scripts:
+        times = [time_script(c, path, options.repeat, options.timeout) for c in configs]
+        row = "%-22s" % os.path.basename(path)
+        baseline = times[0]
+        for i, elapsed in enumerate(times):
+            if elapsed is None:
+                row += " %20s" % "failed"
+            elif i == 0 or baseline is None:
+                row += " %19.2fs" % elapsed
+            else:
+                row += " %12.2fs x%5.2f" % (elapsed, baseline / elapsed)
+        print(row)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Measure how many bytes each Lox instance takes, by number of fields.
+
+Runs a generated script that builds a linked list of instances in-process, and
+uses tracemalloc to see how much more memory twice as many instances need, eg:
+    tools/instance_size.py
+    tools/instance_size.py --engine vm --fields 1 --fields 100
+"""
+import argparse
+import contextlib
+import gc
+import importlib.util
+import io
+import os
+import sys
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+# lox.py can't be imported by name, since the package is called `lox` too.
+_spec = importlib.util.spec_from_file_location("lox_main", os.path.join(ROOT, "lox.py"))
+assert _spec is not None and _spec.loader is not None
+lox_main = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(lox_main)
+
+
+def generate_script(fields: int, count: int) -> str:
+    assignments = " ".join("this.f%d = %d;" % (i, i) for i in range(1, fields))
+    return "\n".join([
+        "class Node { init(next) { this.next = next; %s } }" % assignments,
+        "var head = nil;",
+        "for (var i = 0; i < %d; i = i + 1) head = Node(head);" % count,
+    ])
+
+
+def traced_bytes(engine: str, fields: int, count: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        lox = lox_main.Lox(engine=engine)
+        with contextlib.redirect_stdout(io.StringIO()):
+            lox.run(generate_script(fields, count))
+        assert not lox.had_any_error
+        gc.collect()
+        # The instances are still alive, in `head`.
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def main(args: list[str]):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--engine", choices=sorted(lox_main.ENGINES), default="tree")
+    parser.add_argument("--fields", type=int, action="append",
+                        help="Repeat to measure several (default: 1, 2, 4, 8, 16, 64).")
+    parser.add_argument("--count", type=int, default=10000)
+    options = parser.parse_args(args)
+
+    print("%8s %20s" % ("fields", "bytes per instance"))
+    for fields in options.fields or [1, 2, 4, 8, 16, 64]:
+        # The difference cancels out everything but the extra instances.
+        small = traced_bytes(options.engine, fields, options.count)
+        large = traced_bytes(options.engine, fields, 2 * options.count)
+        print("%8d %20.1f" % (fields, (large - small) / options.count))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Compare how many tokens per second the book's Scanner and the RegexScanner
+scan, on a big generated script or on the given files, eg:
+    tools/scanner_benchmark.py
+    tools/scanner_benchmark.py --lines 200000 --repeat 3
+    tools/scanner_benchmark.py test/benchmark/*.lox
+"""
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from lox.scanner import RegexScanner, Scanner  # noqa: E402
+
+SCANNERS = {"book": Scanner, "regex": RegexScanner}
+
+# About 10 lines, with some of every kind of token.
+CHUNK = """\
+// Chunk %d: a comment, which the scanner skips.
+class Point%d < Base {
+  init(x, y) { this.x = x; this.y = y; }
+  scaled(factor) {
+    return Point%d(this.x * factor, this.y * factor);
+  }
+}
+fun check%d(a, b) {
+  if (a >= b and !(a == 3.25) or b != nil) print "big: " + "a";
+  var i = 0; while (i <= 10) { i = i + 1 - -a / 2; } return true;
+}
+"""
+
+
+def generate_source(lines: int) -> str:
+    chunks = max(1, lines // CHUNK.count("\n"))
+    return "".join(CHUNK % ((i,) * 4) for i in range(chunks))
+
+
+def time_scan(scanner_class, source: str, repeat: int) -> tuple[float, int]:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = scanner_class(source).scan_tokens()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(tokens)
+
+
+def main(args: list[str]):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--lines", type=int, default=100000,
+                        help="Size of the generated script (default: %(default)s).")
+    parser.add_argument("scripts", nargs="*")
+    options = parser.parse_args(args)
+
+    sources = [(path, open(path).read()) for path in options.scripts]
+    if not sources:
+        sources = [("generated", generate_source(options.lines))]
+
+    print("%-22s %10s %10s %14s %14s %8s" % (
+        "script", "bytes", "tokens", "book tok/s", "regex tok/s", "speedup"))
+    for name, source in sources:
+        book, count = time_scan(Scanner, source, options.repeat)
+        regex, regex_count = time_scan(RegexScanner, source, options.repeat)
+        assert count == regex_count
+        print("%-22s %10d %10d %14.0f %14.0f x%7.2f" % (
+            os.path.basename(name), len(source), count, count / book, count / regex,
+            book / regex))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Compare lox.py startup times without the program cache, with a cold (empty)
+cache, and with a warm one.
+
+By default this times a generated script that's big but does almost nothing,
+so the time is all scanning, parsing and resolving, eg:
+    tools/startup_benchmark.py
+    tools/startup_benchmark.py --repeat 10 test/benchmark/zoo.lox
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+LOX = os.path.join(ROOT, "lox.py")
+
+
+def generate_script(functions: int) -> str:
+    lines = []
+    for i in range(functions):
+        lines += [
+            "class Shape%d {" % i,
+            "  init(w, h) { this.w = w; this.h = h; }",
+            "  area() { return this.w * this.h; }",
+            "}",
+            "fun compute%d(a, b) {" % i,
+            "  var total = 0;",
+            "  for (var j = 0; j < a; j = j + 1) {",
+            "    if (j > b and !(j == 3)) total = total + Shape%d(j, b).area();" % i,
+            "  }",
+            "  return total;",
+            "}",
+        ]
+    lines.append("print compute0(2, 1);")
+    return "\n".join(lines) + "\n"
+
+
+def time_run(path: str, cache_args: list[str]) -> float:
+    command = [sys.executable, LOX, *cache_args, path]
+    start = time.perf_counter()
+    subprocess.run(command, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def main(args: list[str]):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--functions", type=int, default=500,
+                        help="Size of the generated script (default: %(default)s).")
+    parser.add_argument("scripts", nargs="*")
+    options = parser.parse_args(args)
+
+    with tempfile.TemporaryDirectory() as work:
+        scripts = options.scripts
+        if not scripts:
+            generated = os.path.join(work, "generated.lox")
+            with open(generated, "w") as f:
+                f.write(generate_script(options.functions))
+            scripts = [generated]
+
+        print("%-22s %12s %12s %12s %8s" % ("script", "no cache", "cold", "warm", "speedup"))
+        for path in scripts:
+            uncached = min(time_run(path, []) for _ in range(options.repeat))
+            cold = []
+            for i in range(options.repeat):
+                # A fresh directory each time, so every run misses.
+                cold.append(time_run(path, ["--cache-dir", os.path.join(work, "cold%d" % i)]))
+            warm_dir = os.path.join(work, "warm")
+            time_run(path, ["--cache-dir", warm_dir])
+            warm = min(time_run(path, ["--cache-dir", warm_dir])
+                       for _ in range(options.repeat))
+            print("%-22s %11.3fs %11.3fs %11.3fs x%7.2f" % (
+                os.path.basename(path), uncached, min(cold), warm, min(cold) / warm))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
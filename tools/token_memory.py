@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Compare the memory (measured with tracemalloc) taken by reading and scanning
+a script into a list of Tokens, into a TokenBuffer, and into a TokenBuffer
+over an mmap of the file, on a big generated script or on the given files.
+Times are slowed down by tracemalloc, so only compare them to each other. Eg:
+    tools/token_memory.py
+    tools/token_memory.py --lines 200000
+    tools/token_memory.py test/benchmark/*.lox
+"""
+import argparse
+import gc
+import mmap
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from lox.scanner import RegexScanner  # noqa: E402
+from scanner_benchmark import generate_source  # noqa: E402
+
+
+def scan_list(path: str):
+    with open(path) as f:
+        return RegexScanner(f.read()).scan_tokens()
+
+
+def scan_buffer(path: str):
+    with open(path) as f:
+        return RegexScanner(f.read()).scan_buffer()
+
+
+def scan_mmap(path: str):
+    with open(path, "rb") as f:
+        source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # The buffer keeps the mmap open, as while lox.py parses.
+        return RegexScanner(source).scan_buffer()
+
+
+METHODS = {"list": scan_list, "buffer": scan_buffer, "mmap": scan_mmap}
+
+
+def measure(method: str, path: str) -> tuple[int, int, float]:
+    """
+    Bytes still allocated for the tokens, peak bytes while scanning, and seconds.
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    tokens = METHODS[method](path)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tokens
+    return current, peak, elapsed
+
+
+def main(args: list[str]):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100000,
+                        help="Size of the generated script (default: %(default)s).")
+    parser.add_argument("scripts", nargs="*")
+    options = parser.parse_args(args)
+
+    with tempfile.TemporaryDirectory() as work:
+        scripts = options.scripts
+        if not scripts:
+            generated = os.path.join(work, "generated.lox")
+            with open(generated, "w") as f:
+                f.write(generate_source(options.lines))
+            scripts = [generated]
+
+        print("%-22s %10s %8s %12s %12s %10s" % (
+            "script", "bytes", "tokens", "kept", "peak", "time"))
+        for path in scripts:
+            for method in METHODS:
+                kept, peak, elapsed = measure(method, path)
+                print("%-22s %10d %8s %11.1fM %11.1fM %9.2fs" % (
+                    os.path.basename(path), os.path.getsize(path), method,
+                    kept / 1e6, peak / 1e6, elapsed))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])